@@ -25,4 +25,5 @@ CREATE TABLE IF NOT EXISTS E (
 -- Indexes
 CREATE INDEX IF NOT EXISTS idx_n_display_name ON N(display_name);
 CREATE INDEX IF NOT EXISTS idx_n_family ON N(target_family);
+CREATE INDEX IF NOT EXISTS idx_n_family_lower ON N(lower(target_family));
 CREATE INDEX IF NOT EXISTS idx_n_degree ON N(degree_layout DESC);
@@ -0,0 +1,32 @@
+"""
+Migration 003: add N.embedding_hash and populate N.embedding.
+Safe to rerun: only genes whose content hash changed are re-embedded.
+"""
+import sys
+import psycopg2
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.core.config import config
+from src.embeddings.generator import EmbeddingGenerator
+
+def upgrade(conn) -> None:
+    """Add the content hash column used for incremental re-embedding."""
+    with conn.cursor() as cur:
+        cur.execute("ALTER TABLE N ADD COLUMN IF NOT EXISTS embedding_hash TEXT")
+    conn.commit()
+
+def populate() -> dict:
+    """Embed every gene that has no up-to-date embedding."""
+    read_conn = psycopg2.connect(config.DB_URI)
+    write_conn = psycopg2.connect(config.DB_URI)
+    try:
+        upgrade(write_conn)
+        return EmbeddingGenerator().run(read_conn, write_conn)
+    finally:
+        read_conn.close()
+        write_conn.close()
+
+if __name__ == "__main__":
+    print(populate())
@@ -0,0 +1,9 @@
+-- Data generation counter, bumped by every import of N/E.
+-- Caches compare it to detect reloads.
+CREATE TABLE IF NOT EXISTS pulse_meta (
+    key TEXT PRIMARY KEY,
+    value BIGINT NOT NULL
+);
+
+INSERT INTO pulse_meta (key, value) VALUES ('data_generation', 0)
+ON CONFLICT (key) DO NOTHING;
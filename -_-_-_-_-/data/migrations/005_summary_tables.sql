@@ -0,0 +1,120 @@
+-- Precomputed network summaries for aggregate questions.
+-- scripts/setup_db.py refreshes them in dependency order after every import,
+-- so generated SQL reads these small views instead of grouping over E.
+
+-- E.name is "<source> (<interaction>) <target>"; parsed once per refresh
+CREATE MATERIALIZED VIEW IF NOT EXISTS edge_endpoints AS
+SELECT e.name AS edge_name, m[1] AS source, m[3] AS target, e.stringdb_score
+FROM E e, LATERAL regexp_match(btrim(e.name), '^(.+?) \(([^)]*)\) (.+)$') AS m
+WHERE m IS NOT NULL
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS idx_edge_endpoints_source ON edge_endpoints(source);
+CREATE INDEX IF NOT EXISTS idx_edge_endpoints_target ON edge_endpoints(target);
+
+-- Per-gene interaction score aggregates, both edge directions counted
+CREATE MATERIALIZED VIEW IF NOT EXISTS gene_edge_stats AS
+WITH incident AS (
+    SELECT source AS gene, stringdb_score FROM edge_endpoints
+    UNION ALL
+    SELECT target AS gene, stringdb_score FROM edge_endpoints
+)
+SELECT
+    n.name,
+    n.display_name,
+    n.target_family,
+    n.degree_layout,
+    count(i.gene) AS edge_count,
+    avg(i.stringdb_score)::float4 AS avg_score,
+    max(i.stringdb_score) AS max_score,
+    min(i.stringdb_score) AS min_score,
+    count(*) FILTER (WHERE i.stringdb_score >= 0.7) AS strong_edge_count
+FROM N n
+LEFT JOIN incident i ON i.gene = n.name
+GROUP BY n.name
+WITH NO DATA;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_gene_edge_stats_name ON gene_edge_stats(name);
+CREATE INDEX IF NOT EXISTS idx_gene_edge_stats_display_name ON gene_edge_stats(display_name);
+
+-- The 10 strongest interaction partners of every gene
+CREATE MATERIALIZED VIEW IF NOT EXISTS gene_top_interactions AS
+WITH incident AS (
+    SELECT source AS gene, target AS partner, stringdb_score FROM edge_endpoints
+    UNION ALL
+    SELECT target AS gene, source AS partner, stringdb_score FROM edge_endpoints
+), ranked AS (
+    SELECT
+        gene,
+        partner,
+        stringdb_score,
+        row_number() OVER (PARTITION BY gene ORDER BY stringdb_score DESC NULLS LAST, partner) AS rank
+    FROM incident
+)
+SELECT g.display_name AS gene, p.display_name AS partner, r.stringdb_score, r.rank
+FROM ranked r
+JOIN N g ON g.name = r.gene
+JOIN N p ON p.name = r.partner
+WHERE r.rank <= 10
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS idx_gene_top_interactions_gene ON gene_top_interactions(gene, rank);
+
+-- Per-family gene counts, degree and interaction score statistics
+CREATE MATERIALIZED VIEW IF NOT EXISTS family_stats AS
+SELECT
+    target_family,
+    count(*) AS gene_count,
+    avg(degree_layout)::float4 AS avg_degree,
+    max(degree_layout) AS max_degree,
+    sum(edge_count) AS edge_count,
+    avg(avg_score)::float4 AS avg_edge_score,
+    (array_agg(display_name ORDER BY degree_layout DESC NULLS LAST))[1] AS top_gene
+FROM gene_edge_stats
+GROUP BY target_family
+WITH NO DATA;
+
+-- Genes pre-ranked by degree_layout, overall and within their family
+CREATE MATERIALIZED VIEW IF NOT EXISTS gene_degree_ranks AS
+SELECT
+    display_name,
+    target_family,
+    degree_layout,
+    rank() OVER (ORDER BY degree_layout DESC NULLS LAST) AS degree_rank,
+    rank() OVER (PARTITION BY target_family ORDER BY degree_layout DESC NULLS LAST) AS family_rank
+FROM N
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS idx_gene_degree_ranks_rank ON gene_degree_ranks(degree_rank);
+CREATE INDEX IF NOT EXISTS idx_gene_degree_ranks_family ON gene_degree_ranks(target_family, family_rank);
+
+-- Distribution of every stringdb_* evidence channel over E, in one scan
+CREATE MATERIALIZED VIEW IF NOT EXISTS edge_score_stats AS
+SELECT
+    c.channel,
+    count(c.value) AS edge_count,
+    avg(c.value)::float4 AS avg_value,
+    min(c.value) AS min_value,
+    max(c.value) AS max_value,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY c.value)::float4 AS median_value,
+    percentile_cont(0.9) WITHIN GROUP (ORDER BY c.value)::float4 AS p90_value
+FROM E e, LATERAL (VALUES
+    ('coexpression', e.stringdb_coexpression),
+    ('cooccurrence', e.stringdb_cooccurrence),
+    ('databases', e.stringdb_databases),
+    ('experiments', e.stringdb_experiments),
+    ('fusion', e.stringdb_fusion),
+    ('neighborhood', e.stringdb_neighborhood),
+    ('score', e.stringdb_score),
+    ('textmining', e.stringdb_textmining)
+) AS c(channel, value)
+GROUP BY c.channel
+WITH NO DATA;
+
+-- Populate from the current N/E
+REFRESH MATERIALIZED VIEW edge_endpoints;
+REFRESH MATERIALIZED VIEW gene_edge_stats;
+REFRESH MATERIALIZED VIEW gene_top_interactions;
+REFRESH MATERIALIZED VIEW family_stats;
+REFRESH MATERIALIZED VIEW gene_degree_ranks;
+REFRESH MATERIALIZED VIEW edge_score_stats;
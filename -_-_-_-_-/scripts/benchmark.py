@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for Pulse AI Assistant.
+Replays a query corpus through the bot pipeline (template routing, SQL generation,
+SQL execution, response formatting) and through HybridSearcher.search, against a
+local Postgres and a fake OpenAI-compatible server with configurable latency.
+Reports per-stage p50/p95/p99, throughput per client count and memory.
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import re
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Add project root to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.core.config import config
+from src.utils.helpers import peak_memory_mb
+from src.core import constants
+
+STAGES = ["template", "generate_sql", "execute_sql", "format_response", "search", "answer", "total"]
+
+# Question templates for the generated part of the corpus
+QUESTION_TEMPLATES = [
+    "Что известно о гене {gene}?",
+    "Сколько связей у гена {gene}?",
+    "К какому семейству относится {gene}?",
+    "Какие гены похожи на {gene}?",
+    "С какими генами взаимодействует {gene}?",
+    "Назови топ-{limit} генов с наибольшим количеством связей.",
+    "Найди гены из семейства {family}.",
+    "Какие гены связаны с {topic}?",
+]
+FAMILIES = ["киназ", "ферментов", "ионных каналов", "транспортеров", "ядерных рецепторов"]
+TOPICS = ["репарацией ДНК", "апоптозом", "клеточным циклом", "иммунным ответом", "метаболизмом глюкозы"]
+FALLBACK_GENES = ["TP53", "BRCA1", "EGFR", "INS", "MYC", "KRAS", "PTEN", "AKT1", "VEGFA", "TNF"]
+
+_QUESTION = re.compile(r"User question:\s*(.*)", re.DOTALL)
+_GENE = re.compile(r"\b[A-Z][A-Z0-9-]{1,}\b")
+
+def current_memory_mb() -> Optional[float]:
+    """Current resident set size in MB, if /proc is available."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        return None
+
+def fake_sql(question: str) -> str:
+    """A plausible SQL answer for the question, so the database stage does real work."""
+    gene = _GENE.search(question)
+    lowered = question.lower()
+    if "топ" in lowered or "наибольш" in lowered:
+        return "SELECT display_name, degree_layout FROM N ORDER BY degree_layout DESC NULLS LAST LIMIT 10"
+    if gene:
+        return (
+            "SELECT display_name, stringdb_description, target_family, degree_layout "
+            f"FROM N WHERE display_name = '{gene.group(0)}'"
+        )
+    return (
+        "SELECT display_name, target_family, degree_layout FROM N "
+        "WHERE stringdb_description ILIKE '%repair%' ORDER BY degree_layout DESC NULLS LAST"
+    )
+
+class FakeLLMServer:
+    """Minimal OpenAI-compatible /chat/completions server with simulated latency."""
+
+    def __init__(self, latency: float = 0.5, token_delay: float = 0.02, answer_tokens: int = 40):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.answer_tokens = answer_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reply(self, prompt: str) -> List[str]:
+        """Tokens of the reply: SQL for generator prompts, Russian text otherwise."""
+        match = _QUESTION.search(prompt)
+        if match:
+            return fake_sql(match.group(1).strip()).split(" ")
+        return ["Согласно", "данным", "сети,"] + ["ген"] * max(self.answer_tokens - 3, 0)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+                tokens = server.reply(prompt)
+                if body.get("stream"):
+                    self._stream(tokens)
+                else:
+                    time.sleep(server.latency + server.token_delay * len(tokens))
+                    self._complete(tokens, prompt)
+
+            def _complete(self, tokens: List[str], prompt: str):
+                payload = json.dumps({
+                    "id": "benchmark",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": "local-model",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": " ".join(tokens)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": len(prompt) // 4,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": len(prompt) // 4 + len(tokens),
+                    },
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, tokens: List[str]):
+                # Like llama.cpp and LM Studio, headers go out before prefill
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                self.wfile.flush()
+                time.sleep(server.latency)
+                for i, token in enumerate(tokens):
+                    time.sleep(server.token_delay)
+                    chunk = {
+                        "id": "benchmark",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": "local-model",
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": token if i == 0 else " " + token},
+                            "finish_reason": None,
+                        }],
+                    }
+                    try:
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        # The pipeline cancelled this generation
+                        return
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+class StageRecorder:
+    """Thread-safe collection of per-stage durations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self.errors = 0
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def time(self, stage: str, func: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return func()
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """count, mean and p50/p95/p99 in milliseconds for every stage that ran."""
+        result = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = np.asarray(samples) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            result[stage] = {
+                "count": len(samples),
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3),
+            }
+        return result
+
+def corpus_genes(db, limit: int = 200) -> List[str]:
+    """Most connected genes from N, so generated questions hit real rows."""
+    try:
+        rows = db.execute_query(
+            "SELECT display_name FROM N WHERE display_name IS NOT NULL "
+            "ORDER BY degree_layout DESC NULLS LAST LIMIT %s",
+            (limit,)
+        )
+        return [row[0] for row in rows] or FALLBACK_GENES
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Using fallback genes for the corpus: {e}")
+        return FALLBACK_GENES
+
+def build_corpus(size: int, genes: List[str], seed: int) -> List[str]:
+    """EXAMPLE_QUERIES followed by size generated questions."""
+    rng = random.Random(seed)
+    corpus = [query.lstrip("🔹 ").strip() for query in constants.EXAMPLE_QUERIES]
+    for _ in range(size):
+        corpus.append(rng.choice(QUESTION_TEMPLATES).format(
+            gene=rng.choice(genes),
+            limit=rng.choice([3, 5, 10]),
+            family=rng.choice(FAMILIES),
+            topic=rng.choice(TOPICS),
+        ))
+    return corpus
+
+def run_query(bot, question: str, recorder: StageRecorder, streaming: bool, end_to_end: bool = False) -> None:
+    """
+    One question through the same stages as PulseBot._handle_analytics_query, plus search.
+    With end_to_end, PulseBot.answer is timed as a whole, so pipeline overlap shows up in the totals.
+    """
+    started = time.perf_counter()
+    try:
+        if end_to_end:
+            recorder.time("answer", lambda: bot.answer(
+                question,
+                on_progress=(lambda text: None) if streaming else None
+            ))
+            return
+        answer = recorder.time("template", lambda: bot._answer_from_template(question))
+        if answer is None:
+            sql = recorder.time("generate_sql", lambda: bot._generate_sql(question))
+            if sql:
+                data = recorder.time("execute_sql", lambda: bot._execute_sql(sql, question))
+                recorder.time("format_response", lambda: bot._format_response(
+                    question,
+                    data,
+                    on_progress=(lambda text: None) if streaming else None
+                ))
+        recorder.time("search", lambda: bot.searcher.search(question))
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Benchmark query failed: {e}")
+        recorder.error()
+    finally:
+        recorder.record("total", time.perf_counter() - started)
+
+def run_level(
+    bot,
+    corpus: List[str],
+    clients: int,
+    repeat: int,
+    streaming: bool,
+    end_to_end: bool = False
+) -> Dict[str, Any]:
+    """Replay the corpus repeat times with the given number of concurrent clients."""
+    recorder = StageRecorder()
+    workload = corpus * repeat
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(lambda q: run_query(bot, q, recorder, streaming, end_to_end), workload))
+    wall = time.perf_counter() - started
+    return {
+        "clients": clients,
+        "queries": len(workload),
+        "errors": recorder.errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_qps": round(len(workload) / wall, 3) if wall else 0.0,
+        "stages": recorder.summary(),
+        "rss_mb": current_memory_mb(),
+        "peak_rss_mb": round(peak_memory_mb(), 1),
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Pulse query pipeline end to end")
+    parser.add_argument("--queries", type=int, default=50, help="Generated questions added to EXAMPLE_QUERIES")
+    parser.add_argument("--clients", default="1,4,8", help="Comma-separated concurrent client counts")
+    parser.add_argument("--repeat", type=int, default=1, help="Times the corpus is replayed per client count")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake LLM time to first token, seconds")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Fake LLM delay per token, seconds")
+    parser.add_argument("--answer-tokens", type=int, default=40, help="Tokens in fake formatted answers")
+    parser.add_argument("--llm-url", help="Use a real OpenAI-compatible server instead of the fake one")
+    parser.add_argument("--warm", action="store_true", help="Keep LLM and result caches enabled")
+    parser.add_argument("--no-embeddings", action="store_true", help="Disable the query encoder")
+    parser.add_argument("--end-to-end", action="store_true",
+                        help="Time PulseBot.answer as a whole instead of its stages one by one")
+    parser.add_argument("--no-pipeline", action="store_true",
+                        help="Run the stages sequentially instead of through the speculative pipeline")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the generated corpus")
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    return parser.parse_args()
+
+def print_level(level: Dict[str, Any]) -> None:
+    print(f"\n👥 {level['clients']} clients: {level['queries']} queries in {level['wall_seconds']}s "
+          f"({level['throughput_qps']} q/s, {level['errors']} errors, peak RSS {level['peak_rss_mb']} MB)")
+    print(f"   {'stage':<16}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for stage, stats in level["stages"].items():
+        print(f"   {stage:<16}{stats['count']:>7}{stats['p50_ms']:>11.1f}{stats['p95_ms']:>11.1f}{stats['p99_ms']:>11.1f}")
+
+def main():
+    """Main benchmark function."""
+    config.load()
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    print("🚀 Benchmarking Pulse query pipeline...")
+
+    server = None
+    try:
+        if args.llm_url:
+            config.LM_STUDIO_BASE_URL = args.llm_url
+        else:
+            server = FakeLLMServer(args.llm_latency, args.token_delay, args.answer_tokens).start()
+            config.LM_STUDIO_BASE_URL = server.url
+            print(f"🤖 Fake LLM server at {server.url} ({args.llm_latency}s latency, {args.token_delay}s/token)")
+        if not args.warm:
+            # Cold runs measure the full pipeline: nothing may be served from cache
+            config.LLM_CACHE_MAX_ENTRIES = 0
+            config.RESULT_CACHE_MAX_BYTES = 0
+        if args.no_embeddings:
+            config.EMBEDDINGS_ENABLED = False
+        if args.no_pipeline:
+            config.PIPELINE_ENABLED = False
+
+        from src.bot.telegram_bot import PulseBot
+
+        memory_before = peak_memory_mb()
+        started = time.perf_counter()
+        bot = PulseBot("0:benchmark", warm_up=False)
+        startup = time.perf_counter() - started
+        started = time.perf_counter()
+        bot.warm_up()
+        warm_up = time.perf_counter() - started
+        print(f"⏱️  Pipeline started in {startup:.2f}s, warmed up in {warm_up:.2f}s, "
+              f"peak RSS {peak_memory_mb():.1f} MB")
+
+        genes = corpus_genes(bot.db_connection)
+        corpus = build_corpus(args.queries, genes, args.seed)
+        print(f"📋 Corpus: {len(corpus)} questions")
+
+        levels = []
+        for clients in [int(c) for c in args.clients.split(",") if c.strip()]:
+            level = run_level(bot, corpus, clients, args.repeat, config.LLM_STREAMING, args.end_to_end)
+            print_level(level)
+            levels.append(level)
+
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "settings": {
+                "corpus_size": len(corpus),
+                "repeat": args.repeat,
+                "llm": args.llm_url or "fake",
+                "llm_latency": args.llm_latency,
+                "token_delay": args.token_delay,
+                "answer_tokens": args.answer_tokens,
+                "warm": args.warm,
+                "embeddings": config.EMBEDDINGS_ENABLED,
+                "streaming": config.LLM_STREAMING,
+                "end_to_end": args.end_to_end,
+                "pipeline": config.PIPELINE_ENABLED,
+                "seed": args.seed,
+            },
+            "startup_seconds": round(startup, 3),
+            "warm_up_seconds": round(warm_up, 3),
+            "components": bot.readiness(),
+            "startup_rss_growth_mb": round(peak_memory_mb() - memory_before, 1),
+            "llm_requests": server.requests if server else None,
+            "db_pool": bot.db_connection.pool_stats(),
+            "levels": levels,
+        }
+        if args.output:
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"\n💾 Results written to {args.output}")
+
+        bot.dispatcher.shutdown()
+        bot.db_connection.close_all()
+
+    except Exception as e:
+        print(f"❌ Error during benchmark: {e}")
+        sys.exit(1)
+    finally:
+        if server is not None:
+            server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Embedding generation script for Pulse AI Assistant.
+Embeds new or changed gene descriptions into N.embedding and optionally exports
+the in-process vector index.
+"""
+import argparse
+import logging
+import sys
+import psycopg2
+from pathlib import Path
+
+# Add project root to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.core.config import config
+from src.embeddings.generator import EmbeddingGenerator
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate gene description embeddings")
+    parser.add_argument("--model", default=config.EMBEDDINGS_MODEL, help="SentenceTransformer model name")
+    parser.add_argument("--batch-size", type=int, default=config.EMBEDDINGS_BATCH_SIZE,
+                        help="Texts per model forward pass")
+    parser.add_argument("--chunk-size", type=int, default=config.EMBEDDINGS_CHUNK_SIZE,
+                        help="Rows fetched from the server-side cursor and written per commit")
+    parser.add_argument("--backend", default=config.EMBEDDINGS_BACKEND, choices=["torch", "onnx", "onnx-int8"],
+                        help="Inference backend for the model")
+    parser.add_argument("--force", action="store_true", help="Re-embed every gene, ignoring stored hashes")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Run the model for every text instead of reusing the on-disk text cache")
+    parser.add_argument("--export-index", action="store_true",
+                        help="Export the vector index and refresh the neighbour table in EMBEDDINGS_CACHE_PATH afterwards")
+    return parser.parse_args()
+
+def export_index() -> int:
+    """Export N.embedding to the memory-mapped matrix used by VectorIndex."""
+    from src.database.connection import DatabaseConnection
+    from src.embeddings.storage import EmbeddingStorage
+
+    db = DatabaseConnection(max_connections=1)
+    try:
+        return EmbeddingStorage().build_from_db(db)
+    finally:
+        db.close_all()
+
+def refresh_neighbors():
+    """Recompute the neighbour table rows affected by changed embeddings."""
+    from src.embeddings.search import refresh_neighbor_table
+
+    return refresh_neighbor_table()
+
+def main():
+    """Main embedding generation function."""
+    config.load()
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print("🚀 Generating gene embeddings...")
+
+    try:
+        # Reads go through a server-side cursor, so writes need their own connection
+        read_conn = psycopg2.connect(config.DB_URI)
+        write_conn = psycopg2.connect(config.DB_URI)
+
+        generator = EmbeddingGenerator(
+            model_name=args.model,
+            batch_size=args.batch_size,
+            chunk_size=args.chunk_size,
+            backend=args.backend,
+            use_cache=not args.no_cache
+        )
+        stats = generator.run(read_conn, write_conn, force=args.force)
+
+        read_conn.close()
+        write_conn.close()
+
+        print(f"\n📊 Embedding generation complete!")
+        print(f"   Scanned: {stats['scanned']} genes")
+        print(f"   Embedded: {stats['embedded']} genes")
+        print(f"   Unchanged: {stats['skipped']} genes")
+        print(f"   Time: {stats['elapsed']}s")
+        if generator.cache is not None:
+            cache_stats = generator.cache.stats()
+            print(f"   Text cache: {cache_stats['hits']} hits, {cache_stats['misses']} encoded")
+
+        if args.export_index:
+            exported = export_index()
+            print(f"✅ Exported {exported} vectors to {config.EMBEDDINGS_CACHE_PATH}")
+            genes, recomputed = refresh_neighbors()
+            print(f"✅ Neighbour table: {recomputed} of {genes} genes recomputed (top-{config.NEIGHBORS_TOP_K})")
+
+    except Exception as e:
+        print(f"❌ Error during embedding generation: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,20 @@
 Database setup script for Pulse AI Assistant.
 Creates tables, adds pgvector extension, and imports data.
 """
+import csv
+import io
 import os
 import sys
+import time
 import psycopg2
-import pandas as pd
 from pathlib import Path
 
 # Add src to path for imports
 sys.path.append(str(Path(__file__).parent.parent / 'src'))
 
 from src.core.config import config
+from src.database.connection import DATA_GENERATION_CHANNEL
+from src.utils.helpers import peak_memory_mb
 
 def create_tables(conn):
     """Create database tables."""
@@ -31,7 +35,8 @@ def create_tables(conn):
         degree_layout INTEGER,
         stringdb_description TEXT,
         target_family TEXT,
-        embedding vector(384)
+        embedding vector(384),
+        embedding_hash TEXT
     );
     
     -- Create E (Edges/Interactions) table
@@ -47,9 +52,16 @@ def create_tables(conn):
         stringdb_textmining FLOAT4
     );
     
+    -- Data generation counter, survives reloads so caches can detect them
+    CREATE TABLE IF NOT EXISTS pulse_meta (
+        key TEXT PRIMARY KEY,
+        value BIGINT NOT NULL
+    );
+    
     -- Create indexes for better performance
     CREATE INDEX idx_n_display_name ON N(display_name);
     CREATE INDEX idx_n_family ON N(target_family);
+    CREATE INDEX idx_n_family_lower ON N(lower(target_family));
     CREATE INDEX idx_n_degree ON N(degree_layout DESC);
     """
     
@@ -58,53 +70,184 @@ def create_tables(conn):
     conn.commit()
     print("✅ Tables created successfully")
 
-def import_data(conn, data_dir: Path):
-    """Import data from CSV files."""
-    # Import N table data
-    n_path = data_dir / "raw" / "N_table_filtered.csv"
-    if n_path.exists():
-        df_n = pd.read_csv(n_path)
-        # Rename columns to match our schema
-        df_n = df_n.rename(columns={
-            'degree.layout': 'degree_layout',
-            'display name': 'display_name',
-            'stringdb::description': 'stringdb_description',
-            'target::family': 'target_family'
-        })
-        
-        with conn.cursor() as cur:
-            for _, row in df_n.iterrows():
-                cur.execute("""
-                    INSERT INTO N (name, display_name, degree_layout, stringdb_description, target_family)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (name) DO NOTHING
-                """, (row['name'], row['display_name'], row['degree_layout'], 
-                      row['stringdb_description'], row['target_family']))
-        print(f"✅ Imported {len(df_n)} records to N table")
-    
-    # Import E table data
-    e_path = data_dir / "raw" / "E_table_filtered.csv"
-    if e_path.exists():
-        df_e = pd.read_csv(e_path, sep=';')
-        
-        with conn.cursor() as cur:
-            for _, row in df_e.iterrows():
-                cur.execute("""
-                    INSERT INTO E (
-                        name, stringdb_coexpression, stringdb_cooccurrence,
-                        stringdb_databases, stringdb_experiments, stringdb_fusion,
-                        stringdb_neighborhood, stringdb_score, stringdb_textmining
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (name) DO NOTHING
-                """, (row['name'], row['stringdb_coexpression'], row['stringdb_cooccurrence'],
-                      row['stringdb_databases'], row['stringdb_experiments'], row['stringdb_fusion'],
-                      row['stringdb_neighborhood'], row['stringdb_score'], row['stringdb_textmining']))
-        print(f"✅ Imported {len(df_e)} records to E table")
-    
+# CSV header -> table column
+N_COLUMNS = {
+    'name': 'name',
+    'display name': 'display_name',
+    'degree.layout': 'degree_layout',
+    'stringdb::description': 'stringdb_description',
+    'target::family': 'target_family',
+}
+
+E_COLUMNS = {
+    column: column for column in (
+        'name', 'stringdb_coexpression', 'stringdb_cooccurrence',
+        'stringdb_databases', 'stringdb_experiments', 'stringdb_fusion',
+        'stringdb_neighborhood', 'stringdb_score', 'stringdb_textmining'
+    )
+}
+
+# Staging columns are TEXT; these casts are applied once in the merge step
+N_CASTS = {
+    'degree_layout': "NULLIF(degree_layout, '')::numeric::integer",
+}
+E_CASTS = {
+    column: f"NULLIF(replace({column}, ',', '.'), '')::float4"
+    for column in E_COLUMNS if column != 'name'
+}
+
+SECONDARY_INDEXES = {
+    'idx_n_display_name': "CREATE INDEX IF NOT EXISTS idx_n_display_name ON N(display_name)",
+    'idx_n_family': "CREATE INDEX IF NOT EXISTS idx_n_family ON N(target_family)",
+    'idx_n_family_lower': "CREATE INDEX IF NOT EXISTS idx_n_family_lower ON N(lower(target_family))",
+    'idx_n_degree': "CREATE INDEX IF NOT EXISTS idx_n_degree ON N(degree_layout DESC)",
+}
+
+COPY_CHUNK_ROWS = int(os.getenv("COPY_CHUNK_ROWS", "50000"))
+
+SUMMARY_MIGRATION = Path(__file__).parent.parent / "data" / "migrations" / "005_summary_tables.sql"
+# Materialized views from SUMMARY_MIGRATION, in dependency order
+SUMMARY_VIEWS = [
+    'edge_endpoints',
+    'gene_edge_stats',
+    'gene_top_interactions',
+    'family_stats',
+    'gene_degree_ranks',
+    'edge_score_stats',
+]
+
+def iter_csv_chunks(path: Path, sep: str, columns: dict, chunk_rows: int = COPY_CHUNK_ROWS):
+    """Stream a CSV file as COPY-ready CSV buffers of at most chunk_rows rows."""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f, delimiter=sep)
+        missing = [header for header in columns if header not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path.name} is missing columns: {', '.join(missing)}")
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        rows = 0
+        for record in reader:
+            writer.writerow([record[header] for header in columns])
+            rows += 1
+            if rows == chunk_rows:
+                buffer.seek(0)
+                yield buffer, rows
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                rows = 0
+        if rows:
+            buffer.seek(0)
+            yield buffer, rows
+
+def copy_table(conn, path: Path, table: str, sep: str, columns: dict, casts: dict) -> int:
+    """
+    Load a CSV into a TEXT staging table with COPY FROM STDIN, then merge it into
+    the target table in one statement. Like the row-by-row import it replaces, the
+    first CSV row of a duplicated name wins and rows already in the table are kept.
+    """
+    target_columns = list(columns.values())
+    staging = f"staging_{table.lower()}"
+    column_list = ", ".join(target_columns)
+
+    with conn.cursor() as cur:
+        # ordinal is filled in file order by COPY, so duplicates can be resolved deterministically
+        cur.execute(
+            f"CREATE TEMP TABLE {staging} (ordinal BIGSERIAL, "
+            f"{', '.join(f'{c} TEXT' for c in target_columns)}) ON COMMIT DROP"
+        )
+
+        loaded = 0
+        for buffer, rows in iter_csv_chunks(path, sep, columns):
+            cur.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+            loaded += rows
+
+        select_list = ", ".join(casts.get(c, c) for c in target_columns)
+        # DISTINCT ON keeps the first row per key, ON CONFLICT cannot touch a row twice
+        cur.execute(f"""
+            INSERT INTO {table} ({column_list})
+            SELECT DISTINCT ON (name) {select_list}
+            FROM {staging}
+            ORDER BY name, ordinal
+            ON CONFLICT (name) DO NOTHING
+        """)
+    return loaded
+
+def drop_secondary_indexes(conn):
+    """Drop N secondary indexes so the load does not maintain them row by row."""
+    with conn.cursor() as cur:
+        for index_name in SECONDARY_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+def create_secondary_indexes(conn):
+    """Rebuild N secondary indexes in one pass over the loaded table."""
+    with conn.cursor() as cur:
+        for index_sql in SECONDARY_INDEXES.values():
+            cur.execute(index_sql)
+
+def create_summary_tables(conn):
+    """Create the summary views; create_tables drops them along with N and E."""
+    with conn.cursor() as cur:
+        cur.execute(SUMMARY_MIGRATION.read_text(encoding="utf-8"))
     conn.commit()
+    print("✅ Summary views created")
+
+def refresh_summary_tables(conn):
+    """Recompute every summary view from the freshly imported N and E."""
+    with conn.cursor() as cur:
+        for view in SUMMARY_VIEWS:
+            cur.execute(f"REFRESH MATERIALIZED VIEW {view}")
+
+def bump_data_generation(conn) -> int:
+    """
+    Increment the data generation so running bots drop their caches.
+    The notification is delivered when the import transaction commits, not before.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO pulse_meta (key, value) VALUES ('data_generation', 1)
+            ON CONFLICT (key) DO UPDATE SET value = pulse_meta.value + 1
+            RETURNING value
+        """)
+        generation = cur.fetchone()[0]
+        cur.execute("SELECT pg_notify(%s, %s)", (DATA_GENERATION_CHANNEL, str(generation)))
+        return generation
+
+def import_data(conn, data_dir: Path):
+    """Import data from CSV files with COPY."""
+    imports = [
+        ("N", data_dir / "raw" / "N_table_filtered.csv", ',', N_COLUMNS, N_CASTS),
+        ("E", data_dir / "raw" / "E_table_filtered.csv", ';', E_COLUMNS, E_CASTS),
+    ]
+
+    drop_secondary_indexes(conn)
+    try:
+        for table, path, sep, columns, casts in imports:
+            if not path.exists():
+                continue
+            started = time.perf_counter()
+            loaded = copy_table(conn, path, table, sep, columns, casts)
+            elapsed = time.perf_counter() - started
+            rate = loaded / elapsed if elapsed > 0 else 0.0
+            print(f"✅ Imported {loaded} records to {table} table "
+                  f"({elapsed:.2f}s, {rate:,.0f} rows/sec, peak memory {peak_memory_mb():.1f} MB)")
+
+        started = time.perf_counter()
+        create_secondary_indexes(conn)
+        print(f"✅ Rebuilt indexes ({time.perf_counter() - started:.2f}s)")
+        started = time.perf_counter()
+        refresh_summary_tables(conn)
+        print(f"✅ Refreshed {len(SUMMARY_VIEWS)} summary views ({time.perf_counter() - started:.2f}s)")
+        generation = bump_data_generation(conn)
+        conn.commit()
+        print(f"✅ Data generation is now {generation}")
+    except Exception:
+        conn.rollback()
+        raise
 
 def main():
     """Main setup function."""
+    config.load()
     print("🚀 Setting up Pulse database...")
     
     try:
@@ -114,6 +257,7 @@ def main():
         
         # Create tables
         create_tables(conn)
+        create_summary_tables(conn)
         
         # Import data
         data_dir = Path(__file__).parent.parent / "data"
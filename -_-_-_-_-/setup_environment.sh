@@ -17,7 +17,9 @@ pip install --upgrade pip
 # Install requirements
 echo "📥 Installing requirements..."
 pip install psycopg2-binary pytelegrambotapi openai sentence-transformers
-pip install numpy pandas pyyaml python-dotenv pydantic tenacity
+pip install numpy pandas pyyaml python-dotenv pydantic tenacity aiohttp
+# ONNX Runtime for EMBEDDINGS_BACKEND=onnx / onnx-int8 (tokenizers and huggingface_hub come with sentence-transformers)
+pip install onnxruntime
 
 echo "✅ Environment setup complete!"
 echo ""
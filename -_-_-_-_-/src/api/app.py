@@ -0,0 +1,311 @@
+"""
+HTTP API for Pulse AI Assistant.
+Exposes the question → SQL → answer pipeline, hybrid search and bulk gene annotation,
+sharing the bot's database pool and caches, plus the Prometheus metrics.
+"""
+import asyncio
+import hmac
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+from src.core.config import config
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+BOT_KEY = web.AppKey("bot", object)
+LIMITER_KEY = web.AppKey("limiter", asyncio.Semaphore)
+EXECUTOR_KEY = web.AppKey("executor", ThreadPoolExecutor)
+
+# Components HybridSearcher degrades without
+SEARCH_COMPONENTS = ("gene_extractor", "vector_index", "graph", "encoder")
+
+# Endpoints that reach the database or the LLM; they require the API_TOKEN bearer token
+PROTECTED_PATHS = ("/query", "/search", "/genes", "/batch")
+
+MAX_FILTER_LENGTH = 100
+
+class BadRequest(ValueError):
+    """Invalid request payload; reported as HTTP 400."""
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+async def _payload(request: web.Request) -> Dict[str, Any]:
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise BadRequest("Request body must be JSON")
+    if not isinstance(payload, dict):
+        raise BadRequest("Request body must be a JSON object")
+    return payload
+
+def _string_list(payload: Dict[str, Any], key: str) -> List[str]:
+    values = payload.get(key)
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        raise BadRequest(f"'{key}' must be a list of strings")
+    return values
+
+def _optional_int(payload: Dict[str, Any], key: str, default: Optional[int] = None) -> Optional[int]:
+    value = payload.get(key, default)
+    if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+        raise BadRequest(f"'{key}' must be an integer")
+    return value
+
+def _optional_str(payload: Dict[str, Any], key: str) -> Optional[str]:
+    value = payload.get(key)
+    if value is not None and (not isinstance(value, str) or not 0 < len(value) <= MAX_FILTER_LENGTH):
+        raise BadRequest(f"'{key}' must be a string of 1 to {MAX_FILTER_LENGTH} characters")
+    return value
+
+def _authorized(request: web.Request) -> bool:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not config.API_TOKEN:
+        return False
+    return hmac.compare_digest(token.strip().encode("utf-8"), config.API_TOKEN.encode("utf-8"))
+
+async def _run(request: web.Request, func: Callable[..., Any], *args) -> Any:
+    """Run blocking pipeline code on the API executor, at most API_MAX_CONCURRENCY at a time."""
+    async with request.app[LIMITER_KEY]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(request.app[EXECUTOR_KEY], func, *args)
+
+def _answer_dict(question: str, answer) -> Dict[str, Any]:
+    return {
+        "question": question,
+        "answer": answer.text,
+        "path": answer.path,
+        "sql": answer.sql,
+        "ok": answer.ok,
+    }
+
+def annotate_genes(bot, genes: List[str]) -> Dict[str, Any]:
+    """
+    Look up N rows for a gene list in chunks of API_GENE_CHUNK_SIZE.
+    Matching is case-insensitive on display_name; unknown genes are listed separately.
+    """
+    wanted = {}
+    for gene in genes:
+        gene = gene.strip()
+        if gene:
+            wanted.setdefault(gene.upper(), gene)
+
+    found: Dict[str, Dict[str, Any]] = {}
+    symbols = list(wanted)
+    for start in range(0, len(symbols), config.API_GENE_CHUNK_SIZE):
+        chunk = symbols[start:start + config.API_GENE_CHUNK_SIZE]
+        # Both spellings: display names are mostly, but not always, upper case
+        lookup = sorted(set(chunk) | {wanted[symbol] for symbol in chunk})
+        for name, display_name, description, family, degree in bot.genes.find(display_names=lookup):
+            found.setdefault(display_name.upper(), {
+                "gene": display_name,
+                "name": name,
+                "description": description,
+                "family": family,
+                "connections": degree,
+            })
+
+    return {
+        "genes": [found[symbol] for symbol in symbols if symbol in found],
+        "not_found": [wanted[symbol] for symbol in symbols if symbol not in found],
+    }
+
+def _search(bot, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return bot.searcher.search(
+        payload["query"],
+        top_k=payload["top_k"],
+        min_degree=payload.get("min_degree"),
+        family=payload.get("family"),
+        near_gene=payload.get("near_gene"),
+        max_hops=payload["max_hops"],
+        min_edge_score=payload["min_edge_score"]
+    )
+
+def _search_params(payload: Dict[str, Any]) -> Dict[str, Any]:
+    query = payload.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise BadRequest("'query' is required")
+    params = dict(payload)
+    params["top_k"] = _optional_int(payload, "top_k", 10)
+    if params["top_k"] is None or not 1 <= params["top_k"] <= 100:
+        raise BadRequest("'top_k' must be between 1 and 100")
+    params["max_hops"] = _optional_int(payload, "max_hops", 2)
+    if params["max_hops"] is None or not 1 <= params["max_hops"] <= 5:
+        raise BadRequest("'max_hops' must be between 1 and 5")
+    min_degree = _optional_int(payload, "min_degree")
+    if min_degree is not None and min_degree < 0:
+        raise BadRequest("'min_degree' must not be negative")
+    min_edge_score = payload.get("min_edge_score", 0.0)
+    if (
+        not isinstance(min_edge_score, (int, float)) or isinstance(min_edge_score, bool)
+        or not 0.0 <= min_edge_score <= 1.0
+    ):
+        raise BadRequest("'min_edge_score' must be a number between 0 and 1")
+    params["min_edge_score"] = float(min_edge_score)
+    _optional_str(payload, "family")
+    _optional_str(payload, "near_gene")
+    return params
+
+async def handle_query(request: web.Request) -> web.Response:
+    """POST {"question": "..."} → answer from the same pipeline as the bot."""
+    payload = await _payload(request)
+    question = payload.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise BadRequest("'question' is required")
+    answer = await _run(request, request.app[BOT_KEY].answer, question)
+    return web.json_response(_answer_dict(question, answer))
+
+async def handle_search(request: web.Request) -> web.Response:
+    """POST {"query": "...", "top_k", "min_degree", "family", "near_gene", "max_hops"} → hybrid search."""
+    payload = _search_params(await _payload(request))
+    bot = request.app[BOT_KEY]
+    results = await _run(request, _search, bot, payload)
+    # Results are still served while warming up, without the legs that aren't loaded yet
+    warming = [
+        name for name, state in bot.readiness().items()
+        if name in SEARCH_COMPONENTS and state == "pending"
+    ]
+    return web.json_response({"query": payload["query"], "results": results, "warming": warming})
+
+async def handle_genes(request: web.Request) -> web.Response:
+    """POST {"genes": [...]} → N annotations for every known gene."""
+    genes = _string_list(await _payload(request), "genes")
+    if len(genes) > config.API_BATCH_MAX_ITEMS:
+        raise BadRequest(f"At most {config.API_BATCH_MAX_ITEMS} genes per request")
+    result = await _run(request, annotate_genes, request.app[BOT_KEY], genes)
+    return web.json_response(result)
+
+async def handle_batch(request: web.Request) -> web.Response:
+    """
+    POST {"questions": [...]} and/or {"gene_lists": [[...], ...]}.
+    Items run concurrently, bounded by API_MAX_CONCURRENCY; a failing item does not fail the batch.
+    """
+    payload = await _payload(request)
+    questions = _string_list(payload, "questions") if "questions" in payload else []
+    gene_lists = payload.get("gene_lists", [])
+    if not isinstance(gene_lists, list) or not all(
+        isinstance(genes, list) and all(isinstance(g, str) for g in genes) for genes in gene_lists
+    ):
+        raise BadRequest("'gene_lists' must be a list of lists of strings")
+    if not questions and not gene_lists:
+        raise BadRequest("'questions' or 'gene_lists' is required")
+    if len(questions) > config.API_BATCH_MAX_QUESTIONS:
+        raise BadRequest(f"At most {config.API_BATCH_MAX_QUESTIONS} questions per batch")
+    if sum(len(genes) for genes in gene_lists) > config.API_BATCH_MAX_ITEMS:
+        raise BadRequest(f"At most {config.API_BATCH_MAX_ITEMS} genes per batch")
+
+    bot = request.app[BOT_KEY]
+
+    async def guarded(job: Awaitable[Dict[str, Any]], item: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            item.update(await job)
+        except Exception as e:
+            logger.error(f"Batch item failed: {e}")
+            item["error"] = str(e)
+        return item
+
+    async def answer(question: str) -> Dict[str, Any]:
+        return _answer_dict(question, await _run(request, bot.answer, question))
+
+    async def annotate(genes: List[str]) -> Dict[str, Any]:
+        return await _run(request, annotate_genes, bot, genes)
+
+    with metrics.span("api_batch", questions=len(questions), gene_lists=len(gene_lists)):
+        question_results, gene_results = await asyncio.gather(
+            asyncio.gather(*(guarded(answer(q), {"question": q}) for q in questions)),
+            asyncio.gather(*(guarded(annotate(genes), {}) for genes in gene_lists))
+        )
+    return web.json_response({"questions": list(question_results), "gene_lists": list(gene_results)})
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """Prometheus scrape endpoint."""
+    return web.Response(
+        body=metrics.registry.render().encode("utf-8"),
+        headers={"Content-Type": PROMETHEUS_CONTENT_TYPE}
+    )
+
+async def handle_health(request: web.Request) -> web.Response:
+    """Liveness plus the warm-up state of the bot's components."""
+    bot = request.app.get(BOT_KEY)
+    if bot is None:
+        return web.json_response({"status": "ok"})
+    components = bot.readiness()
+    warming = any(state == "pending" for state in components.values())
+    return web.json_response({"status": "warming" if warming else "ok", "components": components})
+
+@web.middleware
+async def auth_middleware(request: web.Request, handler) -> web.StreamResponse:
+    if request.path in PROTECTED_PATHS and not _authorized(request):
+        response = _error(401, "Missing or invalid bearer token")
+        response.headers["WWW-Authenticate"] = "Bearer"
+        return response
+    return await handler(request)
+
+@web.middleware
+async def error_middleware(request: web.Request, handler) -> web.StreamResponse:
+    try:
+        return await handler(request)
+    except BadRequest as e:
+        return _error(400, str(e))
+    except web.HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"API error on {request.path}: {e}")
+        return _error(500, "Internal error")
+
+def create_app(bot=None) -> web.Application:
+    """
+    Build the aiohttp application.
+    Without a bot, or without API_TOKEN, only /metrics and /health are served.
+    """
+    app = web.Application(
+        middlewares=[auth_middleware, error_middleware],
+        client_max_size=config.API_MAX_BODY_BYTES
+    )
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/health", handle_health)
+    if bot is not None and not config.API_TOKEN:
+        logger.warning("API_TOKEN is not set, serving only /metrics and /health")
+    elif bot is not None:
+        app[BOT_KEY] = bot
+        app[LIMITER_KEY] = asyncio.Semaphore(config.API_MAX_CONCURRENCY)
+        executor = ThreadPoolExecutor(max_workers=config.API_MAX_CONCURRENCY, thread_name_prefix="pulse-api")
+        app[EXECUTOR_KEY] = executor
+
+        async def shutdown_executor(app: web.Application) -> None:
+            executor.shutdown(wait=False)
+
+        app.on_cleanup.append(shutdown_executor)
+        app.router.add_post("/query", handle_query)
+        app.router.add_post("/search", handle_search)
+        app.router.add_post("/genes", handle_genes)
+        app.router.add_post("/batch", handle_batch)
+    return app
+
+def start_in_background(bot=None, host: str = None, port: int = None) -> threading.Thread:
+    """Serve the API from a daemon thread with its own event loop, next to the bot's polling loop."""
+    host = host or config.API_HOST
+    port = port or config.API_PORT
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(create_app(bot))
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        logger.info(f"API listening on http://{host}:{port}")
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(runner.cleanup())
+            loop.close()
+
+    thread = threading.Thread(target=serve, name="pulse-api", daemon=True)
+    thread.start()
+    return thread
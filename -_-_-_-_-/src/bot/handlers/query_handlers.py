@@ -0,0 +1,71 @@
+"""
+Concurrent execution of user queries.
+Messages from different chats are processed in parallel by a worker pool,
+messages from the same chat are processed one at a time in arrival order.
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+class QueryDispatcher:
+    """Worker pool with per-chat ordering and a bounded number of pending queries."""
+
+    def __init__(self, handler: Callable[[Any], None], workers: int, max_pending: int):
+        self.handler = handler
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pulse-query")
+        self._lock = threading.Lock()
+        # chat_id -> messages waiting; a chat has an entry while a worker drains it
+        self._chats: Dict[int, Deque[Any]] = {}
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Queries accepted but not finished yet."""
+        with self._lock:
+            return self._pending
+
+    def submit(self, chat_id: int, message: Any) -> bool:
+        """
+        Queue a message for processing.
+        Returns False without queueing when the dispatcher is saturated.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+            queue = self._chats.get(chat_id)
+            if queue is not None:
+                # A worker is already draining this chat and will pick it up in order
+                queue.append(message)
+                return True
+            self._chats[chat_id] = deque([message])
+
+        self._executor.submit(self._drain, chat_id)
+        return True
+
+    def _drain(self, chat_id: int) -> None:
+        """Process queued messages of one chat sequentially."""
+        while True:
+            with self._lock:
+                queue = self._chats[chat_id]
+                if not queue:
+                    del self._chats[chat_id]
+                    return
+                message = queue.popleft()
+
+            try:
+                self.handler(message)
+            except Exception as e:
+                logger.error(f"Unhandled error in query handler: {e}")
+            finally:
+                with self._lock:
+                    self._pending -= 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work and wait for running queries."""
+        self._executor.shutdown(wait=wait)
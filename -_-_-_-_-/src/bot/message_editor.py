@@ -0,0 +1,62 @@
+"""
+Rate-limited progressive editing of a Telegram message.
+"""
+import logging
+import time
+from typing import Optional
+
+from telebot.apihelper import ApiTelegramException
+
+from src.core.config import config
+
+logger = logging.getLogger(__name__)
+
+# Appended to partial text while the answer is still being generated
+TYPING_CURSOR = " ▌"
+
+class ThrottledMessageEditor:
+    """Edits one message with growing text, at most once per interval."""
+
+    def __init__(self, bot, chat_id: int, message_id: int, min_interval: Optional[float] = None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.min_interval = config.TELEGRAM_EDIT_INTERVAL if min_interval is None else min_interval
+        self._shown = ""
+        self._next_edit = 0.0
+
+    def update(self, text: str) -> None:
+        """Show partial text if the edit interval has passed."""
+        text = text.strip()
+        if not text or time.monotonic() < self._next_edit:
+            return
+        self._edit(text + TYPING_CURSOR)
+
+    def finish(self, text: str, attempts: int = 3) -> None:
+        """Show the final text, waiting out pending rate limits if needed."""
+        for _ in range(attempts):
+            delay = self._next_edit - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._edit(text)
+            if self._shown == text:
+                return
+        logger.error("Could not deliver the final answer, Telegram kept rate limiting edits")
+
+    def _edit(self, text: str) -> None:
+        if text == self._shown:
+            return
+        self._next_edit = time.monotonic() + self.min_interval
+        try:
+            self.bot.edit_message_text(text, self.chat_id, self.message_id)
+            self._shown = text
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                # Too many requests: back off for as long as Telegram asks
+                retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", self.min_interval)
+                self._next_edit = time.monotonic() + float(retry_after)
+                logger.warning(f"Telegram edit rate limited for {retry_after}s")
+            elif "message is not modified" in str(e):
+                self._shown = text
+            else:
+                raise
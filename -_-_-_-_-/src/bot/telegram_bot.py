@@ -4,27 +4,204 @@ Based on the original giga_gen.py implementation.
 """
 import telebot
 import logging
-from typing import Optional
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
 
 from src.core.config import config
 from src.core import constants
+from src.core.exceptions import GenerationCancelled, QueryRejected
 from src.llm.client import LLMClient
+from src.llm.cache import ResponseCache
+from src.llm.sql_generator import IntentRouter, find_gene_symbols
+from src.llm.pipeline import PipelineOutcome, QueryPipeline
+from src.llm.response_builder import (
+    build_retrieval_context,
+    build_template_answer,
+    compact_result,
+    estimate_tokens
+)
 from src.database.connection import DatabaseConnection
+from src.database.query_guard import QueryGuard
+from src.database.result_cache import ResultCache
+from src.database.repositories.edge_repository import EdgeRepository
+from src.database.repositories.gene_repository import GeneRepository
+from src.database.repositories.query_repository import QueryRepository, is_read_only
 from src.search.hybrid_searcher import HybridSearcher
+from src.embeddings.search import NeighborTable, VectorIndex
+from src.embeddings.models import EmbeddingModel, MicroBatcher
+from src.embeddings.storage import EmbeddingCache
+from src.search.gene_extractor import GeneMentionExtractor
+from src.bot.handlers.query_handlers import QueryDispatcher
+from src.bot.message_editor import ThrottledMessageEditor
+from src.utils import metrics
+from src.utils.validators import check_read_only
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class Answer:
+    """Final answer to a question and how it was produced."""
+    text: str
+    # "template" for SQL_TEMPLATES answers, "llm" for generated SQL
+    path: str
+    sql: Optional[str] = None
+    ok: bool = True
+
 class PulseBot:
     """Main Telegram bot class."""
     
-    def __init__(self, token: str):
-        self.bot = telebot.TeleBot(token)
+    def __init__(self, token: str, warm_up: bool = True):
+        # Handlers only enqueue work, so they run in the polling thread to keep update order
+        self.bot = telebot.TeleBot(token, threaded=False)
+        # The OpenAI client and the DB pool are created on first use
         self.llm_client = LLMClient()
         self.db_connection = DatabaseConnection()
-        self.searcher = HybridSearcher(self.db_connection)
+        self.result_cache = self._create_result_cache()
+        self.genes = GeneRepository(self.db_connection, self.result_cache)
+        self.queries = QueryRepository(self.db_connection, self.result_cache)
+        # EXPLAIN-based limits for generated SQL, so one bad question can't tie up the database
+        self.query_guard = QueryGuard(self.db_connection) if config.SQL_GUARD_ENABLED else None
+        # Heavy components are filled in by warm_up(); until then the features using them degrade:
+        # regex gene matching, no vector search leg, no near_gene filter, exact-only caches
+        self.gene_extractor: Optional[GeneMentionExtractor] = None
+        # Query encoder shared by the vector search leg and the semantic cache
+        self.encoder: Optional[Callable[[List[str]], np.ndarray]] = None
+        self.text_cache: Optional[EmbeddingCache] = None
+        self.searcher = HybridSearcher(self.db_connection, result_cache=self.result_cache)
+        self.router = IntentRouter(gene_finder=self._find_genes)
+        self.sql_cache = self._create_cache()
+        self.response_cache = self._create_cache()
+        # Template matching, SQL generation and retrieval run concurrently for each question
+        self.pipeline = QueryPipeline(
+            self._answer_from_template,
+            self._generate_sql,
+            self._retrieve_context
+        ) if config.PIPELINE_ENABLED else None
+        self.dispatcher = QueryDispatcher(
+            self._handle_analytics_query,
+            workers=config.BOT_WORKERS,
+            max_pending=config.BOT_MAX_PENDING
+        )
+        self._readiness = {name: "pending" for name in self._warm_up_steps()}
+        self._readiness_lock = threading.Lock()
         
         # Register handlers
         self._register_handlers()
+        metrics.registry.register_collector(self._collect_metrics)
+        
+        if warm_up:
+            threading.Thread(target=self.warm_up, name="pulse-warm-up", daemon=True).start()
+    
+    def _warm_up_steps(self) -> Dict[str, Callable[[], bool]]:
+        """Components in warm-up order; each step returns False when there is nothing to load."""
+        steps = {
+            "database": self._warm_database,
+            "gene_extractor": self._warm_gene_extractor,
+            "llm": self._warm_llm,
+            "vector_index": self._warm_vector_index,
+            "graph": self._warm_graph,
+        }
+        if config.EMBEDDINGS_ENABLED:
+            # Loading the embedding model is the slowest step, so it goes last
+            steps["encoder"] = self._warm_encoder
+        return steps
+    
+    def warm_up(self) -> None:
+        """Initialize the heavy components; each one is used as soon as it is ready."""
+        with metrics.span("warm_up"):
+            for name, step in self._warm_up_steps().items():
+                with metrics.span("warm_up_step", component=name) as step_span:
+                    try:
+                        state = "ready" if step() else "unavailable"
+                    except Exception as e:
+                        logger.error(f"Warm-up of {name} failed: {e}")
+                        step_span["status"] = "error"
+                        state = "failed"
+                with self._readiness_lock:
+                    self._readiness[name] = state
+        logger.info(f"Warm-up finished: {self.readiness()}")
+    
+    def readiness(self) -> Dict[str, str]:
+        """Warm-up state of every component: pending, ready, unavailable or failed."""
+        with self._readiness_lock:
+            return dict(self._readiness)
+    
+    def _warm_database(self) -> bool:
+        # Opens the pool and reads the data generation the caches are keyed on
+        self.db_connection.data_generation()
+        # Imports are then seen when they commit instead of at the next poll
+        self.db_connection.start_generation_listener()
+        return True
+    
+    def _warm_gene_extractor(self) -> bool:
+        """Build the gene vocabulary from N."""
+        self.gene_extractor = GeneMentionExtractor.from_db(self.db_connection)
+        self.searcher.gene_extractor = self.gene_extractor
+        return True
+    
+    def _warm_llm(self) -> bool:
+        # Touching the property imports openai and builds the client
+        self.llm_client.client
+        return True
+    
+    def _warm_vector_index(self) -> bool:
+        index = VectorIndex.load_if_available()
+        if index is not None:
+            # Gene-seeded similarity questions become row lookups
+            self.searcher.vector_searcher.neighbors = NeighborTable.load_if_available(index)
+        self.searcher.vector_index = index
+        return index is not None
+    
+    def _warm_graph(self) -> bool:
+        """Build the in-memory interaction graph from E."""
+        self.searcher.graph = EdgeRepository(self.db_connection).load_graph()
+        return True
+    
+    def _warm_encoder(self) -> bool:
+        model = EmbeddingModel()
+        model.load()
+        # The first forward pass also pays for allocations, keep it out of a real query
+        model.encode(["warm-up"])
+        # Concurrent queries (bot workers, API) share forward passes
+        encoder = MicroBatcher(model.encode).encode
+        if config.EMBEDDINGS_TEXT_CACHE_MAX_MB > 0:
+            # Questions embedded before a restart skip the forward pass
+            self.text_cache = EmbeddingCache(model.identity)
+            encoder = self.text_cache.wrap(encoder)
+        # Published only now: until then the vector leg and the semantic cache level are off,
+        # so no query waits for the model to load
+        self.encoder = encoder
+        self.searcher.encoder = self.encoder
+        if config.LLM_CACHE_SEMANTIC:
+            self.sql_cache.encoder = self.encoder
+            self.response_cache.encoder = self.encoder
+        return True
+    
+    def _find_genes(self, text: str) -> List[str]:
+        """Gene mentions via the full vocabulary once it is built, regex symbols before that."""
+        extractor = self.gene_extractor
+        if extractor is not None:
+            return extractor.extract(text)
+        return find_gene_symbols(text)
+    
+    def _create_result_cache(self) -> Optional[ResultCache]:
+        """Query result cache shared by the repositories, cleared whenever N/E are reloaded."""
+        if config.RESULT_CACHE_MAX_BYTES <= 0:
+            return None
+        return ResultCache(config.RESULT_CACHE_MAX_BYTES, generation=self.db_connection.data_generation)
+    
+    def _create_cache(self) -> ResponseCache:
+        """LLM response cache, cleared whenever N/E are reloaded."""
+        return ResponseCache(
+            max_entries=config.LLM_CACHE_MAX_ENTRIES,
+            ttl=config.LLM_CACHE_TTL,
+            similarity_threshold=config.LLM_CACHE_SIMILARITY,
+            encoder=self.encoder if config.LLM_CACHE_SEMANTIC else None,
+            generation=self.db_connection.data_generation
+        )
     
     def _register_handlers(self):
         """Register all message handlers."""
@@ -32,9 +209,13 @@ class PulseBot:
         def send_welcome(message):
             self._handle_welcome(message)
         
+        @self.bot.message_handler(commands=['stats'])
+        def send_stats(message):
+            self._handle_stats(message)
+        
         @self.bot.message_handler(func=lambda message: True)
         def handle_query(message):
-            self._handle_analytics_query(message)
+            self._enqueue_query(message)
     
     def _handle_welcome(self, message):
         """Send welcome message."""
@@ -47,6 +228,75 @@ class PulseBot:
         )
         self.bot.send_message(message.chat.id, welcome_text, parse_mode="HTML")
     
+    def _handle_stats(self, message):
+        """Send cache statistics."""
+        lines = ["📈 Статистика кэшей:"]
+        for title, cache in (("Генерация SQL", self.sql_cache), ("Форматирование", self.response_cache)):
+            stats = cache.stats()
+            lines.append(
+                f"{title}: {stats['exact_hits']} точных и {stats['semantic_hits']} семантических попаданий, "
+                f"{stats['misses']} промахов (hit rate {stats['hit_rate']:.0%}), записей: {stats['size']}"
+            )
+        if self.result_cache is not None:
+            stats = self.result_cache.stats()
+            lines.append(
+                f"Результаты SQL: {stats['hits']} попаданий, {stats['misses']} промахов "
+                f"(hit rate {stats['hit_rate']:.0%}), записей: {stats['entries']}, "
+                f"{stats['bytes'] / 1024 / 1024:.1f} МБ"
+            )
+        if self.text_cache is not None:
+            stats = self.text_cache.stats()
+            lines.append(
+                f"Эмбеддинги вопросов: {stats['hits']} попаданий, {stats['misses']} промахов "
+                f"(hit rate {stats['hit_rate']:.0%}), записей: {stats['size']}"
+            )
+        lines.append("⚙️ Компоненты: " + ", ".join(f"{name} — {state}" for name, state in self.readiness().items()))
+        self.bot.send_message(message.chat.id, "\n".join(lines))
+    
+    def _collect_metrics(self):
+        """Cache, connection pool and queue gauges for the /metrics endpoint."""
+        for name, cache in (("sql", self.sql_cache), ("response", self.response_cache)):
+            stats = cache.stats()
+            for kind in ("exact", "semantic"):
+                yield ("pulse_cache_hits_total", "counter", "Cache hits",
+                       {"cache": name, "kind": kind}, stats[f"{kind}_hits"])
+            yield ("pulse_cache_misses_total", "counter", "Cache misses", {"cache": name}, stats["misses"])
+            yield ("pulse_cache_entries", "gauge", "Entries held by the cache", {"cache": name}, stats["size"])
+        if self.result_cache is not None:
+            stats = self.result_cache.stats()
+            yield ("pulse_cache_hits_total", "counter", "Cache hits",
+                   {"cache": "result", "kind": "exact"}, stats["hits"])
+            yield ("pulse_cache_misses_total", "counter", "Cache misses", {"cache": "result"}, stats["misses"])
+            yield ("pulse_cache_entries", "gauge", "Entries held by the cache", {"cache": "result"}, stats["entries"])
+        if self.text_cache is not None:
+            stats = self.text_cache.stats()
+            yield ("pulse_cache_hits_total", "counter", "Cache hits",
+                   {"cache": "embedding", "kind": "exact"}, stats["hits"])
+            yield ("pulse_cache_misses_total", "counter", "Cache misses", {"cache": "embedding"}, stats["misses"])
+            yield ("pulse_cache_entries", "gauge", "Entries held by the cache", {"cache": "embedding"}, stats["size"])
+        
+        pool = self.db_connection.pool_stats()
+        yield ("pulse_db_connections_in_use", "gauge", "Checked out database connections", {}, pool["in_use"])
+        yield ("pulse_db_checkout_wait_seconds_total", "counter", "Time spent waiting for a connection",
+               {}, pool["wait_seconds_total"])
+        yield ("pulse_db_checkout_timeouts_total", "counter", "Connection checkouts that timed out",
+               {}, pool["checkout_timeouts"])
+        yield ("pulse_db_statement_timeouts_total", "counter", "Queries cancelled by statement_timeout",
+               {}, pool["statement_timeouts"])
+        yield ("pulse_bot_pending_queries", "gauge", "Queries waiting for a worker", {}, self.dispatcher.pending)
+        for name, state in self.readiness().items():
+            yield ("pulse_component_ready", "gauge", "1 once a component finished warming up",
+                   {"component": name}, 1 if state == "ready" else 0)
+    
+    def _enqueue_query(self, message):
+        """Hand the query to the worker pool, or reply that the bot is busy."""
+        if not self.dispatcher.submit(message.chat.id, message):
+            logger.warning(f"Query queue is full ({self.dispatcher.pending} pending), rejecting message")
+            self.bot.send_message(
+                message.chat.id,
+                "⏳ Сейчас я обрабатываю слишком много запросов. Пожалуйста, повторите вопрос через минуту."
+            )
+    
     def _handle_analytics_query(self, message):
         """Handle user query and generate response."""
         user_text = message.text
@@ -59,94 +309,278 @@ class PulseBot:
             parse_mode="HTML"
         )
         
+        editor = ThrottledMessageEditor(self.bot, chat_id, wait_msg.message_id)
         try:
-            # Step 1: Try hybrid search first (if implemented)
+            # Partial text is streamed into the wait message
+            answer = self.answer(
+                user_text,
+                on_progress=editor.update if config.LLM_STREAMING else None
+            )
+            
+            # Update message with final answer
+            with metrics.span("telegram_delivery"):
+                editor.finish(answer.text)
+            
+        except Exception as e:
+            logger.error(f"Error processing query: {e}")
+            self.bot.edit_message_text(
+                f"❌ Произошла ошибка при обработке запроса: {str(e)}",
+                chat_id,
+                wait_msg.message_id
+            )
+    
+    def answer(self, question: str, on_progress: Optional[Callable[[str], None]] = None) -> Answer:
+        """
+        Run the question → SQL → answer pipeline.
+        Shared by the Telegram handlers and the HTTP API; with on_progress the LLM answer is streamed.
+        """
+        with metrics.span("request") as request_span:
             if config.DEBUG:
-                logger.info(f"User query: {user_text}")
+                logger.info(f"User query: {question}")
             
-            # For now, use the original SQL generation approach
-            sql_query = self._generate_sql(user_text)
+            # Fast path: template questions are answered without the LLM
+            outcome = self._plan(question)
+            if outcome.template_answer is not None:
+                request_span["path"] = "template"
+                return Answer(text=outcome.template_answer, path="template")
+            
+            # Otherwise, use the original SQL generation approach
+            request_span["path"] = "llm"
+            sql_query = outcome.sql
             
             if not sql_query:
-                self.bot.edit_message_text(
-                    "❌ Не удалось сгенерировать запрос к базе данных.",
-                    chat_id,
-                    wait_msg.message_id
-                )
-                return
+                request_span["status"] = "error"
+                return Answer(text="❌ Не удалось сгенерировать запрос к базе данных.", path="llm", ok=False)
             
             if config.DEBUG:
                 logger.info(f"Generated SQL: {sql_query}")
             
             # Step 2: Execute SQL
-            data_result = self._execute_sql(sql_query)
+            data_result = self._execute_sql(sql_query, question)
             
             if config.DEBUG:
                 logger.info(f"DB Result: {data_result}")
             
             # Step 3: Format response
-            final_answer = self._format_response(user_text, data_result)
-            
-            # Update message with final answer
-            self.bot.edit_message_text(
-                final_answer,
-                chat_id,
-                wait_msg.message_id
-            )
-            
-        except Exception as e:
-            logger.error(f"Error processing query: {e}")
-            self.bot.edit_message_text(
-                f"❌ Произошла ошибка при обработке запроса: {str(e)}",
-                chat_id,
-                wait_msg.message_id
+            final_answer = self._format_response(
+                question,
+                data_result,
+                on_progress=on_progress,
+                context=outcome.context()
             )
+            return Answer(text=final_answer, path="llm", sql=sql_query)
+    
+    def _plan(self, question: str) -> PipelineOutcome:
+        """Template answer or generated SQL, from concurrent legs when the pipeline is enabled."""
+        if self.pipeline is not None:
+            return self.pipeline.run(question)
+        template_answer = self._answer_from_template(question)
+        if template_answer is not None:
+            return PipelineOutcome(template_answer=template_answer)
+        return PipelineOutcome(sql=self._generate_sql(question))
+    
+    def _retrieve_context(self, question: str, cancel: Optional[threading.Event] = None) -> str:
+        """
+        Genes related to the question from hybrid search, formatted for the formatter prompt.
+        Setting cancel skips the database round trip; an empty context is returned then.
+        """
+        with metrics.span("retrieve") as retrieve_span:
+            results = self.searcher.search(question, top_k=config.PIPELINE_CONTEXT_GENES, cancel=cancel)
+            retrieve_span["genes"] = len(results)
+        if not results:
+            return ""
+        return constants.SYSTEM_PROMPTS["retrieval_context"].format(genes=build_retrieval_context(results))
+    
+    def _answer_from_template(self, question: str) -> Optional[str]:
+        """Answer from a parameterized SQL template, or None to fall back to the LLM."""
+        route = self.router.route(question)
+        if route is None or route.confidence < config.ROUTER_MIN_CONFIDENCE:
+            return None
+        
+        if config.DEBUG:
+            logger.info(f"Template route: {route.intent} {route.params} ({route.confidence})")
+        
+        with metrics.span("template", intent=route.intent) as template_span:
+            try:
+                if route.sql is None:
+                    rows = self._graph_rows(route.intent, route.params)
+                else:
+                    rows = self._similar_genes(route.params) if route.intent == "similar_genes" else None
+                    if rows is None:
+                        rows = self.genes.run_template(route.intent, route.sql, route.params)
+            except Exception as e:
+                logger.error(f"Error executing template {route.intent}: {e}")
+                template_span["status"] = "error"
+                return None
+            if rows is None:
+                template_span["status"] = "unavailable"
+                return None
+            template_span["rows"] = len(rows)
+        # Graph queries resolve their genes first, so an empty result there is a real answer
+        if not rows and route.sql is not None:
+            # A misread question looks like this: the symbol may not be a gene at all or the
+            # family may be spelled differently in the data, so let the LLM interpret it
+            return None
+        return build_template_answer(route.intent, route.params, rows)
+    
+    def _graph_rows(self, intent: str, params: Dict[str, Any]) -> Optional[List[Tuple[Any, ...]]]:
+        """
+        Rows of an interaction graph intent, or None to leave the question to the LLM
+        when the graph is not loaded yet or does not know one of the genes.
+        """
+        graph = self.searcher.graph
+        genes = [params[key] for key in ("gene_name", "source", "target") if key in params]
+        if graph is None or any(graph.gene_id(gene) is None for gene in genes):
+            return None
+        min_score = params["min_score"]
+        
+        if intent == "gene_neighbors":
+            return graph.neighbors(params["gene_name"], min_score=min_score)
+        if intent == "gene_neighborhood":
+            hops = graph.k_hop(params["gene_name"], k=params["hops"], min_score=min_score)
+            return sorted(hops.items(), key=lambda item: (item[1], item[0]))
+        if intent == "interaction_path":
+            path = graph.shortest_path(params["source"], params["target"], min_score=min_score)
+            return [(gene,) for gene in path or []]
+        if intent == "gene_strong_connections":
+            label = graph.label(graph.gene_id(params["gene_name"]))
+            return [(label, graph.degree(params["gene_name"], min_score=min_score))]
+        if intent == "top_strong_connected":
+            degrees = graph.degrees(min_score=min_score)
+            return sorted(degrees.items(), key=lambda item: (-item[1], item[0]))[:params["limit"]]
+        raise ValueError(f"Unknown graph intent: {intent}")
     
-    def _generate_sql(self, question: str) -> Optional[str]:
-        """Generate SQL query from natural language question."""
+    def _similar_genes(self, params: Dict[str, Any]) -> Optional[List[Tuple[Any, ...]]]:
+        """(display_name, similarity) rows from the in-process index, or None to scan in pgvector."""
+        hits = self.searcher.vector_searcher.similar_genes(params["gene_name"], top_k=params["limit"])
+        if hits is None:
+            return None
+        return [(hit["display_name"], hit["similarity"]) for hit in hits]
+    
+    def _generate_sql(self, question: str, cancel: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        Generate SQL query from natural language question.
+        Setting cancel stops the LLM call; None is returned then.
+        """
+        cached = self.sql_cache.get(question)
+        if cached is not None:
+            return cached
+        
         prompt = constants.SYSTEM_PROMPTS["sql_generator"].format(
             schema=constants.DB_SCHEMA,
             question=question
         )
         
-        try:
-            response = self.llm_client.generate(prompt)
-            # Clean up response
-            sql = response.strip().replace("```sql", "").replace("```", "").strip()
-            return sql if sql.lower().startswith("select") else None
-        except Exception as e:
-            logger.error(f"Error generating SQL: {e}")
-            return None
+        with metrics.span("llm_sql") as sql_span:
+            try:
+                response = self.llm_client.generate(prompt, cancel=cancel)
+                # Clean up response
+                sql = response.strip().replace("```sql", "").replace("```", "").strip()
+                # Same parser as the guard: WITH queries and leading comments or parentheses pass
+                sql = check_read_only(sql)
+                self.sql_cache.put(question, sql)
+                return sql
+            except QueryRejected as e:
+                logger.warning(f"Generated SQL rejected: {e}")
+                sql_span["status"] = "error"
+                sql_span["rejected"] = e.reason
+                return None
+            except GenerationCancelled:
+                sql_span["cancelled"] = True
+                return None
+            except Exception as e:
+                logger.error(f"Error generating SQL: {e}")
+                sql_span["status"] = "error"
+                return None
     
-    def _execute_sql(self, sql_query: str) -> str:
-        """Execute SQL query safely."""
-        if not sql_query.lower().strip().startswith("select"):
+    def _execute_sql(self, sql_query: str, question: str = "") -> str:
+        """Execute SQL query safely; the result is compacted to fit the formatter prompt."""
+        if not is_read_only(sql_query):
             return "⚠️ Ошибка безопасности: Разрешены только запросы на чтение (SELECT)."
         
-        try:
-            result = self.db_connection.execute_query(sql_query)
-            return str(result) if result else "Запрос выполнен, но данных не найдено."
-        except Exception as e:
-            return f"Ошибка SQL: {e}"
+        max_rows = None
+        if self.query_guard is not None:
+            with metrics.span("sql_guard") as guard_span:
+                try:
+                    guarded = self.query_guard.check(sql_query)
+                except QueryRejected as e:
+                    guard_span["verdict"] = e.reason
+                    return f"⚠️ Запрос отклонён защитой базы данных: {e}"
+                except Exception as e:
+                    guard_span["status"] = "error"
+                    return f"Ошибка SQL: {e}"
+                guard_span["verdict"] = guarded.verdict.reason
+                guard_span["cached"] = guarded.cached
+                guard_span["cost"] = guarded.verdict.cost
+            sql_query, max_rows = guarded.sql, guarded.max_rows
+        
+        with metrics.span("sql_execute") as sql_span:
+            try:
+                # Server-side cursor with a row cap: an unbounded SELECT cannot flood memory.
+                # Repeated questions are served from the result cache until the next import.
+                result = self.queries.select(sql_query, max_rows=max_rows)
+            except Exception as e:
+                sql_span["status"] = "error"
+                return f"Ошибка SQL: {e}"
+            sql_span["rows"] = len(result)
+            sql_span["truncated"] = result.truncated
+            metrics.observe("pulse_sql_rows", len(result))
+        
+        if not result:
+            return "Запрос выполнен, но данных не найдено."
+        with metrics.span("compact", rows=len(result)) as compact_span:
+            data = compact_result(question, result)
+            compact_span["tokens"] = estimate_tokens(data)
+        return data
     
-    def _format_response(self, question: str, data: str) -> str:
-        """Format raw data into human-readable response."""
+    def _format_response(
+        self,
+        question: str,
+        data: str,
+        on_progress: Optional[Callable[[str], None]] = None,
+        context: str = ""
+    ) -> str:
+        """
+        Format raw data into human-readable response.
+        With on_progress, the answer is streamed and the callback receives the text so far;
+        context carries related genes from retrieval.
+        """
+        cached = self.response_cache.get(question, context=data + context)
+        if cached is not None:
+            return cached
+        
         prompt = constants.SYSTEM_PROMPTS["response_formatter"].format(
             question=question,
-            result=data
+            result=data,
+            context=context
         )
         
-        try:
-            response = self.llm_client.generate(prompt)
-            return response
-        except Exception as e:
-            logger.error(f"Error formatting response: {e}")
-            return "Не удалось сформировать текстовый ответ."
+        with metrics.span("llm_format", streaming=on_progress is not None) as format_span:
+            try:
+                if on_progress is None:
+                    response = self.llm_client.generate(prompt)
+                else:
+                    response = ""
+                    for delta in self.llm_client.generate_stream(prompt):
+                        response += delta
+                        on_progress(response)
+                    response = response.strip()
+                # Error texts from _execute_sql are transient, don't pin answers to them
+                if not data.startswith(("Ошибка SQL", "⚠️")):
+                    self.response_cache.put(question, response, context=data + context)
+                return response
+            except Exception as e:
+                logger.error(f"Error formatting response: {e}")
+                format_span["status"] = "error"
+                return "Не удалось сформировать текстовый ответ."
     
     def run(self):
         """Start the bot."""
         logger.info("Starting Pulse Telegram bot...")
-        self.bot.infinity_polling()
+        try:
+            self.bot.infinity_polling()
+        finally:
+            self.dispatcher.shutdown()
 
 # For backward compatibility (original giga_gen.py style)
 if __name__ == '__main__':
@@ -21,6 +21,19 @@ PostgreSQL Database Schema:
    - stringdb_neighborhood (FLOAT4)
    - stringdb_score (FLOAT4): Reliability score
    - stringdb_textmining (FLOAT4)
+
+3. Precomputed summaries (refreshed on every import; prefer them over GROUP BY / ORDER BY on N and E)
+   - gene_degree_ranks(display_name, target_family, degree_layout, degree_rank, family_rank):
+     genes ranked by degree_layout overall and within their family; top-N is WHERE degree_rank <= N
+   - family_stats(target_family, gene_count, avg_degree, max_degree, edge_count, avg_edge_score, top_gene):
+     one row per protein family
+   - gene_edge_stats(name, display_name, target_family, degree_layout, edge_count, avg_score, max_score,
+     min_score, strong_edge_count): stringdb_score aggregates of each gene's interactions
+     (strong = stringdb_score >= 0.7)
+   - gene_top_interactions(gene, partner, stringdb_score, rank): the 10 strongest partners of every gene
+     by display_name, rank 1 = strongest
+   - edge_score_stats(channel, edge_count, avg_value, min_value, max_value, median_value, p90_value):
+     distribution of each stringdb_* column over E; channel is the column name without "stringdb_"
 """
 
 # Example queries for the bot to suggest
@@ -33,12 +46,42 @@ EXAMPLE_QUERIES = [
     "🔹 Найди гены из семейства киназ.",
 ]
 
-# SQL templates for common queries
+# SQL templates for common queries (psycopg2 bound parameters)
 SQL_TEMPLATES = {
-    "gene_info": "SELECT display_name, stringdb_description, target_family, degree_layout FROM N WHERE display_name = '{gene_name}'",
-    "gene_connections": "SELECT degree_layout FROM N WHERE display_name = '{gene_name}'",
-    "top_connected": "SELECT display_name, degree_layout FROM N ORDER BY degree_layout DESC LIMIT {limit}",
-    "by_family": "SELECT display_name, target_family FROM N WHERE target_family = '{family}'",
+    "gene_info": "SELECT display_name, stringdb_description, target_family, degree_layout FROM N WHERE display_name = %(gene_name)s",
+    "gene_connections": "SELECT display_name, degree_layout FROM N WHERE display_name = %(gene_name)s",
+    "top_connected": "SELECT display_name, degree_layout FROM N ORDER BY degree_layout DESC NULLS LAST LIMIT %(limit)s",
+    # total is the family size, so the answer can say how many genes were left out
+    "by_family": (
+        "SELECT display_name, target_family, count(*) OVER () AS total FROM N "
+        "WHERE lower(target_family) = lower(%(family)s) ORDER BY display_name LIMIT %(limit)s"
+    ),
+    # Fallback for when the neighbour table is not loaded: a pgvector scan seeded with the gene's embedding
+    "similar_genes": (
+        "SELECT n.display_name, 1 - (n.embedding <=> seed.embedding) AS similarity "
+        "FROM N n, (SELECT name, embedding FROM N WHERE display_name = %(gene_name)s AND embedding IS NOT NULL LIMIT 1) seed "
+        "WHERE n.embedding IS NOT NULL AND n.name <> seed.name "
+        "ORDER BY n.embedding <=> seed.embedding LIMIT %(limit)s"
+    ),
+}
+
+# Genes listed in one template answer; a whole family or neighbourhood would not fit
+# into one Telegram message
+TEMPLATE_LIST_LIMIT = 30
+
+# Russian word stems -> target_family values, used by the template router.
+# Checked in order, so more specific stems come first.
+FAMILY_ALIASES = {
+    "киназ": "Kinase",
+    "фермент": "Enzyme",
+    "ядерн": "Nuclear Receptor",
+    "gpcr": "GPCR",
+    "рецептор": "GPCR",
+    "ионн": "Ion Channel",
+    "канал": "Ion Channel",
+    "транскрипц": "Transcription Factor",
+    "транспорт": "Transporter",
+    "эпигенет": "Epigenetic",
 }
 
 # System prompts for LLM
@@ -65,8 +108,12 @@ SYSTEM_PROMPTS = {
     
     User Question: "{question}"
     Database Raw Result: "{result}"
-    
+    {context}
     Task: Formulate a concise and professional answer in Russian based strictly on the data provided.
     Do not invent facts. Keep it under 3 sentences if possible.
+    """,
+    
+    # Inserted into response_formatter when hybrid search found related genes
+    "retrieval_context": """Related genes found by search (use only if relevant to the question): "{genes}"
     """
 }
@@ -0,0 +1,16 @@
+"""
+Exceptions shared across Pulse AI Assistant components.
+"""
+
+class QueryRejected(ValueError):
+    """
+    A SQL statement was refused before execution.
+    reason is a short machine-readable code: not_read_only, invalid, too_expensive or too_many_rows.
+    """
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+class GenerationCancelled(Exception):
+    """An LLM generation was stopped because its result is no longer needed."""
@@ -1,37 +1,322 @@
 """
 Database connection pool and query execution.
 """
+import logging
+import re
+import select
+import threading
+import time
+import uuid
 import psycopg2
-from psycopg2 import pool
-from typing import List, Tuple, Any
+from psycopg2 import pool, extensions
+from contextlib import contextmanager
+from typing import List, Tuple, Any, Dict, Iterator, Optional, Union
 from src.core.config import config
+from src.database.models import QueryResult
+
+logger = logging.getLogger(__name__)
+
+Params = Optional[Union[tuple, list, dict]]
+
+# scripts/setup_db.py notifies this channel with the new data generation when an import commits
+DATA_GENERATION_CHANNEL = "pulse_data_generation"
+# How long the listener waits for a notification before checking its connection again
+LISTEN_TIMEOUT_SECONDS = 30.0
+LISTEN_RETRY_SECONDS = 10.0
+
+_NAMED_PARAM = re.compile(r"%\((\w+)\)s")
+
+class PooledConnection(extensions.connection):
+    """psycopg2 connection that remembers which statements were prepared on it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: set = set()
 
 class DatabaseConnection:
     """Manages database connections."""
+
+    def __init__(self, min_connections: Optional[int] = None, max_connections: Optional[int] = None):
+        self.max_connections = max_connections or config.DB_POOL_MAX
+        self.min_connections = min(min_connections or config.DB_POOL_MIN, self.max_connections)
+        self._pool: Optional[pool.ThreadedConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+        self._available = threading.BoundedSemaphore(self.max_connections)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "in_use": 0,
+            "queries": 0,
+            "statement_timeouts": 0,
+        }
+        self._generation: Optional[int] = None
+        self._generation_checked = 0.0
+        # While the listener holds a LISTEN connection, _generation is pushed to us and not polled
+        self._listening = False
+        self._listener: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    @property
+    def connection_pool(self) -> pool.ThreadedConnectionPool:
+        """The pool is opened on first checkout, so constructing the bot does not wait for Postgres."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        self.min_connections,
+                        self.max_connections,
+                        config.DB_URI,
+                        connection_factory=PooledConnection
+                    )
+        return self._pool
     
-    def __init__(self, min_connections: int = 1, max_connections: int = 10):
-        self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-            min_connections,
-            max_connections,
-            config.DB_URI
-        )
-    
-    def execute_query(self, query: str, params: tuple = None) -> List[Tuple[Any, ...]]:
-        """Execute a query and return results."""
-        conn = self.connection_pool.getconn()
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """Check a connection out of the pool, waiting up to DB_POOL_TIMEOUT seconds."""
+        started = time.perf_counter()
+        if not self._available.acquire(timeout=config.DB_POOL_TIMEOUT):
+            with self._metrics_lock:
+                self._metrics["checkout_timeouts"] += 1
+            raise pool.PoolError(f"No database connection available within {config.DB_POOL_TIMEOUT}s")
         try:
-            with conn.cursor() as cur:
-                cur.execute(query, params or ())
-                if query.strip().lower().startswith("select"):
-                    return cur.fetchall()
-                conn.commit()
-                return []
-        except Exception as e:
-            conn.rollback()
-            raise e
+            conn = self.connection_pool.getconn()
+        except Exception:
+            self._available.release()
+            raise
+
+        waited = time.perf_counter() - started
+        with self._metrics_lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["in_use"] += 1
+            self._metrics["wait_seconds_total"] += waited
+            self._metrics["wait_seconds_max"] = max(self._metrics["wait_seconds_max"], waited)
+
+        try:
+            yield conn
         finally:
-            self.connection_pool.putconn(conn)
-    
+            # Broken connections are discarded instead of going back to the pool
+            self.connection_pool.putconn(conn, close=bool(conn.closed))
+            self._available.release()
+            with self._metrics_lock:
+                self._metrics["in_use"] -= 1
+
+    def _begin(self, cur, timeout_ms: Optional[int], read_only: bool = False) -> None:
+        """
+        Apply the statement timeout to the current transaction.
+        read_only makes the server refuse any write, whatever slipped past the lexical checks.
+        """
+        if read_only:
+            cur.execute("SET TRANSACTION READ ONLY")
+        timeout_ms = config.DB_STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+        cur.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+
+    def _record_error(self, error: Exception) -> None:
+        if isinstance(error, psycopg2.errors.QueryCanceled):
+            with self._metrics_lock:
+                self._metrics["statement_timeouts"] += 1
+
+    def execute_query(self, query: str, params: Params = None, timeout_ms: Optional[int] = None) -> List[Tuple[Any, ...]]:
+        """
+        Execute a query and return results.
+        timeout_ms overrides DB_STATEMENT_TIMEOUT_MS; 0 disables the timeout.
+        """
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    self._begin(cur, timeout_ms)
+                    cur.execute(query, params or None)
+                    self._count_query()
+                    if query.strip().lower().startswith("select"):
+                        rows = cur.fetchall()
+                        conn.rollback()
+                        return rows
+                    conn.commit()
+                    return []
+            except Exception as e:
+                self._record_error(e)
+                conn.rollback()
+                raise e
+
+    def stream_query(
+        self,
+        query: str,
+        params: Params = None,
+        max_rows: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        timeout_ms: Optional[int] = None
+    ) -> QueryResult:
+        """
+        Run a SELECT in a read-only transaction through a named server-side cursor.
+        Rows are fetched in batches and fetching stops at max_rows, so an
+        unbounded query never materializes the whole table client-side.
+        """
+        max_rows = config.SQL_MAX_ROWS if max_rows is None else max_rows
+        batch_size = batch_size or config.DB_FETCH_BATCH_SIZE
+
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as setup:
+                    self._begin(setup, timeout_ms, read_only=True)
+                with conn.cursor(name=f"pulse_{uuid.uuid4().hex}") as cur:
+                    cur.itersize = batch_size
+                    cur.execute(query, params or None)
+                    self._count_query()
+                    rows: List[Tuple[Any, ...]] = []
+                    truncated = False
+                    while True:
+                        batch = cur.fetchmany(min(batch_size, max_rows - len(rows) + 1))
+                        if not batch:
+                            break
+                        rows.extend(batch)
+                        if len(rows) > max_rows:
+                            rows = rows[:max_rows]
+                            truncated = True
+                            break
+                    columns = [column.name for column in cur.description or []]
+                conn.rollback()
+                return QueryResult(columns=columns, rows=rows, truncated=truncated)
+            except Exception as e:
+                self._record_error(e)
+                conn.rollback()
+                raise e
+
+    def explain(self, query: str, timeout_ms: Optional[int] = None) -> Dict[str, Any]:
+        """Planner estimates for a query (EXPLAIN without ANALYZE, nothing is executed)."""
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    self._begin(cur, timeout_ms, read_only=True)
+                    cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+                    self._count_query()
+                    plan = cur.fetchone()[0]
+                conn.rollback()
+                return plan[0]["Plan"]
+            except Exception as e:
+                self._record_error(e)
+                conn.rollback()
+                raise e
+
+    def execute_prepared(
+        self,
+        name: str,
+        query: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout_ms: Optional[int] = None
+    ) -> List[Tuple[Any, ...]]:
+        """
+        Execute a hot query as a server-side prepared statement.
+        The statement is PREPAREd once per pooled connection; query uses %(name)s placeholders.
+        """
+        params = params or {}
+        # Each distinct named parameter becomes a positional $n placeholder
+        order: List[str] = []
+        def positional(match):
+            if match.group(1) not in order:
+                order.append(match.group(1))
+            return f"${order.index(match.group(1)) + 1}"
+        prepared_sql = _NAMED_PARAM.sub(positional, query)
+        statement = f"pulse_{name}"
+
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    self._begin(cur, timeout_ms)
+                    if statement not in conn.prepared:
+                        # PREPARE is not transactional, the statement survives a later rollback
+                        cur.execute(f"PREPARE {statement} AS {prepared_sql}")
+                        conn.prepared.add(statement)
+                    if order:
+                        arguments = ", ".join(f"%({key})s" for key in order)
+                        cur.execute(f"EXECUTE {statement} ({arguments})", params)
+                    else:
+                        cur.execute(f"EXECUTE {statement}")
+                    self._count_query()
+                    rows = cur.fetchall()
+                conn.commit()
+                return rows
+            except Exception as e:
+                self._record_error(e)
+                conn.rollback()
+                # Keep the bookkeeping in sync with the server so the next call recovers
+                if isinstance(e, psycopg2.errors.InvalidSqlStatementName):
+                    conn.prepared.discard(statement)
+                elif isinstance(e, psycopg2.errors.DuplicatePreparedStatement):
+                    conn.prepared.add(statement)
+                raise e
+
+    def _count_query(self) -> None:
+        with self._metrics_lock:
+            self._metrics["queries"] += 1
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Checkout and wait-time metrics for sizing the pool."""
+        with self._metrics_lock:
+            stats = dict(self._metrics)
+        stats["max_connections"] = self.max_connections
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+    def data_generation(self) -> int:
+        """
+        Current N/E data generation, bumped by scripts/setup_db.py on every import.
+        With the listener connected an import is seen as soon as its notification arrives,
+        a few milliseconds after the commit. Without it the value is re-read at most every
+        DATA_GENERATION_CHECK_INTERVAL seconds, and caches keyed on it may serve pre-import
+        results for that long. Raises when pulse_meta cannot be read.
+        """
+        if self._listening and self._generation is not None:
+            return self._generation
+        now = time.monotonic()
+        if self._generation is None or now - self._generation_checked >= config.DATA_GENERATION_CHECK_INTERVAL:
+            rows = self.execute_query("SELECT value FROM pulse_meta WHERE key = 'data_generation'")
+            self._generation = rows[0][0] if rows else 0
+            self._generation_checked = now
+        return self._generation
+
+    def start_generation_listener(self) -> None:
+        """Follow import notifications on a dedicated connection, outside the pool."""
+        if self._listener is not None:
+            return
+        self._listener = threading.Thread(target=self._listen, name="pulse-db-listen", daemon=True)
+        self._listener.start()
+
+    def _listen(self) -> None:
+        while not self._closed.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(config.DB_URI)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {DATA_GENERATION_CHANNEL}")
+                    # Read after LISTEN, so an import committed in between is not missed
+                    cur.execute("SELECT value FROM pulse_meta WHERE key = 'data_generation'")
+                    row = cur.fetchone()
+                self._generation = row[0] if row else 0
+                self._listening = True
+                while not self._closed.is_set():
+                    if select.select([conn], [], [], LISTEN_TIMEOUT_SECONDS) == ([], [], []):
+                        continue
+                    # Raises once the server has gone away
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._generation = int(notify.payload)
+                        logger.info(f"Data generation is now {self._generation}")
+            except Exception as e:
+                logger.warning(f"Data generation listener disconnected, polling instead: {e}")
+            finally:
+                self._listening = False
+                self._generation_checked = 0.0
+                if conn is not None:
+                    conn.close()
+            self._closed.wait(LISTEN_RETRY_SECONDS)
+
     def close_all(self):
         """Close all connections in the pool."""
-        self.connection_pool.closeall()
+        self._closed.set()
+        if self._pool is not None:
+            self._pool.closeall()
@@ -0,0 +1,19 @@
+"""
+Data models for query results.
+"""
+from dataclasses import dataclass, field
+from typing import Any, List, Tuple
+
+@dataclass
+class QueryResult:
+    """Rows of a SELECT together with their column names."""
+    columns: List[str]
+    rows: List[Tuple[Any, ...]] = field(default_factory=list)
+    # True when the row cap cut the result short
+    truncated: bool = False
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def __bool__(self) -> bool:
+        return bool(self.rows)
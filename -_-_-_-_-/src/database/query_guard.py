@@ -0,0 +1,160 @@
+"""
+Pre-execution guard for SQL generated by the LLM.
+Statements are checked to be read-only, bounded with a LIMIT and costed with EXPLAIN
+before they may take a pooled connection. Verdicts are cached per query shape
+(literals stripped) and data generation, so repeated questions skip the EXPLAIN.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import psycopg2
+
+from src.core.config import config
+from src.core.exceptions import QueryRejected
+from src.database.connection import DatabaseConnection
+from src.utils import metrics
+from src.utils.validators import check_read_only, limit_query, query_shape
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class GuardVerdict:
+    """Decision for one query shape."""
+    allowed: bool
+    # accepted, rewritten, or the QueryRejected reason
+    reason: str
+    message: str = ""
+    # LIMIT applied to allowed statements
+    limit: Optional[int] = None
+    cost: Optional[float] = None
+    plan_rows: Optional[int] = None
+    # False when the verdict depends on the literals, not only on the query shape
+    cacheable: bool = True
+
+@dataclass
+class GuardedQuery:
+    """A statement that passed the guard, ready for QueryRepository.select."""
+    sql: str
+    max_rows: int
+    verdict: GuardVerdict
+    cached: bool
+
+def plan_estimates(plan: Dict[str, Any]) -> Tuple[float, int]:
+    """Total cost of an EXPLAIN plan and the largest row estimate of any of its nodes."""
+    rows = 0
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        rows = max(rows, int(node.get("Plan Rows", 0)))
+        nodes.extend(node.get("Plans", []))
+    return float(plan.get("Total Cost", 0.0)), rows
+
+class QueryGuard:
+    """
+    Refuses or rewrites generated SQL whose planner estimates exceed the configured limits.
+    A query above SQL_GUARD_MAX_COST is retried with SQL_GUARD_REWRITE_LIMIT rows, which lets
+    the planner stop early unless a sort or aggregate needs every row; one with a step
+    expected to produce more than SQL_GUARD_MAX_PLAN_ROWS rows (a runaway join) is refused.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseConnection,
+        max_cost: Optional[float] = None,
+        max_plan_rows: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        rewrite_limit: Optional[int] = None,
+        cache_size: Optional[int] = None
+    ):
+        self.db = db
+        self.max_cost = max_cost or config.SQL_GUARD_MAX_COST
+        self.max_plan_rows = max_plan_rows or config.SQL_GUARD_MAX_PLAN_ROWS
+        self.max_rows = max_rows or config.SQL_MAX_ROWS
+        self.rewrite_limit = rewrite_limit or config.SQL_GUARD_REWRITE_LIMIT
+        self.cache_size = config.SQL_GUARD_CACHE_SIZE if cache_size is None else cache_size
+        self._verdicts: "OrderedDict[Hashable, GuardVerdict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, sql: str) -> GuardedQuery:
+        """The statement to run, with its LIMIT; raises QueryRejected."""
+        statement = check_read_only(sql)
+        try:
+            key = (self.db.data_generation(), query_shape(statement))
+        except Exception as e:
+            # Verdicts can't be tied to the data they were made on; judge every statement afresh
+            logger.warning(f"Could not read data generation, not caching guard verdicts: {e}")
+            key = None
+        verdict = None
+        if key is not None:
+            with self._lock:
+                verdict = self._verdicts.get(key)
+                if verdict is not None:
+                    self._verdicts.move_to_end(key)
+        cached = verdict is not None
+        if verdict is None:
+            verdict = self._judge(statement)
+            if verdict.cacheable and key is not None:
+                self._remember(key, verdict)
+
+        metrics.inc("pulse_sql_guard_verdicts_total", verdict=verdict.reason, cached=str(cached).lower())
+        if not verdict.allowed:
+            raise QueryRejected(verdict.message, verdict.reason)
+        limited, _ = limit_query(statement, verdict.limit)
+        # The extra row in the LIMIT is what lets the cursor report truncation
+        return GuardedQuery(sql=limited, max_rows=verdict.limit - 1, verdict=verdict, cached=cached)
+
+    def _remember(self, key: Hashable, verdict: GuardVerdict) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._verdicts[key] = verdict
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+
+    def _estimate(self, statement: str, limit: int) -> Tuple[float, int]:
+        limited, _ = limit_query(statement, limit)
+        plan = self.db.explain(limited, timeout_ms=config.SQL_GUARD_EXPLAIN_TIMEOUT_MS)
+        return plan_estimates(plan)
+
+    def _judge(self, statement: str) -> GuardVerdict:
+        limit = self.max_rows + 1
+        try:
+            cost, plan_rows = self._estimate(statement, limit)
+        except psycopg2.ProgrammingError as e:
+            # Unknown columns, syntax errors: the same shape fails the same way every time
+            return GuardVerdict(False, "invalid", f"Query does not compile: {str(e).strip()}")
+        except psycopg2.DataError as e:
+            # A bad literal, e.g. an invalid cast; the same shape with other values may be fine
+            return GuardVerdict(False, "invalid", f"Query does not compile: {str(e).strip()}", cacheable=False)
+
+        if plan_rows > self.max_plan_rows:
+            logger.warning(f"Refused SQL, a plan step expects {plan_rows} rows: {statement}")
+            return GuardVerdict(
+                False,
+                "too_many_rows",
+                f"A plan step is expected to produce {plan_rows} rows, the limit is {self.max_plan_rows}",
+                cost=cost,
+                plan_rows=plan_rows
+            )
+        if cost <= self.max_cost:
+            return GuardVerdict(True, "accepted", limit=limit, cost=cost, plan_rows=plan_rows)
+
+        rewrite = self.rewrite_limit + 1
+        if rewrite < limit:
+            rewritten_cost, rewritten_rows = self._estimate(statement, rewrite)
+            if rewritten_cost <= self.max_cost:
+                logger.info(f"Rewrote SQL to LIMIT {self.rewrite_limit}, cost {cost:.0f} -> {rewritten_cost:.0f}")
+                return GuardVerdict(True, "rewritten", limit=rewrite, cost=rewritten_cost, plan_rows=rewritten_rows)
+
+        logger.warning(f"Refused SQL with estimated cost {cost:.0f}: {statement}")
+        return GuardVerdict(
+            False,
+            "too_expensive",
+            f"Estimated cost {cost:.0f} exceeds the limit of {self.max_cost:.0f}",
+            cost=cost,
+            plan_rows=plan_rows
+        )
@@ -0,0 +1,44 @@
+"""
+Common base for repositories: reads go through an optional result cache.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from src.core.config import config
+from src.database.connection import DatabaseConnection, Params
+from src.database.models import QueryResult
+from src.database.result_cache import ResultCache
+
+T = TypeVar("T")
+
+class BaseRepository:
+    """
+    Read access to N/E.
+    With a ResultCache, results are served from memory until the next data import.
+    """
+
+    def __init__(self, db: DatabaseConnection, cache: Optional[ResultCache] = None):
+        self.db = db
+        self.cache = cache
+
+    def _cached(self, sql: str, params: Any, load: Callable[[], T], kind: str = "rows") -> T:
+        if self.cache is None:
+            return load()
+        return self.cache.get_or_load(sql, params, load, kind=kind)
+
+    def _query(self, sql: str, params: Params = None, timeout_ms: Optional[int] = None) -> List[Tuple[Any, ...]]:
+        """Cached execute_query for SELECTs."""
+        return self._cached(sql, params, lambda: self.db.execute_query(sql, params, timeout_ms=timeout_ms))
+
+    def _prepared(self, name: str, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Tuple[Any, ...]]:
+        """Cached execute_prepared; the cache key is the SQL text, not the statement name."""
+        return self._cached(sql, params, lambda: self.db.execute_prepared(name, sql, params))
+
+    def _stream(self, sql: str, params: Params = None, max_rows: Optional[int] = None) -> QueryResult:
+        """Cached stream_query; results capped at different max_rows are kept apart."""
+        max_rows = config.SQL_MAX_ROWS if max_rows is None else max_rows
+        return self._cached(
+            sql,
+            (params, max_rows),
+            lambda: self.db.stream_query(sql, params, max_rows=max_rows),
+            kind="stream"
+        )
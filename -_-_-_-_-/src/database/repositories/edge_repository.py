@@ -0,0 +1,209 @@
+"""
+Interaction graph built from the E table.
+Edges are stored as CSR adjacency (indptr/indices) with parallel score arrays.
+"""
+import logging
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.database.repositories.base_repository import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+# Cytoscape edge names: "<source> (<interaction>) <target>"
+_EDGE_NAME = re.compile(r"^(?P<source>.+?) \((?P<interaction>[^)]*)\) (?P<target>.+)$")
+
+def parse_edge_name(name: str) -> Optional[Tuple[str, str]]:
+    """Extract (source, target) node names from an E.name value."""
+    match = _EDGE_NAME.match(name.strip())
+    if not match:
+        return None
+    return match.group("source"), match.group("target")
+
+class InteractionGraph:
+    """Undirected, score-weighted gene interaction graph in CSR form."""
+
+    def __init__(
+        self,
+        genes: List[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        scores: np.ndarray,
+        labels: Optional[Dict[str, str]] = None
+    ):
+        self.genes = genes
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.labels = labels or {}
+        # Genes are addressable by node name and by display name
+        self._ids: Dict[str, int] = {}
+        for gene_id, gene in enumerate(genes):
+            self._ids[gene] = gene_id
+            label = self.labels.get(gene)
+            if label:
+                self._ids.setdefault(label, gene_id)
+                self._ids.setdefault(label.upper(), gene_id)
+
+    @classmethod
+    def from_edges(
+        cls,
+        edges: Iterable[Tuple[str, str, Optional[float]]],
+        labels: Optional[Dict[str, str]] = None
+    ) -> "InteractionGraph":
+        """Build from (source, target, score) triples; duplicate pairs keep the best score."""
+        ids: Dict[str, int] = {}
+        sources: List[int] = []
+        targets: List[int] = []
+        weights: List[float] = []
+        for source, target, score in edges:
+            if source == target:
+                continue
+            s = ids.setdefault(source, len(ids))
+            t = ids.setdefault(target, len(ids))
+            sources.append(s)
+            targets.append(t)
+            weights.append(score if score is not None else 0.0)
+
+        genes = [None] * len(ids)
+        for gene, gene_id in ids.items():
+            genes[gene_id] = gene
+
+        # Both directions, sorted by (row, column, score desc) so duplicates can be dropped
+        rows = np.array(sources + targets, dtype=np.int32)
+        cols = np.array(targets + sources, dtype=np.int32)
+        values = np.array(weights + weights, dtype=np.float32)
+        order = np.lexsort((-values, cols, rows))
+        rows, cols, values = rows[order], cols[order], values[order]
+        if len(rows):
+            keep = np.ones(len(rows), dtype=bool)
+            keep[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            rows, cols, values = rows[keep], cols[keep], values[keep]
+
+        indptr = np.zeros(len(genes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(genes)), out=indptr[1:])
+        return cls(genes, indptr, cols, values, labels)
+
+    def __len__(self) -> int:
+        return len(self.genes)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices) // 2
+
+    def label(self, gene_id: int) -> str:
+        """Display name of a gene id, falling back to its node name."""
+        gene = self.genes[gene_id]
+        return self.labels.get(gene, gene)
+
+    def gene_id(self, gene: str) -> Optional[int]:
+        """Resolve a node name or display name."""
+        gene_id = self._ids.get(gene)
+        if gene_id is None:
+            gene_id = self._ids.get(gene.upper())
+        return gene_id
+
+    def _adjacent(self, gene_id: int, min_score: float) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[gene_id], self.indptr[gene_id + 1]
+        neighbours, scores = self.indices[start:end], self.scores[start:end]
+        if min_score > 0:
+            keep = scores >= min_score
+            neighbours, scores = neighbours[keep], scores[keep]
+        return neighbours, scores
+
+    def neighbors(self, gene: str, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """Direct interaction partners with their scores, strongest first."""
+        gene_id = self.gene_id(gene)
+        if gene_id is None:
+            return []
+        neighbours, scores = self._adjacent(gene_id, min_score)
+        order = np.argsort(-scores, kind="stable")
+        return [(self.label(int(neighbours[i])), float(scores[i])) for i in order]
+
+    def degree(self, gene: str, min_score: float = 0.0) -> int:
+        """Number of interaction partners, optionally counting only edges above min_score."""
+        gene_id = self.gene_id(gene)
+        if gene_id is None:
+            return 0
+        return len(self._adjacent(gene_id, min_score)[0])
+
+    def degrees(self, min_score: float = 0.0) -> Dict[str, int]:
+        """Recomputed degree of every gene."""
+        if min_score > 0:
+            # Trailing zero keeps every row offset a valid reduceat index
+            strong = np.append((self.scores >= min_score).astype(np.int64), 0)
+            counts = np.add.reduceat(strong, self.indptr[:-1])
+            # reduceat returns the next row's first element for empty rows
+            counts[np.diff(self.indptr) == 0] = 0
+        else:
+            counts = np.diff(self.indptr)
+        return {self.label(gene_id): int(count) for gene_id, count in enumerate(counts)}
+
+    def k_hop(self, gene: str, k: int = 2, min_score: float = 0.0) -> Dict[str, int]:
+        """Genes reachable within k hops over edges with score >= min_score, with their hop distance."""
+        gene_id = self.gene_id(gene)
+        if gene_id is None:
+            return {}
+        hops = np.full(len(self), -1, dtype=np.int32)
+        hops[gene_id] = 0
+        frontier = np.array([gene_id], dtype=np.int32)
+        for hop in range(1, k + 1):
+            if not len(frontier):
+                break
+            reached = np.concatenate([self._adjacent(int(g), min_score)[0] for g in frontier])
+            reached = np.unique(reached)
+            frontier = reached[hops[reached] < 0]
+            hops[frontier] = hop
+        return {
+            self.label(int(g)): int(hops[g])
+            for g in np.flatnonzero(hops > 0)
+        }
+
+    def shortest_path(self, source: str, target: str, min_score: float = 0.0) -> Optional[List[str]]:
+        """Fewest-hop path between two genes, or None if they are not connected."""
+        start, goal = self.gene_id(source), self.gene_id(target)
+        if start is None or goal is None:
+            return None
+        parents = {start: -1}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            if current == goal:
+                path = []
+                while current != -1:
+                    path.append(self.label(current))
+                    current = parents[current]
+                return path[::-1]
+            for neighbour in self._adjacent(current, min_score)[0]:
+                neighbour = int(neighbour)
+                if neighbour not in parents:
+                    parents[neighbour] = current
+                    queue.append(neighbour)
+        return None
+
+class EdgeRepository(BaseRepository):
+    """Access to the E table."""
+
+    def load_graph(self) -> InteractionGraph:
+        """
+        Build the in-memory interaction graph from E and N.
+        Bypasses the result cache: the graph itself is the long-lived copy.
+        """
+        labels = dict(self.db.execute_query("SELECT name, display_name FROM N", timeout_ms=0))
+        edges = []
+        skipped = 0
+        for name, score in self.db.execute_query("SELECT name, stringdb_score FROM E", timeout_ms=0):
+            endpoints = parse_edge_name(name)
+            if endpoints is None:
+                skipped += 1
+                continue
+            edges.append((endpoints[0], endpoints[1], score))
+
+        graph = InteractionGraph.from_edges(edges, labels)
+        if skipped:
+            logger.warning(f"Skipped {skipped} edges with unparseable names")
+        logger.info(f"Interaction graph built: {len(graph)} genes, {graph.edge_count} edges")
+        return graph
@@ -0,0 +1,43 @@
+"""
+Access to the N (genes) table.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.database.repositories.base_repository import BaseRepository
+
+class GeneRepository(BaseRepository):
+    """Gene lookups used by the template answers and hybrid search."""
+
+    def run_template(self, intent: str, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Tuple[Any, ...]]:
+        """Rows of a SQL_TEMPLATES entry, executed as a prepared statement."""
+        return self._prepared(intent, sql, params)
+
+    def find(
+        self,
+        display_names: Sequence[str] = (),
+        names: Sequence[str] = (),
+        min_degree: Optional[int] = None,
+        family: Optional[str] = None,
+        within: Optional[Sequence[str]] = None
+    ) -> List[Tuple[Any, ...]]:
+        """
+        (name, display_name, stringdb_description, target_family, degree_layout) of genes
+        matching display_names or names, filtered by degree, family and a gene subset.
+        """
+        return self._query(
+            """
+            SELECT name, display_name, stringdb_description, target_family, degree_layout
+            FROM N
+            WHERE (display_name = ANY(%(genes)s) OR name = ANY(%(names)s))
+              AND (%(min_degree)s::integer IS NULL OR degree_layout >= %(min_degree)s)
+              AND (%(family)s::text IS NULL OR target_family = %(family)s)
+              AND (%(within)s::text[] IS NULL OR display_name = ANY(%(within)s))
+            """,
+            {
+                "genes": list(display_names),
+                "names": list(names),
+                "min_degree": min_degree,
+                "family": family,
+                "within": list(within) if within is not None else None
+            }
+        )
@@ -0,0 +1,24 @@
+"""
+Ad-hoc read-only queries, such as the SQL generated by the LLM.
+"""
+from typing import Optional
+
+from src.core.exceptions import QueryRejected
+from src.database.models import QueryResult
+from src.database.repositories.base_repository import BaseRepository
+from src.utils.validators import check_read_only
+
+def is_read_only(sql: str) -> bool:
+    """Only a single SELECT without writes, locks or side-effecting functions may be executed."""
+    try:
+        check_read_only(sql)
+    except QueryRejected:
+        return False
+    return True
+
+class QueryRepository(BaseRepository):
+    """Runs read-only SQL through a capped server-side cursor."""
+
+    def select(self, sql: str, max_rows: Optional[int] = None) -> QueryResult:
+        """Rows of a SELECT, at most max_rows (default SQL_MAX_ROWS)."""
+        return self._stream(check_read_only(sql), max_rows=max_rows)
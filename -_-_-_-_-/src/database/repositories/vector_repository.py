@@ -0,0 +1,42 @@
+"""
+pgvector access to N.embedding.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.database.repositories.base_repository import BaseRepository
+from src.embeddings.generator import vector_literal
+
+class VectorRepository(BaseRepository):
+    """Nearest-neighbour queries against N.embedding."""
+
+    def nearest(
+        self,
+        embedding: np.ndarray,
+        top_k: int = 10,
+        min_degree: Optional[int] = None,
+        family: Optional[str] = None,
+        within: Optional[Sequence[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """(N.name, cosine similarity) of the top_k genes closest to embedding, best first."""
+        rows = self._query(
+            """
+            SELECT name, 1 - (embedding <=> %(embedding)s::vector)
+            FROM N
+            WHERE embedding IS NOT NULL
+              AND (%(min_degree)s::integer IS NULL OR degree_layout >= %(min_degree)s)
+              AND (%(family)s::text IS NULL OR target_family = %(family)s)
+              AND (%(within)s::text[] IS NULL OR display_name = ANY(%(within)s))
+            ORDER BY embedding <=> %(embedding)s::vector
+            LIMIT %(top_k)s
+            """,
+            {
+                "embedding": vector_literal(embedding),
+                "min_degree": min_degree,
+                "family": family,
+                "within": list(within) if within is not None else None,
+                "top_k": top_k
+            }
+        )
+        return [(row[0], float(row[1])) for row in rows]
@@ -0,0 +1,137 @@
+"""
+Versioned cache of query results.
+Entries are keyed on normalized SQL plus parameters, bounded by an estimate of
+their memory footprint, and dropped whenever the data generation changes.
+"""
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside string literals and drop trailing semicolons."""
+    parts = []
+    in_literal = False
+    pending_space = False
+    for ch in sql.strip().rstrip(";").strip():
+        if ch == "'":
+            in_literal = not in_literal
+        if not in_literal and ch.isspace():
+            pending_space = True
+            continue
+        if pending_space and parts:
+            parts.append(" ")
+        pending_space = False
+        parts.append(ch)
+    return "".join(parts)
+
+def _freeze(params: Any) -> Any:
+    """Hashable form of query parameters."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return tuple(sorted((key, _freeze(value)) for key, value in params.items()))
+    if isinstance(params, (list, tuple, set, frozenset)):
+        return tuple(_freeze(value) for value in params)
+    return params
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a result in bytes."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif hasattr(value, "__dict__"):
+        size += estimate_size(vars(value))
+    return size
+
+class ResultCache:
+    """Memory-bounded LRU cache of query results, invalidated by the data generation counter."""
+
+    def __init__(self, max_bytes: int, generation: Optional[Callable[[], int]] = None):
+        self.max_bytes = max_bytes
+        self.generation = generation
+        self._entries: "OrderedDict[Tuple[str, str, Any], Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._seen_generation: Optional[int] = None
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "bypassed": 0}
+
+    def get_or_load(self, sql: str, params: Any, loader: Callable[[], T], kind: str = "rows") -> T:
+        """
+        Return the cached result for (sql, params), running loader on a miss.
+        kind separates result shapes of the same query (plain rows vs a capped QueryResult).
+        When the data generation cannot be read, the cache is bypassed.
+        """
+        if not self._check_generation():
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return loader()
+        key = (kind, normalize_sql(sql), _freeze(params))
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached[0]
+            self._stats["misses"] += 1
+            generation = self._seen_generation
+
+        value = loader()
+        size = estimate_size(value) + estimate_size(key)
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            # Don't store a result loaded under a generation that was invalidated meanwhile
+            if generation != self._seen_generation:
+                return value
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+        return value
+
+    def invalidate(self) -> None:
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _check_generation(self) -> bool:
+        """Invalidate on a generation change; False when the generation is unknown."""
+        if self.generation is None:
+            return True
+        try:
+            current = self.generation()
+        except Exception as e:
+            logger.warning(f"Could not read data generation, bypassing result cache: {e}")
+            return False
+        if current != self._seen_generation:
+            if self._seen_generation is not None:
+                logger.info(f"Data generation changed to {current}, clearing result cache")
+                self.invalidate()
+            self._seen_generation = current
+        return True
@@ -0,0 +1,133 @@
+"""
+Embedding generation pipeline for gene descriptions.
+Streams N through a server-side cursor, encodes only changed genes in batches
+and writes vectors back in bulk.
+"""
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from src.core.config import config
+from src.embeddings.models import EmbeddingModel
+from src.embeddings.storage import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# (name, text, content hash)
+PendingGene = Tuple[str, str, str]
+
+def build_gene_text(display_name: Optional[str], family: Optional[str], description: Optional[str]) -> str:
+    """Text that gets embedded for a gene."""
+    return f"Gene {display_name or ''}. Family: {family or ''}. Description: {description or ''}"
+
+def content_hash(text: str, model_identity: str) -> str:
+    """
+    Hash of the embedded text; the model identity (name and backend) is included so
+    switching the model or its backend re-embeds everything.
+    """
+    return hashlib.sha256(f"{model_identity}\n{text}".encode("utf-8")).hexdigest()
+
+def vector_literal(vector: Sequence[float]) -> str:
+    """Format a vector as a pgvector text literal."""
+    return "[" + ",".join(f"{float(x):.7g}" for x in vector) + "]"
+
+class EmbeddingGenerator:
+    """Incremental, batched embedding generation for the N table."""
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        backend: Optional[str] = None,
+        use_cache: bool = True
+    ):
+        self.model_name = model_name or config.EMBEDDINGS_MODEL
+        self.batch_size = batch_size or config.EMBEDDINGS_BATCH_SIZE
+        self.chunk_size = chunk_size or config.EMBEDDINGS_CHUNK_SIZE
+        # Loaded on first encode
+        self.model = EmbeddingModel(self.model_name, backend=backend, batch_size=self.batch_size)
+        # Texts embedded before (earlier runs, --force, re-imports) skip the model
+        self.cache = None
+        if use_cache and config.EMBEDDINGS_TEXT_CACHE_MAX_MB > 0:
+            self.cache = EmbeddingCache(self.model.identity)
+        self._encode = self.cache.wrap(self.model.encode) if self.cache else self.model.encode
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in batches of batch_size, reusing cached vectors."""
+        return self._encode(texts)
+
+    def iter_pending(self, conn, force: bool = False) -> Iterator[Tuple[int, List[PendingGene]]]:
+        """
+        Stream N in chunks through a named (server-side) cursor.
+        Yields (rows scanned, genes whose content hash differs from the stored one).
+        """
+        with conn.cursor(name="pulse_embedding_reader") as cur:
+            cur.itersize = self.chunk_size
+            cur.execute("""
+                SELECT name, display_name, target_family, stringdb_description,
+                       embedding_hash, embedding IS NULL
+                FROM N
+                ORDER BY name
+            """)
+            while True:
+                rows = cur.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                pending = []
+                for name, display_name, family, description, stored_hash, missing in rows:
+                    text = build_gene_text(display_name, family, description)
+                    digest = content_hash(text, self.model.identity)
+                    if force or missing or digest != stored_hash:
+                        pending.append((name, text, digest))
+                yield len(rows), pending
+
+    def write_batch(self, conn, genes: List[PendingGene], vectors: np.ndarray) -> None:
+        """Write vectors and hashes back with one UPDATE ... FROM (VALUES ...) statement."""
+        values = [
+            (name, vector_literal(vector), digest)
+            for (name, _, digest), vector in zip(genes, vectors)
+        ]
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                UPDATE N SET embedding = data.embedding::vector,
+                             embedding_hash = data.embedding_hash
+                FROM (VALUES %s) AS data(name, embedding, embedding_hash)
+                WHERE N.name = data.name
+                """,
+                values,
+                page_size=len(values)
+            )
+        conn.commit()
+
+    def run(self, read_conn, write_conn, force: bool = False) -> Dict[str, Any]:
+        """
+        Embed every new or changed gene.
+        Each chunk is committed on its own, so an interrupted run resumes where it
+        stopped: already written genes match their hash and are skipped.
+        """
+        stats = {"scanned": 0, "embedded": 0, "skipped": 0}
+        started = time.perf_counter()
+
+        chunks = self.iter_pending(read_conn, force=force)
+        for chunk_number, (scanned, pending) in enumerate(chunks, start=1):
+            if pending:
+                vectors = self.encode([text for _, text, _ in pending])
+                self.write_batch(write_conn, pending, vectors)
+            stats["scanned"] += scanned
+            stats["embedded"] += len(pending)
+            stats["skipped"] += scanned - len(pending)
+            logger.info(
+                f"Chunk {chunk_number}: embedded {len(pending)} of {scanned} genes "
+                f"({stats['embedded']} embedded so far)"
+            )
+
+        read_conn.commit()
+        stats["elapsed"] = round(time.perf_counter() - started, 2)
+        return stats
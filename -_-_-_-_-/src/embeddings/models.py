@@ -0,0 +1,213 @@
+"""
+Sentence embedding models for CPU hosts.
+EmbeddingModel runs the model with PyTorch (sentence-transformers) or as an exported
+ONNX / int8-quantized ONNX graph with ONNX Runtime; MicroBatcher coalesces concurrent
+encode calls into one forward pass.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.config import config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# ONNX exports published next to the sentence-transformers checkpoints
+ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quint8_avx2.onnx",
+}
+
+def _hub_repo(model_name: str) -> str:
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+class EmbeddingModel:
+    """L2-normalized sentence embeddings with a configurable backend and CPU thread count."""
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        backend: Optional[str] = None,
+        threads: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        onnx_path: Optional[str] = None
+    ):
+        self.model_name = model_name or config.EMBEDDINGS_MODEL
+        self.backend = (backend or config.EMBEDDINGS_BACKEND).lower()
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend {self.backend}, expected one of {', '.join(BACKENDS)}")
+        # 0 keeps the library default (all cores)
+        self.threads = config.EMBEDDINGS_THREADS if threads is None else threads
+        self.batch_size = batch_size or config.EMBEDDINGS_BATCH_SIZE
+        self.onnx_path = onnx_path or config.EMBEDDINGS_ONNX_PATH
+        self._lock = threading.Lock()
+        self._model = None
+        self._session = None
+        self._tokenizer = None
+
+    @property
+    def identity(self) -> str:
+        """Model name plus the backend when its vectors differ from the reference model."""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}:{self.backend}"
+
+    def load(self) -> "EmbeddingModel":
+        """Load the model; called on first encode otherwise."""
+        with self._lock:
+            if self._model is None and self._session is None:
+                started = time.perf_counter()
+                if self.backend == "torch":
+                    self._load_torch()
+                else:
+                    self._load_onnx()
+                logger.info(
+                    f"Loaded embedding model {self.model_name} ({self.backend}) "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+        return self
+
+    def _load_torch(self) -> None:
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        self._model = SentenceTransformer(self.model_name, device="cpu")
+
+    def _load_onnx(self) -> None:
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        repo = _hub_repo(self.model_name)
+        model_path = self.onnx_path or hf_hub_download(repo, ONNX_FILES[self.backend])
+        if not Path(model_path).exists():
+            raise FileNotFoundError(f"ONNX model not found: {model_path}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self._input_names = {node.name for node in self._session.get_inputs()}
+
+        tokenizer = Tokenizer.from_file(hf_hub_download(repo, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=config.EMBEDDINGS_MAX_SEQ_LENGTH)
+        tokenizer.enable_padding()
+        self._tokenizer = tokenizer
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in batches of batch_size; rows are L2-normalized float32."""
+        self.load()
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.backend == "torch":
+            return self._model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            ).astype(np.float32)
+        return np.vstack([
+            self._encode_onnx(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ])
+
+    def _encode_onnx(self, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        token_embeddings = self._session.run(None, inputs)[0]
+
+        # Mean pooling over real tokens, as in the sentence-transformers pooling layer
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return _normalize(pooled)
+
+class MicroBatcher:
+    """
+    Coalesces concurrent encode calls into one forward pass.
+    The first request of a batch waits at most max_wait_ms for others to join,
+    so a single caller pays a few milliseconds and concurrent callers share one pass.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        self._encode = encode
+        self.max_batch_size = max_batch_size or config.EMBEDDINGS_MICROBATCH_MAX
+        self.max_wait = (config.EMBEDDINGS_MICROBATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self._requests: "queue.Queue[Optional[Tuple[List[str], Future]]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="pulse-embedding-batcher", daemon=True)
+        self._worker.start()
+        self.batches = 0
+        self.requests = 0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Same contract as EmbeddingModel.encode, blocking until the shared batch ran."""
+        future: Future = Future()
+        self._requests.put((list(texts), future))
+        return future.result()
+
+    def close(self) -> None:
+        self._requests.put(None)
+        self._worker.join()
+
+    def _collect(self, first: Tuple[List[str], Future]) -> Tuple[List[Tuple[List[str], Future]], bool]:
+        """Gather requests arriving within max_wait of the first one."""
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+            size += len(request[0])
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+            batch, stop = self._collect(first)
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = self._encode(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                offset = 0
+                for request_texts, future in batch:
+                    future.set_result(vectors[offset:offset + len(request_texts)])
+                    offset += len(request_texts)
+            self.batches += 1
+            self.requests += len(batch)
+            if stop:
+                return
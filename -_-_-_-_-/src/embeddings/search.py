@@ -0,0 +1,398 @@
+"""
+In-process vector index over gene embeddings, and the precomputed
+gene-to-gene neighbour table built from it.
+"""
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.core.config import config
+from src.embeddings.storage import EmbeddingStorage
+
+logger = logging.getLogger(__name__)
+
+class VectorIndex:
+    """Cosine top-k search over an L2-normalized float32 embedding matrix."""
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        names: Sequence[str],
+        display_names: Sequence[Optional[str]],
+        target_families: Sequence[Optional[str]],
+        degree_layouts: Sequence[Optional[int]],
+    ):
+        self.matrix = matrix
+        self.names = list(names)
+        self.display_names = list(display_names)
+        self.target_families = list(target_families)
+        self.degree_layouts = list(degree_layouts)
+
+        # Column arrays used to build pre-filter masks
+        self._families = np.array([(f or "").lower() for f in self.target_families], dtype=object)
+        self._degrees = np.array(
+            [d if d is not None else -1 for d in self.degree_layouts], dtype=np.int64
+        )
+        self._display_names = np.array([d or "" for d in self.display_names], dtype=object)
+        self._rows_by_symbol: Dict[str, int] = {}
+        for row, display_name in enumerate(self.display_names):
+            if display_name:
+                self._rows_by_symbol.setdefault(display_name.upper(), row)
+
+    @classmethod
+    def load(cls, storage: Optional[EmbeddingStorage] = None) -> "VectorIndex":
+        """Load the index from the memory-mapped .npy file."""
+        storage = storage or EmbeddingStorage()
+        matrix, metadata = storage.load(mmap=True)
+        logger.info(f"Loaded vector index with {matrix.shape[0]} genes")
+        return cls(
+            matrix,
+            metadata["names"],
+            metadata["display_names"],
+            metadata["target_families"],
+            metadata["degree_layouts"],
+        )
+
+    @classmethod
+    def load_if_available(cls, storage: Optional[EmbeddingStorage] = None) -> Optional["VectorIndex"]:
+        """Load the index, or return None if embeddings were not generated yet."""
+        storage = storage or EmbeddingStorage()
+        if not storage.exists():
+            return None
+        try:
+            return cls.load(storage)
+        except Exception as e:
+            logger.error(f"Error loading vector index: {e}")
+            return None
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def position(self, display_name: str) -> Optional[int]:
+        """Matrix row of a gene by display name (case-insensitive)."""
+        return self._rows_by_symbol.get(display_name.upper())
+
+    def mask(
+        self,
+        family: Optional[str] = None,
+        min_degree: Optional[int] = None,
+        max_degree: Optional[int] = None,
+        display_names: Optional[Iterable[str]] = None,
+    ) -> Optional[np.ndarray]:
+        """Build a boolean pre-filter mask on target_family, degree_layout and a gene subset."""
+        if family is None and min_degree is None and max_degree is None and display_names is None:
+            return None
+
+        mask = np.ones(len(self), dtype=bool)
+        if family is not None:
+            mask &= self._families == family.lower()
+        if min_degree is not None:
+            mask &= self._degrees >= min_degree
+        if max_degree is not None:
+            mask &= (self._degrees <= max_degree) & (self._degrees >= 0)
+        if display_names is not None:
+            mask &= np.isin(self._display_names, list(display_names))
+        return mask
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int = 10,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Batched cosine top-k.
+        Returns, for every query row, a list of (row index, similarity) sorted by similarity.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        scores = queries @ self.matrix.T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+            candidates = int(mask.sum())
+        else:
+            candidates = len(self)
+
+        k = min(top_k, candidates)
+        if k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+
+        # argpartition selects the top-k in O(n), only those k get sorted
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(int(i), float(s)) for i, s in zip(row_idx, row_scores)]
+            for row_idx, row_scores in zip(top, top_scores)
+        ]
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Gene metadata for a matrix row."""
+        return {
+            "name": self.names[row],
+            "display_name": self.display_names[row],
+            "family": self.target_families[row],
+            "connections": self.degree_layouts[row],
+        }
+
+    def search_records(
+        self,
+        query_vector: np.ndarray,
+        top_k: int = 10,
+        family: Optional[str] = None,
+        min_degree: Optional[int] = None,
+        max_degree: Optional[int] = None,
+        display_names: Optional[Iterable[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Top-k genes for a single query vector, as result dicts."""
+        mask = self.mask(
+            family=family,
+            min_degree=min_degree,
+            max_degree=max_degree,
+            display_names=display_names,
+        )
+        hits = self.search(query_vector, top_k=top_k, mask=mask)[0]
+        results = []
+        for row, score in hits:
+            result = self.record(row)
+            result["similarity"] = score
+            results.append(result)
+        return results
+
+def row_fingerprint(vector: np.ndarray) -> str:
+    """Short hash of a matrix row, used to find genes whose embedding changed."""
+    return hashlib.blake2b(np.ascontiguousarray(vector, dtype=np.float32).tobytes(), digest_size=8).hexdigest()
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the k largest scores of every row, best first."""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+def knn_blocked(
+    matrix: np.ndarray,
+    rows: np.ndarray,
+    k: int,
+    block_size: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact cosine top-k neighbours of the given rows against the whole matrix (self excluded).
+    Rows are processed block_size at a time, so one block x genes score matrix is alive at once.
+    """
+    block_size = block_size or config.NEIGHBORS_BLOCK_SIZE
+    neighbor_rows = np.empty((len(rows), k), dtype=np.int32)
+    neighbor_scores = np.empty((len(rows), k), dtype=np.float32)
+    if k <= 0:
+        return neighbor_rows, neighbor_scores
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        scores = matrix[block] @ matrix.T
+        scores[np.arange(len(block)), block] = -np.inf
+        top, top_scores = _top_k(scores, k)
+        neighbor_rows[start:start + len(block)] = top
+        neighbor_scores[start:start + len(block)] = top_scores
+    return neighbor_rows, neighbor_scores
+
+class NeighborTable:
+    """
+    Top-k most similar genes of every gene, so gene-seeded similarity is a row lookup.
+    Rows align with the VectorIndex matrix; fingerprints of the embeddings it was built
+    from let refresh() recompute only the rows an embedding change can affect, and the
+    modification time of the saved matrix it was built from (matrix_mtime_ns) tells a
+    loader whether the table still applies without hashing the matrix.
+    """
+
+    def __init__(
+        self,
+        rows: np.ndarray,
+        scores: np.ndarray,
+        names: Sequence[str],
+        fingerprints: Sequence[str],
+        matrix_mtime_ns: Optional[int] = None
+    ):
+        self.rows = rows
+        self.scores = scores
+        self.names = list(names)
+        self.fingerprints = list(fingerprints)
+        self.matrix_mtime_ns = matrix_mtime_ns
+        self._positions = {name: row for row, name in enumerate(self.names)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def k(self) -> int:
+        return self.rows.shape[1]
+
+    def position(self, name: str) -> Optional[int]:
+        """Row of a gene (N.name), or None if it has no embedding."""
+        return self._positions.get(name)
+
+    def neighbors(self, row: int) -> List[Tuple[int, float]]:
+        """(row index, similarity) of the neighbours of a row, best first."""
+        return [(int(i), float(s)) for i, s in zip(self.rows[row], self.scores[row])]
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        names: Sequence[str],
+        k: Optional[int] = None,
+        block_size: Optional[int] = None
+    ) -> "NeighborTable":
+        """Compute the table for every row of the matrix."""
+        k = min(k or config.NEIGHBORS_TOP_K, len(names) - 1)
+        rows, scores = knn_blocked(matrix, np.arange(len(names)), max(k, 0), block_size)
+        return cls(rows, scores, names, [row_fingerprint(vector) for vector in matrix])
+
+    def refresh(
+        self,
+        matrix: np.ndarray,
+        names: Sequence[str],
+        k: Optional[int] = None,
+        block_size: Optional[int] = None
+    ) -> Tuple["NeighborTable", int]:
+        """
+        Table for a new matrix, reusing this one where it is still exact.
+        Rows of new or changed genes, and rows that had one of them or a removed gene
+        as a neighbour, are recomputed; every other row only has to be compared against
+        the changed genes. Returns the new table and the number of recomputed rows.
+        """
+        names = list(names)
+        k = min(k or config.NEIGHBORS_TOP_K, len(names) - 1)
+        if k != self.k or k <= 0:
+            table = NeighborTable.build(matrix, names, k, block_size)
+            return table, len(table)
+
+        fingerprints = [row_fingerprint(vector) for vector in matrix]
+        # Old row -> new row, -1 for genes that are gone or whose embedding changed
+        new_positions = {name: row for row, name in enumerate(names)}
+        old_to_new = np.full(len(self), -1, dtype=np.int64)
+        for old_row, name in enumerate(self.names):
+            new_row = new_positions.get(name)
+            if new_row is not None and fingerprints[new_row] == self.fingerprints[old_row]:
+                old_to_new[old_row] = new_row
+        kept = set(old_to_new[old_to_new >= 0].tolist())
+        changed = np.array([row for row in range(len(names)) if row not in kept], dtype=np.int64)
+
+        new_to_old = np.full(len(names), -1, dtype=np.int64)
+        new_to_old[old_to_new[old_to_new >= 0]] = np.flatnonzero(old_to_new >= 0)
+        # A row that lost a neighbour can't tell what its k-th neighbour is now
+        old_rows = np.asarray(self.rows)
+        lost = (old_to_new[old_rows] < 0).any(axis=1)
+        stale = np.zeros(len(names), dtype=bool)
+        stale[changed] = True
+        stale[old_to_new[(old_to_new >= 0) & lost]] = True
+        recompute = np.flatnonzero(stale)
+        if len(recompute) > len(names) // 2:
+            table = NeighborTable.build(matrix, names, k, block_size)
+            return table, len(table)
+
+        rows = np.empty((len(names), k), dtype=np.int32)
+        scores = np.empty((len(names), k), dtype=np.float32)
+        merge = np.flatnonzero(~stale)
+        rows[merge] = old_to_new[old_rows[new_to_old[merge]]]
+        scores[merge] = np.asarray(self.scores)[new_to_old[merge]]
+        if len(changed):
+            block_size = block_size or config.NEIGHBORS_BLOCK_SIZE
+            for start in range(0, len(merge), block_size):
+                block = merge[start:start + block_size]
+                candidates = np.hstack([rows[block], np.broadcast_to(changed, (len(block), len(changed)))])
+                candidate_scores = np.hstack([scores[block], matrix[block] @ matrix[changed].T])
+                top, top_scores = _top_k(candidate_scores, k)
+                rows[block] = np.take_along_axis(candidates, top, axis=1)
+                scores[block] = top_scores
+        if len(recompute):
+            rows[recompute], scores[recompute] = knn_blocked(matrix, recompute, k, block_size)
+        return NeighborTable(rows, scores, names, fingerprints), len(recompute)
+
+    def save(self, storage: Optional[EmbeddingStorage] = None) -> None:
+        (storage or EmbeddingStorage()).save_neighbors(
+            self.rows,
+            self.scores,
+            {
+                "names": self.names,
+                "fingerprints": self.fingerprints,
+                "matrix_rows": len(self),
+                "matrix_mtime_ns": self.matrix_mtime_ns,
+            }
+        )
+
+    @classmethod
+    def load(cls, storage: Optional[EmbeddingStorage] = None) -> "NeighborTable":
+        """Load the table from its memory-mapped .npy files."""
+        rows, scores, metadata = (storage or EmbeddingStorage()).load_neighbors(mmap=True)
+        logger.info(f"Loaded neighbour table with {rows.shape[0]} genes, k={rows.shape[1]}")
+        return cls(
+            rows,
+            scores,
+            metadata["names"],
+            metadata["fingerprints"],
+            metadata.get("matrix_mtime_ns")
+        )
+
+    @classmethod
+    def load_if_available(
+        cls,
+        index: VectorIndex,
+        storage: Optional[EmbeddingStorage] = None
+    ) -> Optional["NeighborTable"]:
+        """
+        Load the table for the embeddings in index, or None if none was built yet or it
+        was built from another matrix file. Only the stored row count, gene names and the
+        matrix file's modification time are compared, so this stays cheap during warm-up;
+        a stale table is brought up to date offline by refresh_neighbor_table.
+        """
+        storage = storage or EmbeddingStorage()
+        if not storage.neighbors_exist():
+            return None
+        try:
+            table = cls.load(storage)
+            matrix_mtime_ns = storage.matrix_mtime_ns()
+        except Exception as e:
+            logger.error(f"Error loading neighbour table: {e}")
+            return None
+        if table.matrix_mtime_ns != matrix_mtime_ns or len(table) != len(index) or table.names != index.names:
+            logger.warning(
+                "Neighbour table was built from other embeddings than the vector index, ignoring it; "
+                "run scripts/generate_embeddings.py --export-index to refresh it"
+            )
+            return None
+        return table
+
+def refresh_neighbor_table(storage: Optional[EmbeddingStorage] = None) -> Tuple[int, int]:
+    """
+    Bring the saved neighbour table up to date with the saved matrix.
+    Returns (genes in the table, rows recomputed).
+    """
+    storage = storage or EmbeddingStorage()
+    # Taken before the read: a matrix replaced in between leaves the table marked stale
+    matrix_mtime_ns = storage.matrix_mtime_ns()
+    matrix, metadata = storage.load(mmap=False)
+    names = metadata["names"]
+    previous = None
+    if storage.neighbors_exist():
+        try:
+            rows, scores, neighbor_metadata = storage.load_neighbors(mmap=False)
+            previous = NeighborTable(rows, scores, neighbor_metadata["names"], neighbor_metadata["fingerprints"])
+        except Exception as e:
+            logger.warning(f"Rebuilding neighbour table, the saved one is unreadable: {e}")
+
+    if previous is None:
+        table = NeighborTable.build(matrix, names)
+        recomputed = len(table)
+    else:
+        table, recomputed = previous.refresh(matrix, names)
+    table.matrix_mtime_ns = matrix_mtime_ns
+    table.save(storage)
+    logger.info(f"Neighbour table: {recomputed} of {len(table)} rows recomputed")
+    return len(table), recomputed
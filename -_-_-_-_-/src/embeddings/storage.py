@@ -0,0 +1,400 @@
+"""
+On-disk storage for gene embeddings.
+The embedding matrix is kept as a float32 .npy file so it can be memory-mapped
+instead of unpickled on every start. EmbeddingCache persists embeddings of
+recurring texts (questions, gene descriptions) across restarts.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import unicodedata
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.core.config import config
+
+logger = logging.getLogger(__name__)
+
+MATRIX_FILE = "gene_embeddings.npy"
+METADATA_FILE = "gene_metadata.json"
+# Precomputed top-k neighbours of every row of the matrix
+NEIGHBOR_ROWS_FILE = "gene_neighbors.npy"
+NEIGHBOR_SCORES_FILE = "gene_neighbor_scores.npy"
+NEIGHBOR_METADATA_FILE = "gene_neighbors.json"
+
+def parse_vector(value: Any) -> np.ndarray:
+    """Convert a pgvector text value ('[0.1,0.2,...]') or a sequence to float32."""
+    if isinstance(value, str):
+        value = value.strip().strip("[]").split(",")
+    return np.asarray(value, dtype=np.float32)
+
+class EmbeddingStorage:
+    """Reads and writes the gene embedding matrix under EMBEDDINGS_CACHE_PATH."""
+
+    def __init__(self, cache_path: Optional[Path] = None):
+        self.cache_path = Path(cache_path or config.EMBEDDINGS_CACHE_PATH)
+
+    @property
+    def matrix_path(self) -> Path:
+        return self.cache_path / MATRIX_FILE
+
+    @property
+    def metadata_path(self) -> Path:
+        return self.cache_path / METADATA_FILE
+
+    def exists(self) -> bool:
+        """Check whether a saved matrix is available."""
+        return self.matrix_path.exists() and self.metadata_path.exists()
+
+    def save(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Save gene records with an 'embedding' field.
+        Rows are L2-normalized so cosine similarity becomes a dot product.
+        """
+        records = [r for r in records if r.get("embedding") is not None]
+        if not records:
+            logger.warning("No embeddings to save")
+            return 0
+
+        matrix = np.vstack([parse_vector(r["embedding"]) for r in records])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = (matrix / norms).astype(np.float32)
+
+        metadata = {
+            "names": [r["name"] for r in records],
+            "display_names": [r.get("display_name") for r in records],
+            "target_families": [r.get("target_family") for r in records],
+            "degree_layouts": [
+                int(r["degree_layout"]) if r.get("degree_layout") is not None else None
+                for r in records
+            ],
+        }
+
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        # Write to temp files and swap them in, so readers never see a partial matrix
+        tmp_matrix = self.matrix_path.with_suffix(".npy.tmp")
+        tmp_metadata = self.metadata_path.with_suffix(".json.tmp")
+        with open(tmp_matrix, "wb") as f:
+            np.save(f, matrix)
+        with open(tmp_metadata, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_metadata, self.metadata_path)
+
+        logger.info(f"Saved {len(records)} embeddings to {self.matrix_path}")
+        return len(records)
+
+    def matrix_mtime_ns(self) -> int:
+        """Modification time of the saved matrix; save() replaces the file, so it changes on every save."""
+        return self.matrix_path.stat().st_mtime_ns
+
+    def load(self, mmap: bool = True) -> Tuple[np.ndarray, Dict[str, List[Any]]]:
+        """Load the matrix (memory-mapped by default) and its metadata."""
+        matrix = np.load(self.matrix_path, mmap_mode="r" if mmap else None)
+        with open(self.metadata_path, encoding="utf-8") as f:
+            metadata = json.load(f)
+        if matrix.shape[0] != len(metadata["names"]):
+            raise ValueError(
+                f"Embedding matrix has {matrix.shape[0]} rows, "
+                f"metadata has {len(metadata['names'])} genes"
+            )
+        return matrix, metadata
+
+    def neighbors_exist(self) -> bool:
+        """Check whether a saved neighbour table is available."""
+        return all(
+            (self.cache_path / name).exists()
+            for name in (NEIGHBOR_ROWS_FILE, NEIGHBOR_SCORES_FILE, NEIGHBOR_METADATA_FILE)
+        )
+
+    def save_neighbors(self, rows: np.ndarray, scores: np.ndarray, metadata: Dict[str, Any]) -> None:
+        """Save a neighbour table: row indices (int32), similarities (float32) and its metadata."""
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        for name, array in ((NEIGHBOR_ROWS_FILE, rows.astype(np.int32)), (NEIGHBOR_SCORES_FILE, scores.astype(np.float32))):
+            tmp_path = self.cache_path / f"{name}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, self.cache_path / name)
+        # Metadata goes last: a table is only picked up once it matches the matrix
+        tmp_path = self.cache_path / f"{NEIGHBOR_METADATA_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path / NEIGHBOR_METADATA_FILE)
+
+    def load_neighbors(self, mmap: bool = True) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """Load the neighbour table (memory-mapped by default) and its metadata."""
+        mode = "r" if mmap else None
+        rows = np.load(self.cache_path / NEIGHBOR_ROWS_FILE, mmap_mode=mode)
+        scores = np.load(self.cache_path / NEIGHBOR_SCORES_FILE, mmap_mode=mode)
+        with open(self.cache_path / NEIGHBOR_METADATA_FILE, encoding="utf-8") as f:
+            metadata = json.load(f)
+        if rows.shape != scores.shape or rows.shape[0] != len(metadata["names"]):
+            raise ValueError(
+                f"Neighbour table has {rows.shape} rows, {scores.shape} scores "
+                f"and {len(metadata['names'])} genes"
+            )
+        return rows, scores, metadata
+
+    def build_from_pickle(self, pickle_path: Path) -> int:
+        """Build the matrix from data/processed/genes_with_embeddings.pkl."""
+        import pandas as pd
+
+        df = pd.read_pickle(pickle_path)
+        return self.save(df.to_dict("records"))
+
+    def build_from_db(self, db) -> int:
+        """Build the matrix from the N.embedding column."""
+        rows = db.execute_query(
+            "SELECT name, display_name, target_family, degree_layout, embedding::text "
+            "FROM N WHERE embedding IS NOT NULL ORDER BY name",
+            timeout_ms=0
+        )
+        records = [
+            {
+                "name": row[0],
+                "display_name": row[1],
+                "target_family": row[2],
+                "degree_layout": row[3],
+                "embedding": row[4],
+            }
+            for row in rows
+        ]
+        return self.save(records)
+
+# Text cache file layout: header (magic, vector dimension, file generation) + fixed-size records
+# (sha1 key, float32 vector). The generation changes whenever the file is recreated or compacted.
+_CACHE_MAGIC = b"PULSEEMB"
+_CACHE_HEADER = struct.Struct("<8sII")
+# Compaction keeps the newest records up to this share of max_bytes
+_COMPACT_RATIO = 0.75
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalized text with collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def text_key(text: str, model_name: str) -> bytes:
+    """Cache key: sha1 of the model name and the normalized text."""
+    return hashlib.sha1(f"{model_name}\n{normalize_text(text)}".encode("utf-8")).digest()
+
+class EmbeddingCache:
+    """
+    Persistent, memory-mapped text → vector store for one embedding model.
+    Records are only ever appended (under an exclusive file lock), so readers in any
+    process can map the file and see complete records. When the file outgrows
+    max_bytes, the newest records are rewritten to a new file with the next header
+    generation that replaces the old one; readers holding the old mapping keep a
+    consistent view until they refresh, and every hit is checked against its stored key.
+    """
+
+    def __init__(self, model_name: str, cache_path: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.model_name = model_name
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.path = Path(cache_path or config.EMBEDDINGS_CACHE_PATH) / f"text_embeddings_{slug}.bin"
+        self.lock_path = self.path.with_suffix(".lock")
+        self.max_bytes = max_bytes or config.EMBEDDINGS_TEXT_CACHE_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}
+        self._records: Optional[np.ndarray] = None
+        self._dtype: Optional[np.dtype] = None
+        # Identity of the mapped file: a recycled inode alone can't tell a compacted file apart
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._loaded = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+    @staticmethod
+    def _record_dtype(dim: int) -> np.dtype:
+        return np.dtype([("key", "u1", (20,)), ("vector", "<f4", (dim,))])
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Exclusive lock between writer processes; readers never take it."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reset(self) -> None:
+        self._index = {}
+        self._records = None
+        self._dtype = None
+        self._file_id = None
+        self._loaded = 0
+
+    def _refresh(self) -> None:
+        """
+        Map records appended since the last call; reload if the file was compacted.
+        Size, header and mapping all come from one open file, so a compaction that
+        replaces the path meanwhile can't pair the old record count with the new file.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            self._reset()
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            header = f.read(_CACHE_HEADER.size)
+            if len(header) < _CACHE_HEADER.size:
+                self._reset()
+                return
+            magic, dim, generation = _CACHE_HEADER.unpack(header)
+            if magic != _CACHE_MAGIC:
+                raise ValueError(f"{self.path} is not an embedding cache file")
+            if (stat.st_ino, generation) != self._file_id:
+                self._reset()
+                self._dtype = self._record_dtype(dim)
+                self._file_id = (stat.st_ino, generation)
+
+            count = (stat.st_size - _CACHE_HEADER.size) // self._dtype.itemsize
+            if count <= self._loaded:
+                return
+            records = np.memmap(f, dtype=self._dtype, mode="r", offset=_CACHE_HEADER.size, shape=(count,))
+        for row, key in enumerate(records["key"][self._loaded:count], start=self._loaded):
+            self._index[key.tobytes()] = row
+        self._records = records
+        self._loaded = count
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for texts, None where a text was not embedded yet."""
+        keys = [text_key(text, self.model_name) for text in texts]
+        with self._lock:
+            self._refresh()
+            found = [self._lookup(key) for key in keys]
+            if any(vector is False for vector in found):
+                # The mapping no longer matches the index: rebuild it from the file once
+                self._reset()
+                self._refresh()
+                found = [self._lookup(key) for key in keys]
+            found = [vector if vector is not False else None for vector in found]
+            hits = sum(vector is not None for vector in found)
+            self.hits += hits
+            self.misses += len(found) - hits
+        return found
+
+    def _lookup(self, key: bytes) -> Union[np.ndarray, None, bool]:
+        """Vector stored for key, None if it is not indexed, False if its row holds another key."""
+        row = self._index.get(key)
+        if row is None:
+            return None
+        record = self._records[row]
+        if record["key"].tobytes() != key:
+            return False
+        return np.array(record["vector"])
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray) -> int:
+        """Append vectors for texts that are not cached yet; returns how many were written."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if not len(texts):
+            return 0
+        dim = vectors.shape[1]
+        with self._lock, self._file_lock():
+            self._prepare_file(dim)
+            self._refresh()
+            if self._dtype["vector"].shape[0] != dim:
+                raise ValueError(f"Cache holds {self._dtype['vector'].shape[0]}-d vectors, got {dim}-d")
+
+            new: Dict[bytes, np.ndarray] = {}
+            for text, vector in zip(texts, vectors):
+                key = text_key(text, self.model_name)
+                if key not in self._index:
+                    new[key] = vector
+            if not new:
+                return 0
+
+            records = np.zeros(len(new), dtype=self._dtype)
+            records["key"] = np.frombuffer(b"".join(new), dtype=np.uint8).reshape(len(new), 20)
+            records["vector"] = np.vstack(list(new.values()))
+            # One write of whole records: concurrent readers only map complete ones
+            with open(self.path, "ab") as f:
+                f.write(records.tobytes())
+            self._refresh()
+
+            if os.path.getsize(self.path) > self.max_bytes:
+                self._compact()
+        return len(new)
+
+    def _prepare_file(self, dim: int) -> None:
+        """Create the file, or drop a record torn by a crashed writer. Caller holds the file lock."""
+        if not self.path.exists() or os.path.getsize(self.path) < _CACHE_HEADER.size:
+            # A random first generation, so a recreated file never looks like an earlier one
+            generation = int.from_bytes(os.urandom(4), "little")
+            with open(self.path, "wb") as f:
+                f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, dim, generation))
+            return
+        with open(self.path, "rb") as f:
+            _, stored_dim, _ = _CACHE_HEADER.unpack(f.read(_CACHE_HEADER.size))
+        record_size = self._record_dtype(stored_dim).itemsize
+        size = os.path.getsize(self.path)
+        complete = _CACHE_HEADER.size + (size - _CACHE_HEADER.size) // record_size * record_size
+        if complete != size:
+            os.truncate(self.path, complete)
+
+    def _compact(self) -> None:
+        """Keep the newest records within _COMPACT_RATIO of max_bytes. Caller holds both locks."""
+        keep = max(int(self.max_bytes * _COMPACT_RATIO - _CACHE_HEADER.size) // self._dtype.itemsize, 0)
+        # Rows the index points at are the latest copy of each key, in append order
+        rows = np.sort(np.fromiter(self._index.values(), dtype=np.int64))[-keep:] if keep else []
+        tmp_path = self.path.with_suffix(".bin.tmp")
+        generation = (self._file_id[1] + 1) & 0xFFFFFFFF
+        with open(tmp_path, "wb") as f:
+            f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, self._dtype["vector"].shape[0], generation))
+            if len(rows):
+                f.write(np.ascontiguousarray(self._records[rows]).tobytes())
+        os.replace(tmp_path, self.path)
+        logger.info(f"Compacted embedding cache {self.path.name}: kept {len(rows)} of {len(self._index)} texts")
+        self._refresh()
+
+    def wrap(self, encode: Callable[[List[str]], np.ndarray]) -> Callable[[List[str]], np.ndarray]:
+        """Encoder that only runs encode for texts missing from the cache."""
+        def cached_encode(texts: List[str]) -> np.ndarray:
+            texts = list(texts)
+            try:
+                found = self.get_many(texts)
+            except Exception as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+                return encode(texts)
+
+            missing = [i for i, vector in enumerate(found) if vector is None]
+            if missing:
+                vectors = np.asarray(encode([texts[i] for i in missing]), dtype=np.float32)
+                try:
+                    self.put_many([texts[i] for i in missing], vectors)
+                except Exception as e:
+                    logger.warning(f"Embedding cache write failed: {e}")
+                for i, vector in zip(missing, vectors):
+                    found[i] = vector
+            if not found:
+                return encode(texts)
+            return np.vstack(found)
+        return cached_encode
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            size = len(self._index)
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": size,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
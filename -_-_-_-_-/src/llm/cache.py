@@ -0,0 +1,190 @@
+"""
+Two-level cache for LLM responses.
+Level 1 is an exact hit on the normalized question, level 2 a nearest-neighbour
+hit on the question embedding.
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Gene symbols and numbers: two questions that differ in these must never share an answer
+_ENTITY_PATTERN = re.compile(r"\b(?:[A-Za-z0-9]*\d[A-Za-z0-9-]*|[A-Z][A-Z0-9-]+)\b")
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+def question_entities(text: str) -> FrozenSet[str]:
+    """Gene-like tokens and numbers mentioned in the question."""
+    return frozenset(token.upper() for token in _ENTITY_PATTERN.findall(text))
+
+@dataclass
+class _Entry:
+    value: str
+    context: str
+    entities: FrozenSet[str]
+    created: float
+    embedding: Optional[np.ndarray] = None
+
+class ResponseCache:
+    """
+    LRU + TTL cache of LLM outputs keyed by question and an optional context
+    (e.g. the SQL result a response was formatted from).
+    Semantic hits require the same context and the same gene/number mentions,
+    so "связи TP53" never answers "связи EGFR".
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        similarity_threshold: float = 0.92,
+        encoder: Optional[Callable[[List[str]], np.ndarray]] = None,
+        generation: Optional[Callable[[], int]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.encoder = encoder
+        self.generation = generation
+
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._seen_generation: Optional[int] = None
+        self._stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, question: str, context: str = "") -> Optional[str]:
+        """Return a cached value for the question, or None."""
+        if not self._check_generation():
+            return None
+        key = (context, normalize_question(question))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry.created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["exact_hits"] += 1
+                    return entry.value
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        embedding = self._embed(key[1])
+        if embedding is not None:
+            value = self._semantic_lookup(embedding, context, question_entities(question), now)
+            if value is not None:
+                return value
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, question: str, value: str, context: str = "") -> None:
+        """Store a value for the question."""
+        if not self._check_generation():
+            return
+        normalized = normalize_question(question)
+        entry = _Entry(
+            value=value,
+            context=context,
+            entities=question_entities(question),
+            created=time.monotonic(),
+            embedding=self._embed(normalized)
+        )
+        with self._lock:
+            self._entries[(context, normalized)] = entry
+            self._entries.move_to_end((context, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and the share of lookups served from cache."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _check_generation(self) -> bool:
+        """
+        Invalidate when the N/E data generation changed since the last lookup.
+        False when it cannot be read: entries could then be stale, so the cache is bypassed.
+        """
+        if self.generation is None:
+            return True
+        try:
+            current = self.generation()
+        except Exception as e:
+            logger.warning(f"Could not read data generation, bypassing response cache: {e}")
+            return False
+        if self._seen_generation is not None and current != self._seen_generation:
+            logger.info(f"Data generation changed to {current}, clearing response cache")
+            self.invalidate()
+        self._seen_generation = current
+        return True
+
+    def _embed(self, normalized: str) -> Optional[np.ndarray]:
+        """Normalized question embedding, or None when the semantic level is off."""
+        if self.encoder is None:
+            return None
+        try:
+            vector = np.asarray(self.encoder([normalized])[0], dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Disabling semantic cache level, encoder failed: {e}")
+            self.encoder = None
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _semantic_lookup(
+        self,
+        embedding: np.ndarray,
+        context: str,
+        entities: FrozenSet[str],
+        now: float
+    ) -> Optional[str]:
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.embedding is not None
+                and entry.context == context
+                and entry.entities == entities
+                and now - entry.created <= self.ttl
+            ]
+            if not candidates:
+                return None
+
+            similarities = np.stack([entry.embedding for _, entry in candidates]) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self._stats["semantic_hits"] += 1
+            return entry.value
@@ -1,34 +1,191 @@
 """
 Client for interacting with LLM (LM Studio/GigaChat).
 """
-from openai import OpenAI
+import logging
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional
 from src.core.config import config
+from src.core.exceptions import GenerationCancelled
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often a cancellable call re-checks its event while queued or waiting for a token
+CANCEL_POLL_SECONDS = 0.05
 
 class LLMClient:
     """Client for LLM API."""
     
-    def __init__(self):
-        self.client = OpenAI(
-            base_url=config.LM_STUDIO_BASE_URL,
-            api_key=config.LM_STUDIO_API_KEY
-        )
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self._client = None
+        self._client_lock = threading.Lock()
+        # Bounds in-flight requests so concurrent bot workers don't overload LM Studio
+        self._slots = threading.BoundedSemaphore(max_concurrency or config.LLM_MAX_CONCURRENCY)
+        self._stream_usage = config.LLM_STREAM_USAGE
     
-    def generate(self, prompt: str, temperature: float = 0.1) -> str:
-        """Generate text from prompt."""
+    @property
+    def client(self):
+        """OpenAI client, created on first use: importing openai is a noticeable part of startup."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(
+                        base_url=config.LM_STUDIO_BASE_URL,
+                        api_key=config.LM_STUDIO_API_KEY
+                    )
+        return self._client
+    
+    @contextmanager
+    def _slot(self, cancel: Optional[threading.Event] = None) -> Iterator[None]:
+        """
+        Hold one of the concurrency slots; time spent waiting for it is tracked separately.
+        Setting cancel while queued raises GenerationCancelled without taking a slot.
+        """
+        with metrics.span("llm_queue"):
+            if cancel is None:
+                self._slots.acquire()
+            else:
+                while not self._slots.acquire(timeout=CANCEL_POLL_SECONDS):
+                    if cancel.is_set():
+                        raise GenerationCancelled("Generation cancelled while queued")
+                if cancel.is_set():
+                    self._slots.release()
+                    raise GenerationCancelled("Generation cancelled while queued")
         try:
-            completion = self.client.chat.completions.create(
-                model="local-model",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temperature,
-                max_tokens=500
-            )
+            yield
+        finally:
+            self._slots.release()
+    
+    @staticmethod
+    def _watch(stream, cancel: threading.Event) -> threading.Event:
+        """
+        Abort stream as soon as cancel is set; set the returned event once the stream is done.
+        Closing the response alone does not wake a read blocked on the socket (the server may
+        still be in prefill), so the socket is shut down, which also tells the server to stop.
+        """
+        done = threading.Event()
+        
+        def watch():
+            while not done.is_set():
+                if not cancel.wait(CANCEL_POLL_SECONDS):
+                    continue
+                network_stream = stream.response.extensions.get("network_stream")
+                sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+                if sock is not None and not done.is_set():
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                return
+        
+        threading.Thread(target=watch, name="pulse-llm-cancel", daemon=True).start()
+        return done
+    
+    @staticmethod
+    def _record_usage(usage) -> None:
+        """Count the token usage reported by the server, if any."""
+        if usage is None:
+            return
+        metrics.inc("pulse_llm_tokens_total", usage.prompt_tokens or 0, kind="prompt")
+        metrics.inc("pulse_llm_tokens_total", usage.completion_tokens or 0, kind="completion")
+    
+    def _create_stream(self, prompt: str, temperature: float):
+        """
+        Open a streamed completion.
+        Older LM Studio and llama.cpp builds answer 400 naming stream_options; the request
+        is then repeated without it, and usage is no longer asked for.
+        """
+        request = {
+            "model": "local-model",
+            "messages": self._messages(prompt),
+            "temperature": temperature,
+            "max_tokens": 500,
+            "stream": True,
+        }
+        if self._stream_usage:
+            from openai import BadRequestError
+            try:
+                # The final chunk then carries the usage totals
+                return self.client.chat.completions.create(**request, stream_options={"include_usage": True})
+            except BadRequestError as e:
+                # Any other 400 (a too long prompt, a bad parameter) is the caller's problem
+                if "stream_options" not in str(e):
+                    raise
+                logger.warning(f"LLM server rejected stream_options, streaming without usage: {e}")
+                self._stream_usage = False
+        return self.client.chat.completions.create(**request)
+    
+    @staticmethod
+    def _messages(prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def generate(self, prompt: str, temperature: float = 0.1, cancel: Optional[threading.Event] = None) -> str:
+        """
+        Generate text from prompt.
+        With cancel, the answer is streamed so setting the event stops generation
+        (raising GenerationCancelled) and frees the slot and the server for other requests.
+        """
+        if cancel is not None:
+            return "".join(self.generate_stream(prompt, temperature, cancel=cancel)).strip()
+        try:
+            with self._slot():
+                completion = self.client.chat.completions.create(
+                    model="local-model",
+                    messages=self._messages(prompt),
+                    temperature=temperature,
+                    max_tokens=500
+                )
+            self._record_usage(completion.usage)
             return completion.choices[0].message.content.strip()
         except Exception as e:
             raise Exception(f"LLM connection error: {e}")
     
+    def generate_stream(
+        self,
+        prompt: str,
+        temperature: float = 0.1,
+        cancel: Optional[threading.Event] = None
+    ) -> Iterator[str]:
+        """
+        Generate text from prompt, yielding content deltas as the model produces them.
+        Setting cancel drops the connection, even before the first token, and raises GenerationCancelled.
+        """
+        try:
+            with self._slot(cancel):
+                stream = self._create_stream(prompt, temperature)
+                done = self._watch(stream, cancel) if cancel is not None else None
+                try:
+                    for chunk in stream:
+                        if cancel is not None and cancel.is_set():
+                            raise GenerationCancelled("Generation cancelled")
+                        self._record_usage(getattr(chunk, "usage", None))
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            yield delta
+                    if cancel is not None and cancel.is_set():
+                        # A shut-down socket can also end the stream without an error
+                        raise GenerationCancelled("Generation cancelled")
+                finally:
+                    if done is not None:
+                        done.set()
+                    # Frees the HTTP connection if the consumer stops early
+                    stream.close()
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            if cancel is not None and cancel.is_set():
+                # The read failed because the watcher shut the socket down
+                raise GenerationCancelled("Generation cancelled")
+            raise Exception(f"LLM connection error: {e}")
+    
     def generate_sql(self, question: str, schema: str) -> str:
         """Generate SQL query from question."""
         # This will be implemented with proper prompts
@@ -0,0 +1,106 @@
+"""
+Speculative question pipeline.
+The template fast path, LLM SQL generation and hybrid-search retrieval run concurrently:
+a confident template answer cancels the LLM call, otherwise the retrieved genes are
+merged into the formatter prompt. A question then costs about its slowest necessary
+stage instead of the sum of all of them.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.core.config import config
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PipelineOutcome:
+    """What the concurrent legs produced for one question."""
+    # Set when the fast path answered; sql and context are then not needed
+    template_answer: Optional[str] = None
+    sql: Optional[str] = None
+    context_future: Optional["Future[str]"] = None
+
+    def context(self, timeout: Optional[float] = None) -> str:
+        """Retrieved context for the formatter prompt; empty if retrieval failed or is still running."""
+        if self.context_future is None:
+            return ""
+        try:
+            return self.context_future.result(
+                timeout=config.PIPELINE_CONTEXT_TIMEOUT if timeout is None else timeout
+            )
+        except FutureTimeout:
+            logger.warning("Retrieval did not finish in time, formatting without context")
+        except Exception as e:
+            logger.error(f"Retrieval failed: {e}")
+        return ""
+
+class QueryPipeline:
+    """
+    Runs the legs of one question concurrently.
+    fast_path answers template questions (None otherwise) on the calling thread;
+    generate_sql and retrieve run on the pipeline's executor. They hold off for up to
+    PIPELINE_FAST_PATH_GRACE_MS, or until the fast path has given up, so questions the
+    fast path answers quickly never reach the LLM; a slower fast path runs alongside them.
+    Both receive the cancel event, set when the fast path answers, and should stop early on it.
+    """
+
+    def __init__(
+        self,
+        fast_path: Callable[[str], Optional[str]],
+        generate_sql: Callable[[str, threading.Event], Optional[str]],
+        retrieve: Callable[[str, threading.Event], str],
+        max_workers: Optional[int] = None,
+        grace_ms: Optional[float] = None
+    ):
+        self.fast_path = fast_path
+        self.generate_sql = generate_sql
+        self.retrieve = retrieve
+        self.grace = (config.PIPELINE_FAST_PATH_GRACE_MS if grace_ms is None else grace_ms) / 1000
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.PIPELINE_MAX_WORKERS,
+            thread_name_prefix="pulse-pipeline"
+        )
+
+    def run(self, question: str) -> PipelineOutcome:
+        """Start every leg, then return the template answer or the generated SQL with pending context."""
+        decided = threading.Event()
+        cancel = threading.Event()
+
+        def speculative(leg: str, func: Callable[[], Optional[str]]) -> Optional[str]:
+            decided.wait(self.grace)
+            if cancel.is_set():
+                metrics.inc("pulse_pipeline_cancelled_total", leg=leg)
+                return None
+            return func()
+
+        sql_future = self._executor.submit(
+            speculative, "generate_sql", lambda: self.generate_sql(question, cancel)
+        )
+        context_future = self._executor.submit(
+            speculative, "retrieve", lambda: self.retrieve(question, cancel)
+        )
+
+        try:
+            answer = self.fast_path(question)
+        except Exception as e:
+            logger.error(f"Fast path failed: {e}")
+            answer = None
+        if answer is not None:
+            # Stops the SQL generation stream and retrieval, or keeps them from starting
+            cancel.set()
+            decided.set()
+            sql_future.cancel()
+            context_future.cancel()
+            return PipelineOutcome(template_answer=answer)
+        decided.set()
+
+        with metrics.span("pipeline_wait_sql"):
+            sql = sql_future.result()
+        return PipelineOutcome(sql=sql, context_future=context_future)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
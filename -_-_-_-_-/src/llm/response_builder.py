@@ -0,0 +1,288 @@
+"""
+Deterministic answers for template queries, and compaction of SQL results
+before they are pasted into the response_formatter prompt.
+"""
+import numbers
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core import constants
+from src.core.config import config
+from src.database.models import QueryResult
+
+# Never useful to the formatter
+_HIDDEN_COLUMNS = {"embedding", "embedding_hash"}
+# Question stems that ask for gene descriptions
+_DESCRIPTION_STEMS = ("функц", "описан", "известно", "роль", "делает", "отвечает", "расскажи")
+# Cell length long texts are cut to when the budget is tight
+_CELL_LIMIT = 160
+# Categorical columns with at most this many distinct values get a breakdown
+_BREAKDOWN_MAX_VALUES = 20
+_TOP_K = 5
+
+def build_template_answer(intent: str, params: Dict[str, Any], rows: List[Tuple[Any, ...]]) -> str:
+    """Format template query results without the LLM."""
+    if intent == "gene_info":
+        if not rows:
+            return f"Ген {params['gene_name']} не найден в сети."
+        name, description, family, degree = rows[0]
+        lines = [f"🧬 {name}"]
+        if family:
+            lines.append(f"Семейство: {family}")
+        if degree is not None:
+            lines.append(f"Связей в сети: {degree}")
+        if description:
+            lines.append("")
+            lines.append(description)
+        return "\n".join(lines)
+
+    if intent == "gene_connections":
+        if not rows:
+            return f"Ген {params['gene_name']} не найден в сети."
+        name, degree = rows[0]
+        if degree is None:
+            return f"Для гена {name} нет данных о количестве связей."
+        return f"Ген {name} имеет {degree} связей в сети."
+
+    if intent == "top_connected":
+        if not rows:
+            return "В сети нет данных о связях генов."
+        lines = [f"Топ-{len(rows)} генов по количеству связей:"]
+        for position, (name, degree) in enumerate(rows, start=1):
+            lines.append(f"{position}. {name} — {degree}")
+        return "\n".join(lines)
+
+    if intent == "by_family":
+        if not rows:
+            return f"Генов из семейства {params['family']} в сети не найдено."
+        shown = rows[:constants.TEMPLATE_LIST_LIMIT]
+        family, total = shown[0][1], shown[0][2]
+        answer = f"Гены семейства {family} ({total}): " + ", ".join(row[0] for row in shown)
+        if total > len(shown):
+            answer += f" … и ещё {total - len(shown)}"
+        return answer
+
+    if intent == "similar_genes":
+        if not rows:
+            return f"Для гена {params['gene_name']} нет эмбеддинга, похожие гены не найдены."
+        lines = [f"Гены, наиболее похожие на {params['gene_name']} по описанию:"]
+        for position, (name, similarity) in enumerate(rows, start=1):
+            lines.append(f"{position}. {name} — сходство {similarity:.2f}")
+        return "\n".join(lines)
+
+    if intent == "gene_neighbors":
+        threshold = _score_clause(params)
+        if not rows:
+            return f"У гена {params['gene_name']} нет партнёров по взаимодействию{threshold}."
+        shown = rows[:params["limit"]]
+        lines = [f"Партнёры гена {params['gene_name']} по взаимодействию{threshold} ({len(rows)}):"]
+        for position, (name, score) in enumerate(shown, start=1):
+            lines.append(f"{position}. {name} — score {score:.2f}")
+        if len(rows) > len(shown):
+            lines.append(f"… и ещё {len(rows) - len(shown)}")
+        return "\n".join(lines)
+
+    if intent == "gene_neighborhood":
+        hops, threshold = params["hops"], _score_clause(params)
+        distance = f"{hops} {'шага' if hops == 1 else 'шагов'}"
+        if not rows:
+            return f"В пределах {distance} от гена {params['gene_name']}{threshold} других генов нет."
+        lines = [f"Гены в пределах {distance} от {params['gene_name']}{threshold} ({len(rows)}):"]
+        budget = constants.TEMPLATE_LIST_LIMIT
+        for hop in sorted({row[1] for row in rows}):
+            names = [name for name, gene_hop in rows if gene_hop == hop]
+            shown = names[:budget]
+            budget -= len(shown)
+            if not shown:
+                lines.append(f"{hop} {_steps(hop)}: ещё {len(names)}")
+                continue
+            line = f"{hop} {_steps(hop)}: " + ", ".join(shown)
+            if len(names) > len(shown):
+                line += f" … и ещё {len(names) - len(shown)}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    if intent == "interaction_path":
+        threshold = _score_clause(params)
+        if not rows:
+            return f"Гены {params['source']} и {params['target']} не связаны в сети{threshold}."
+        steps = len(rows) - 1
+        path = " → ".join(row[0] for row in rows)
+        return f"Кратчайший путь от {params['source']} до {params['target']}{threshold} ({steps} {_steps(steps)}): {path}"
+
+    if intent == "gene_strong_connections":
+        name, degree = rows[0]
+        return f"Ген {name} имеет {degree} связей{_score_clause(params)} в сети."
+
+    if intent == "top_strong_connected":
+        if not rows:
+            return f"В сети нет связей{_score_clause(params)}."
+        lines = [f"Топ-{len(rows)} генов по количеству связей{_score_clause(params)}:"]
+        for position, (name, degree) in enumerate(rows, start=1):
+            lines.append(f"{position}. {name} — {degree}")
+        return "\n".join(lines)
+
+    raise ValueError(f"Unknown template intent: {intent}")
+
+def _score_clause(params: Dict[str, Any]) -> str:
+    """The " со score ≥ X" suffix of graph answers with an edge score threshold."""
+    min_score = params.get("min_score")
+    return f" со score ≥ {min_score:g}" if min_score else ""
+
+def _steps(count: int) -> str:
+    """Russian plural of "шаг" after a number."""
+    if count % 10 == 1 and count % 100 != 11:
+        return "шаг"
+    if 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        return "шага"
+    return "шагов"
+
+def build_retrieval_context(results: List[Dict[str, Any]], token_budget: Optional[int] = None) -> str:
+    """Hybrid search hits as one line per gene, dropping the tail that doesn't fit token_budget."""
+    token_budget = token_budget or config.PIPELINE_CONTEXT_TOKENS
+    lines = []
+    for result in results:
+        parts = [result["display_name"] or "—"]
+        if result.get("family"):
+            parts.append(result["family"])
+        if result.get("connections") is not None:
+            parts.append(f"связей: {result['connections']}")
+        if result.get("description"):
+            parts.append(_cell(result["description"], _CELL_LIMIT))
+        line = " | ".join(parts)
+        if estimate_tokens("\n".join(lines + [line])) > token_budget:
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: LLM_CHARS_PER_TOKEN characters per token."""
+    return int(len(text) / config.LLM_CHARS_PER_TOKEN) + 1
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+def _cell(value: Any, limit: Optional[int] = None) -> str:
+    if value is None:
+        return "—"
+    text = f"{value:.4g}" if isinstance(value, float) else str(value)
+    text = " ".join(text.split())
+    if limit is not None and len(text) > limit:
+        text = text[:limit - 1] + "…"
+    return text
+
+def _project(question: str, result: QueryResult) -> Tuple[List[int], Dict[str, Any]]:
+    """
+    Indices of the columns worth showing, plus columns that hold one value in every row.
+    Descriptions are only kept for small results or when the question asks about function.
+    """
+    wants_description = any(stem in question.lower() for stem in _DESCRIPTION_STEMS)
+    many_rows = len(result) > config.COMPACT_MAX_ROWS // 3
+    keep: List[int] = []
+    constants: Dict[str, Any] = {}
+    for index, column in enumerate(result.columns):
+        lowered = column.lower()
+        if lowered in _HIDDEN_COLUMNS:
+            continue
+        values = [row[index] for row in result.rows]
+        if len(values) > 1 and all(value == values[0] for value in values):
+            constants[column] = values[0]
+            continue
+        if lowered == "stringdb_description" and many_rows and not wants_description:
+            continue
+        keep.append(index)
+
+    lowered_kept = [result.columns[i].lower() for i in keep]
+    if "display_name" in lowered_kept and "name" in lowered_kept:
+        # N.name is a Cytoscape id that duplicates display_name
+        keep.pop(lowered_kept.index("name"))
+    if not keep and not constants:
+        keep = [i for i, c in enumerate(result.columns) if c.lower() not in _HIDDEN_COLUMNS][:1]
+    return keep, constants
+
+def _aggregates(result: QueryResult, keep: List[int]) -> List[str]:
+    """Counts, numeric ranges, top-k and category breakdowns over all fetched rows."""
+    lines = []
+    label_index = next(
+        (i for i in keep if result.columns[i].lower() == "display_name"),
+        next((i for i in keep if not _is_number(result.rows[0][i])), None)
+    )
+    for index in keep:
+        column = result.columns[index]
+        values = [row[index] for row in result.rows if row[index] is not None]
+        if not values:
+            continue
+        if all(_is_number(value) for value in values):
+            floats = [float(value) for value in values]
+            lines.append(
+                f"{column}: мин {_cell(min(values))}, макс {_cell(max(values))}, "
+                f"среднее {sum(floats) / len(floats):.4g}"
+            )
+            if label_index is not None and label_index != index:
+                top = sorted(
+                    (row for row in result.rows if row[index] is not None),
+                    key=lambda row: row[index],
+                    reverse=True
+                )[:_TOP_K]
+                lines.append(
+                    f"Топ-{len(top)} по {column}: "
+                    + ", ".join(f"{_cell(row[label_index])} ({_cell(row[index])})" for row in top)
+                )
+            continue
+        counts = Counter(_cell(value) for value in values)
+        if index != label_index and len(counts) <= min(_BREAKDOWN_MAX_VALUES, len(values) // 2):
+            breakdown = ", ".join(f"{value} — {count}" for value, count in counts.most_common(10))
+            lines.append(f"Распределение {column}: {breakdown}")
+    return lines
+
+def _render(
+    result: QueryResult,
+    keep: List[int],
+    summary: List[str],
+    shown: int,
+    cell_limit: Optional[int]
+) -> str:
+    lines = list(summary)
+    if keep and shown:
+        if shown < len(result):
+            lines.append(f"Строки (первые {shown} из {len(result)}):")
+        lines.append(" | ".join(result.columns[i] for i in keep))
+        for row in result.rows[:shown]:
+            lines.append(" | ".join(_cell(row[i], cell_limit) for i in keep))
+    return "\n".join(lines)
+
+def compact_result(question: str, result: QueryResult, token_budget: Optional[int] = None) -> str:
+    """
+    Text for the response_formatter prompt that stays within token_budget however many rows came back.
+    Rows are capped at COMPACT_MAX_ROWS, only the columns the question needs are kept, and large
+    results are summarized (row count, value ranges, top-k, category breakdowns) before listing.
+    """
+    token_budget = token_budget or config.LLM_PROMPT_TOKEN_BUDGET
+    keep, constants = _project(question, result)
+
+    summary = []
+    if result.truncated:
+        summary.append(f"Строк: более {len(result)} (результат обрезан, статистика по первым {len(result)})")
+    else:
+        summary.append(f"Строк: {len(result)}")
+    for column, value in constants.items():
+        summary.append(f"{column} = {_cell(value, _CELL_LIMIT)} во всех строках")
+    if len(result) > config.COMPACT_MAX_ROWS:
+        summary.extend(_aggregates(result, keep))
+
+    # Shrink until the text fits: cut long cells first, then halve the listed rows
+    shown = min(len(result), config.COMPACT_MAX_ROWS)
+    cell_limit = None
+    text = _render(result, keep, summary, shown, cell_limit)
+    while estimate_tokens(text) > token_budget:
+        if cell_limit is None:
+            cell_limit = _CELL_LIMIT
+        elif shown > 1:
+            shown //= 2
+        else:
+            # Even the summary alone is too long
+            # estimate_tokens rounds up, so leave one token of room
+            text = text[:int((token_budget - 1) * config.LLM_CHARS_PER_TOKEN) - 1] + "…"
+            break
+        text = _render(result, keep, summary, shown, cell_limit)
+    return text
@@ -0,0 +1,239 @@
+"""
+Fast-path SQL routing.
+Common questions are classified with cheap rules and mapped onto the
+parameterized constants.SQL_TEMPLATES or onto interaction graph queries,
+so they never reach the LLM.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from src.core import constants
+
+# Uppercase Latin tokens that look like gene symbols but are common abbreviations
+_NOT_GENES = {"DNA", "RNA", "ДНК", "SQL", "ID", "AI", "LLM", "TOP"}
+
+_GENE_TOKEN = re.compile(r"\b[A-Z][A-Z0-9-]*[A-Z0-9]\b")
+_TOP_LIMIT = re.compile(r"топ[\s-]*(\d+)|(\d+)\s+ген")
+# Standalone numbers; digits inside gene symbols such as "tp53" are not matched
+_NUMBER = re.compile(r"(?<![\w.,])\d+(?:[.,]\d+)?(?!\w)")
+# Thresholds and comparisons no template can express ("score > 0.9", "больше 100 связей")
+_COMPARISON = re.compile(
+    r"[<>≤≥=]|score|скор|порог|оценк|\b(?:больше(?!\s+всего)|меньше|выше|ниже|более|менее|свыше|минимум|максимум)\b"
+)
+
+# "score > 0.9", "с оценкой выше 0,7": an edge score threshold the interaction graph can apply
+_SCORE_THRESHOLD = re.compile(
+    r"(?:score|скор\w*|оценк\w*|надежн\w*|надёжн\w*)\s*"
+    r"(?:>=|≥|>|выше|больше|не ниже|от)\s*(?P<score>0?[.,]\d+|[01](?![.,]\d))"
+)
+# "в пределах 2 шагов", "2 hops"
+_HOPS = re.compile(r"(\d+)[\s-]*(?:шаг|хоп|hop|рукопожат)")
+
+_COUNT_MARKERS = ("сколько", "посчитай", "подсчитай")
+_TOP_MARKERS = ("топ", "наибольш", "больше всего", "самы")
+_SIMILAR_MARKERS = ("похож", "схож", "подобн")
+_NEIGHBOR_MARKERS = ("взаимодейств", "партнер", "партнёр", "сосед", "связаны с ", "связан с ")
+_PATH_MARKERS = ("путь", "как связаны", "связь между", "цепочк")
+
+MAX_TOP_LIMIT = 50
+DEFAULT_TOP_LIMIT = 5
+DEFAULT_HOPS = 2
+MAX_HOPS = 5
+
+# Intents answered from the in-memory InteractionGraph; they have no SQL template
+GRAPH_INTENTS = {
+    "gene_neighbors",
+    "gene_neighborhood",
+    "interaction_path",
+    "gene_strong_connections",
+    "top_strong_connected",
+}
+
+def find_gene_symbols(text: str) -> List[str]:
+    """Default gene finder: uppercase symbol-like tokens, in order of appearance."""
+    found = []
+    for token in _GENE_TOKEN.findall(text):
+        if token not in _NOT_GENES and token not in found:
+            found.append(token)
+    return found
+
+@dataclass
+class RoutedQuery:
+    """A template query selected for a question."""
+    intent: str
+    params: Dict[str, Any]
+    confidence: float
+    sql: Optional[str] = field(init=False)
+
+    def __post_init__(self):
+        self.sql = None if self.intent in GRAPH_INTENTS else constants.SQL_TEMPLATES[self.intent]
+
+class IntentRouter:
+    """
+    Rule-based classifier that fills SQL_TEMPLATES with bound parameters, or routes
+    neighbourhood, path and score-threshold questions to the interaction graph.
+    A question that also asks for something its template cannot express (a second
+    intent, a threshold, a count, an explicit limit) is left to the LLM.
+    """
+
+    def __init__(self, gene_finder: Optional[Callable[[str], List[str]]] = None):
+        self.gene_finder = gene_finder or find_gene_symbols
+
+    def route(self, question: str) -> Optional[RoutedQuery]:
+        """Classify the question; returns None when no template fits."""
+        text = question.lower()
+        genes = self.gene_finder(question)
+        mentions_links = "связ" in text or "соседей" in text
+        mentions_family = "семейств" in text or self._family(text) is not None
+        asks_top = any(marker in text for marker in _TOP_MARKERS)
+        asks_similar = any(marker in text for marker in _SIMILAR_MARKERS)
+        asks_count = any(marker in text for marker in _COUNT_MARKERS)
+        # "количеством связей" also appears in ranking questions, so it only counts outside them
+        asks_amount = asks_count or "количеств" in text or "числ" in text
+
+        # An edge score threshold is only expressible on the interaction graph
+        min_score = 0.0
+        threshold = _SCORE_THRESHOLD.search(text)
+        if threshold:
+            min_score = float(threshold.group("score").replace(",", "."))
+            text = f"{text[:threshold.start()]} {text[threshold.end():]}"
+        if _COMPARISON.search(text):
+            return None
+
+        graph_route = self._route_graph(text, genes, min_score)
+        if graph_route is not None or min_score:
+            return graph_route
+
+        # "Назови топ-5 генов с наибольшим количеством связей."
+        if not genes and mentions_links and asks_top:
+            if mentions_family or asks_similar or asks_count or self._extra_numbers(text, limit=True):
+                return None
+            return RoutedQuery("top_connected", {"limit": self._top_limit(text)}, 0.9)
+
+        # "Найди гены из семейства киназ."
+        if not genes and "семейств" in text:
+            family = self._family(text)
+            if family is None or mentions_links or asks_top or asks_similar or asks_amount:
+                return None
+            if self._extra_numbers(text, limit=False):
+                return None
+            return RoutedQuery("by_family", {"family": family, "limit": constants.TEMPLATE_LIST_LIMIT}, 0.85)
+
+        if len(genes) != 1:
+            return None
+        gene = genes[0]
+        if self._family(text) is not None:
+            return None
+
+        # "Какие гены функционально похожи на SIRT6?"
+        if asks_similar:
+            if mentions_links or asks_amount or self._extra_numbers(text, limit=True):
+                return None
+            return RoutedQuery("similar_genes", {"gene_name": gene, "limit": self._top_limit(text)}, 0.85)
+
+        if self._extra_numbers(text, limit=False):
+            return None
+
+        # "Сколько связей у гена EGFR?"
+        if mentions_links and asks_amount:
+            if "семейств" in text or asks_top:
+                return None
+            return RoutedQuery("gene_connections", {"gene_name": gene}, 0.9)
+        if mentions_links or asks_amount or asks_top:
+            return None
+
+        # "TP53" on its own
+        if question.strip(" ?!.").upper() == gene:
+            return RoutedQuery("gene_info", {"gene_name": gene}, 0.95)
+
+        # "Что известно о гене TP53?", "К какому семейству белков относится ген INS?"
+        if any(marker in text for marker in ("что известно", "расскажи", "информаци", "описани", "функци")):
+            return RoutedQuery("gene_info", {"gene_name": gene}, 0.85)
+        if "семейств" in text and "относится" in text:
+            return RoutedQuery("gene_info", {"gene_name": gene}, 0.85)
+
+        # A single gene but an unrecognised question shape
+        return RoutedQuery("gene_info", {"gene_name": gene}, 0.5)
+
+    def _route_graph(self, text: str, genes: List[str], min_score: float) -> Optional[RoutedQuery]:
+        """Neighbourhood, path and score-threshold questions for the interaction graph."""
+        mentions_family = "семейств" in text or self._family(text) is not None
+        asks_similar = any(marker in text for marker in _SIMILAR_MARKERS)
+        asks_top = any(marker in text for marker in _TOP_MARKERS)
+        asks_count = any(marker in text for marker in _COUNT_MARKERS)
+        if mentions_family or asks_similar:
+            return None
+
+        # "Какие гены в пределах 2 шагов от TP53 со score > 0.9?"
+        hops = _HOPS.search(text)
+        if hops or "окрестност" in text:
+            if len(genes) != 1 or asks_count or asks_top:
+                return None
+            k = int(hops.group(1)) if hops else DEFAULT_HOPS
+            rest = f"{text[:hops.start()]} {text[hops.end():]}" if hops else text
+            if not 1 <= k <= MAX_HOPS or self._extra_numbers(rest, limit=False):
+                return None
+            return RoutedQuery(
+                "gene_neighborhood",
+                {"gene_name": genes[0], "hops": k, "min_score": min_score},
+                0.85
+            )
+
+        # "Как связаны TP53 и MDM2?"
+        if len(genes) == 2 and any(marker in text for marker in _PATH_MARKERS):
+            if asks_count or asks_top or self._extra_numbers(text, limit=False):
+                return None
+            return RoutedQuery(
+                "interaction_path",
+                {"source": genes[0], "target": genes[1], "min_score": min_score},
+                0.85
+            )
+
+        mentions_links = "связ" in text or "сосед" in text or "партн" in text
+        # "Сколько связей у гена TP53 со score > 0.9?"
+        if len(genes) == 1 and min_score and mentions_links and asks_count:
+            if asks_top or self._extra_numbers(text, limit=False):
+                return None
+            return RoutedQuery("gene_strong_connections", {"gene_name": genes[0], "min_score": min_score}, 0.9)
+
+        # "С какими генами взаимодействует TP53?", "Топ-5 партнёров EGFR"
+        if len(genes) == 1 and any(marker in text for marker in _NEIGHBOR_MARKERS):
+            if asks_count or self._extra_numbers(text, limit=asks_top):
+                return None
+            limit = self._top_limit(text) if asks_top else constants.TEMPLATE_LIST_LIMIT
+            return RoutedQuery(
+                "gene_neighbors",
+                {"gene_name": genes[0], "min_score": min_score, "limit": limit},
+                0.85
+            )
+
+        # "Топ-5 генов по числу связей со score > 0.7"
+        if not genes and min_score and mentions_links and asks_top:
+            if asks_count or self._extra_numbers(text, limit=True):
+                return None
+            return RoutedQuery("top_strong_connected", {"limit": self._top_limit(text), "min_score": min_score}, 0.85)
+        return None
+
+    @staticmethod
+    def _extra_numbers(text: str, limit: bool) -> bool:
+        """Whether the text has numbers beyond the "топ-N" / "N генов" limit a template can take."""
+        numbers = len(_NUMBER.findall(text))
+        if limit and _TOP_LIMIT.search(text):
+            numbers -= 1
+        return numbers > 0
+
+    @staticmethod
+    def _top_limit(text: str) -> int:
+        match = _TOP_LIMIT.search(text)
+        if not match:
+            return DEFAULT_TOP_LIMIT
+        limit = int(match.group(1) or match.group(2))
+        return max(1, min(limit, MAX_TOP_LIMIT))
+
+    @staticmethod
+    def _family(text: str) -> Optional[str]:
+        for stem, family in constants.FAMILY_ALIASES.items():
+            if stem in text:
+                return family
+        return None
@@ -4,19 +4,7 @@ Main entry point for Pulse AI Assistant.
 import logging
 from src.core.config import config
 from src.bot.telegram_bot import PulseBot
-
-def setup_logging() -> None:
-    """Configure logging for the application."""
-    logging.basicConfig(
-        level=getattr(logging, config.LOG_LEVEL),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(config.LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
-    logger = logging.getLogger(__name__)
-    logger.info("Pulse AI Assistant starting...")
+from src.utils.logger import setup_logging
 
 def main() -> None:
     """Main application entry point."""
@@ -26,9 +14,13 @@ def main() -> None:
         
         # Setup logging
         setup_logging()
+        logging.getLogger(__name__).info("Pulse AI Assistant starting...")
         
         # Initialize and run the bot
         bot = PulseBot(config.TELEGRAM_BOT_TOKEN)
+        if config.API_ENABLED:
+            from src.api.app import start_in_background
+            start_in_background(bot)
         bot.run()
         
     except Exception as e:
@@ -0,0 +1,172 @@
+"""
+Gene mention extraction over the full N.display_name vocabulary.
+Exact mentions are matched with a token trie, typos (e.g. TP35 -> TP53)
+with a BK-tree.
+"""
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[A-Za-z0-9][A-Za-z0-9-]*")
+_END = "$"
+
+# Latin tokens common in questions that must not be fuzzy-matched to genes
+_STOPWORDS = {"DNA", "RNA", "SQL", "TOP", "GENE", "GENES", "AND", "THE", "WITH"}
+
+def tokenize(text: str) -> List[str]:
+    """Split text into uppercase Latin/digit tokens."""
+    return [token.upper() for token in _TOKEN.findall(text)]
+
+def levenshtein(a: str, b: str) -> int:
+    """Levenshtein distance (a metric, as the BK-tree requires)."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)
+            ))
+        previous = current
+    return previous[-1]
+
+def osa_distance(a: str, b: str) -> int:
+    """Optimal string alignment distance: Levenshtein plus adjacent transpositions."""
+    rows = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        rows[i][0] = i
+    for j in range(len(b) + 1):
+        rows[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            rows[i][j] = min(rows[i - 1][j] + 1, rows[i][j - 1] + 1, rows[i - 1][j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                rows[i][j] = min(rows[i][j], rows[i - 2][j - 2] + 1)
+    return rows[-1][-1]
+
+class BKTree:
+    """Burkhard-Keller tree over Levenshtein distance."""
+
+    def __init__(self):
+        self._root: Optional[Tuple[str, Dict[int, tuple]]] = None
+
+    def add(self, word: str) -> None:
+        if self._root is None:
+            self._root = (word, {})
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, radius: int) -> List[Tuple[str, int]]:
+        """All words within the given Levenshtein radius."""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            candidate, children = stack.pop()
+            distance = levenshtein(word, candidate)
+            if distance <= radius:
+                found.append((candidate, distance))
+            for edge in range(distance - radius, distance + radius + 1):
+                child = children.get(edge)
+                if child is not None:
+                    stack.append(child)
+        return found
+
+class GeneMentionExtractor:
+    """Finds canonical gene names mentioned in a message in one pass over its tokens."""
+
+    def __init__(self, names: Iterable[str], max_typos: int = 1, min_fuzzy_length: int = 4):
+        self.max_typos = max_typos
+        self.min_fuzzy_length = min_fuzzy_length
+        self._trie: Dict[str, dict] = {}
+        self._fuzzy = BKTree()
+        # Single-token gene name -> canonical display name
+        self._single: Dict[str, str] = {}
+        self.size = 0
+
+        for name in names:
+            if not name:
+                continue
+            tokens = tokenize(name)
+            if not tokens:
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(_END, name)
+            if len(tokens) == 1:
+                self._single.setdefault(tokens[0], name)
+                self._fuzzy.add(tokens[0])
+            self.size += 1
+
+    @classmethod
+    def from_db(cls, db, **kwargs) -> "GeneMentionExtractor":
+        """Build the extractor from every N.display_name."""
+        rows = db.execute_query("SELECT DISTINCT display_name FROM N")
+        extractor = cls((row[0] for row in rows), **kwargs)
+        logger.info(f"Gene extractor built with {extractor.size} genes")
+        return extractor
+
+    def extract(self, text: str) -> List[str]:
+        """Canonical gene names in order of first mention."""
+        raw_tokens = _TOKEN.findall(text)
+        tokens = [token.upper() for token in raw_tokens]
+        found: List[str] = []
+
+        i = 0
+        while i < len(tokens):
+            # Longest exact match starting at token i
+            node = self._trie
+            match, match_length = None, 0
+            for offset in range(i, len(tokens)):
+                node = node.get(tokens[offset])
+                if node is None:
+                    break
+                if _END in node:
+                    match, match_length = node[_END], offset - i + 1
+
+            if match is None and self._fuzzy_candidate(raw_tokens[i]):
+                match, match_length = self._correct(tokens[i]), 1
+
+            if match is not None and match not in found:
+                found.append(match)
+            i += match_length or 1
+
+        return found
+
+    def _fuzzy_candidate(self, token: str) -> bool:
+        """Only symbol-like tokens (uppercase or with digits) are typo-corrected."""
+        if len(token) < self.min_fuzzy_length or token.upper() in _STOPWORDS:
+            return False
+        return token.isupper() or any(ch.isdigit() for ch in token)
+
+    def _correct(self, token: str) -> Optional[str]:
+        """Closest gene within max_typos, or None if there is none or it is ambiguous."""
+        # OSA distance <= k implies Levenshtein distance <= 2k, so this radius misses nothing
+        candidates = self._fuzzy.search(token, 2 * self.max_typos)
+        scored = sorted(
+            (osa_distance(token, candidate), candidate)
+            for candidate, _ in candidates
+        )
+        scored = [(distance, candidate) for distance, candidate in scored if distance <= self.max_typos]
+        if not scored:
+            return None
+        if len(scored) > 1 and scored[0][0] == scored[1][0]:
+            return None
+        return self._single[scored[0][1]]
@@ -1,53 +1,205 @@
 """
 Hybrid search combining vector and SQL search.
 """
-from typing import List, Dict, Any
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Callable, Tuple
+import numpy as np
+from src.core.config import config
 from src.database.connection import DatabaseConnection
+from src.database.result_cache import ResultCache
+from src.database.repositories.gene_repository import GeneRepository
+from src.database.repositories.vector_repository import VectorRepository
+from src.embeddings.search import VectorIndex
+from src.search.gene_extractor import GeneMentionExtractor
+from src.search.vector_searcher import VectorSearcher
+from src.database.repositories.edge_repository import InteractionGraph
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
 
 class HybridSearcher:
     """Combines vector semantic search with SQL filtering."""
     
-    def __init__(self, db_connection: DatabaseConnection):
+    def __init__(
+        self,
+        db_connection: DatabaseConnection,
+        vector_index: Optional[VectorIndex] = None,
+        gene_extractor: Optional[GeneMentionExtractor] = None,
+        encoder: Optional[Callable[[List[str]], np.ndarray]] = None,
+        graph: Optional[InteractionGraph] = None,
+        result_cache: Optional[ResultCache] = None
+    ):
         self.db = db_connection
+        self.genes = GeneRepository(db_connection, result_cache)
+        self.vectors = VectorRepository(db_connection, result_cache)
+        self.vector_searcher = VectorSearcher(vector_index)
+        self.gene_extractor = gene_extractor
+        self.encoder = encoder
+        self.graph = graph
+    
+    @property
+    def vector_index(self) -> Optional[VectorIndex]:
+        return self.vector_searcher.vector_index
     
-    def search(self, query: str) -> List[Dict[str, Any]]:
+    @vector_index.setter
+    def vector_index(self, index: Optional[VectorIndex]) -> None:
+        self.vector_searcher.vector_index = index
+    
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_degree: Optional[int] = None,
+        family: Optional[str] = None,
+        near_gene: Optional[str] = None,
+        max_hops: int = 2,
+        min_edge_score: float = 0.0,
+        cancel: Optional[threading.Event] = None
+    ) -> List[Dict[str, Any]]:
         """
         Perform hybrid search:
-        1. Vector search for semantic similarity
-        2. SQL filtering for exact criteria
+        1. Exact leg: genes mentioned in the query
+        2. Vector leg: genes semantically similar to the query
+        3. One SQL round trip resolves both legs and applies the filters
+        4. Legs are merged with reciprocal rank fusion
+        
+        With near_gene, results are restricted to genes within max_hops of it
+        over interactions with stringdb_score >= min_edge_score.
+        Once cancel is set, no database connection is taken and [] is returned.
         """
-        # TODO: Implement vector search when embeddings are ready
-        # For now, fall back to SQL-based search
+        hops = self._neighbourhood(near_gene, max_hops, min_edge_score)
+        within = list(hops) if hops is not None else None
+        if within == []:
+            return []
         
-        # Extract potential gene names from query
         gene_names = self._extract_gene_names(query)
+        with metrics.span("vector_search") as vector_span:
+            vector_hits = self._vector_leg(query, top_k, min_degree, family, within)
+            vector_span["hits"] = len(vector_hits)
         
-        if gene_names:
-            # Search for specific genes
-            results = []
-            for gene in gene_names:
-                sql = f"""
-                SELECT display_name, stringdb_description, target_family, degree_layout
-                FROM N WHERE display_name ILIKE '%{gene}%'
-                LIMIT 5
-                """
-                try:
-                    rows = self.db.execute_query(sql)
-                    for row in rows:
-                        results.append({
-                            "display_name": row[0],
-                            "description": row[1],
-                            "family": row[2],
-                            "connections": row[3]
-                        })
-                except:
-                    continue
-            return results
-        
-        return []
+        if not gene_names and not vector_hits:
+            return []
+        if cancel is not None and cancel.is_set():
+            return []
+        
+        with metrics.span("search_sql") as sql_span:
+            rows = self.genes.find(
+                display_names=gene_names,
+                names=[name for name, _ in vector_hits],
+                min_degree=min_degree,
+                family=family,
+                within=within
+            )
+            sql_span["rows"] = len(rows)
+        
+        by_display_name = {row[1]: row for row in rows}
+        by_name = {row[0]: row for row in rows}
+        exact_ranking = [by_display_name[gene] for gene in gene_names if gene in by_display_name]
+        vector_ranking = [by_name[name] for name, _ in vector_hits if name in by_name]
+        similarities = dict(vector_hits)
+        
+        results = self._fuse(exact_ranking, vector_ranking, similarities)[:top_k]
+        if hops is not None:
+            for result in results:
+                result["hops"] = hops.get(result["display_name"])
+        return results
+    
+    def _neighbourhood(self, gene: Optional[str], max_hops: int, min_edge_score: float) -> Optional[Dict[str, int]]:
+        """Genes within max_hops of gene, or None when no graph restriction applies."""
+        if gene is None:
+            return None
+        if self.graph is None:
+            logger.warning("Interaction graph is not loaded, ignoring near_gene filter")
+            return None
+        return self.graph.k_hop(gene, k=max_hops, min_score=min_edge_score)
+    
+    def _fuse(
+        self,
+        exact_ranking: List[tuple],
+        vector_ranking: List[tuple],
+        similarities: Dict[str, float]
+    ) -> List[Dict[str, Any]]:
+        """Reciprocal rank fusion: score = sum of 1 / (k + rank) over the legs a gene appears in."""
+        results: Dict[str, Dict[str, Any]] = {}
+        for source, ranking in (("exact", exact_ranking), ("vector", vector_ranking)):
+            for rank, row in enumerate(ranking, start=1):
+                result = results.get(row[0])
+                if result is None:
+                    result = results[row[0]] = {
+                        "display_name": row[1],
+                        "description": row[2],
+                        "family": row[3],
+                        "connections": row[4],
+                        "score": 0.0,
+                        "sources": []
+                    }
+                    if row[0] in similarities:
+                        result["similarity"] = similarities[row[0]]
+                result["score"] += 1.0 / (config.RRF_K + rank)
+                result["sources"].append(source)
+        
+        # Deterministic order: fused score, then name
+        return sorted(results.values(), key=lambda r: (-r["score"], r["display_name"] or ""))
+    
+    def _vector_leg(
+        self,
+        query: str,
+        top_k: int,
+        min_degree: Optional[int],
+        family: Optional[str],
+        within: Optional[List[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """(N.name, similarity) of the genes closest to the query, best first."""
+        if self.encoder is None:
+            return []
+        try:
+            query_embedding = np.asarray(self.encoder([query])[0], dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Disabling vector search leg, encoder failed: {e}")
+            self.encoder = None
+            return []
+        
+        if self.vector_index is not None:
+            hits = self.vector_searcher.search(
+                query_embedding,
+                top_k=top_k,
+                family=family,
+                min_degree=min_degree,
+                display_names=within
+            )
+            return [(hit["name"], hit["similarity"]) for hit in hits]
+        
+        # No in-process index yet: ask pgvector, with the same filters
+        return self.vectors.nearest(
+            query_embedding,
+            top_k=top_k,
+            min_degree=min_degree,
+            family=family,
+            within=within
+        )
+    
+    def vector_search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        family: Optional[str] = None,
+        min_degree: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Semantic search against the in-process vector index (no database round trip)."""
+        return self.vector_searcher.search(
+            query_embedding,
+            top_k=top_k,
+            family=family,
+            min_degree=min_degree
+        )
     
     def _extract_gene_names(self, query: str) -> List[str]:
-        """Simple gene name extraction (to be improved)."""
+        """Extract canonical gene names mentioned in the query."""
+        if self.gene_extractor is not None:
+            return self.gene_extractor.extract(query)
+        
+        # Fallback until the extractor is built from N
         common_genes = [
             "TP53", "BRCA1", "BRCA2", "EGFR", "ATM", "CHEK2", 
             "SIRT6", "ERCC1", "RAD50", "BLM", "FANCD2"
@@ -0,0 +1,85 @@
+"""
+Semantic gene search over the in-process vector index.
+Gene-seeded similarity is served from the precomputed neighbour table;
+only free-text queries scan the embedding matrix.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.embeddings.search import NeighborTable, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+class VectorSearcher:
+    """Similarity search over gene embeddings, without database round trips."""
+
+    def __init__(
+        self,
+        vector_index: Optional[VectorIndex] = None,
+        neighbors: Optional[NeighborTable] = None
+    ):
+        self.vector_index = vector_index
+        self.neighbors = neighbors
+        self.table_hits = 0
+        self.live_scans = 0
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        family: Optional[str] = None,
+        min_degree: Optional[int] = None,
+        display_names: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Free-text search: top-k genes for an encoded query, by a scan of the matrix."""
+        if self.vector_index is None:
+            return []
+        self.live_scans += 1
+        return self.vector_index.search_records(
+            query_embedding,
+            top_k=top_k,
+            family=family,
+            min_degree=min_degree,
+            display_names=display_names
+        )
+
+    def similar_genes(
+        self,
+        gene: str,
+        top_k: int = 10,
+        family: Optional[str] = None,
+        min_degree: Optional[int] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Genes most similar to gene (display name, case-insensitive), best first.
+        Answered from the neighbour table when its k stored neighbours cover the request,
+        from a scan with the gene's own embedding otherwise.
+        Returns None when the gene has no embedding or the index is not loaded.
+        """
+        index = self.vector_index
+        if index is None:
+            return None
+        row = index.position(gene)
+        if row is None:
+            return None
+
+        neighbors = self.neighbors
+        if neighbors is not None and neighbors.position(index.names[row]) == row:
+            hits = neighbors.neighbors(row)
+            if family is not None or min_degree is not None:
+                mask = index.mask(family=family, min_degree=min_degree)
+                hits = [(i, score) for i, score in hits if mask[i]]
+            # A full row filtered below top_k may be hiding matches past the k-th neighbour
+            if len(hits) >= top_k or neighbors.k >= len(index) - 1:
+                self.table_hits += 1
+                return [dict(index.record(i), similarity=score) for i, score in hits[:top_k]]
+
+        self.live_scans += 1
+        mask = index.mask(family=family, min_degree=min_degree)
+        if mask is None:
+            mask = np.ones(len(index), dtype=bool)
+        mask[row] = False
+        hits = index.search(index.matrix[row], top_k=top_k, mask=mask)[0]
+        return [dict(index.record(i), similarity=score) for i, score in hits]
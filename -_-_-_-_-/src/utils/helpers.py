@@ -0,0 +1,11 @@
+"""
+Small process-level helpers shared by the scripts and services.
+"""
+import resource
+import sys
+
+def peak_memory_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
@@ -0,0 +1,56 @@
+"""
+Logging setup: config/logging.yaml with a JSON formatter for structured records.
+"""
+import json
+import logging
+import logging.config
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from src.core.config import config
+
+LOGGING_CONFIG_PATH = Path(__file__).parent.parent.parent / "config" / "logging.yaml"
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including fields passed with extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+def setup_logging(path: Optional[Path] = None) -> None:
+    """
+    Configure logging from config/logging.yaml.
+    LOG_LEVEL and LOG_FILE from the environment override the file's root level and log path.
+    """
+    path = Path(path or LOGGING_CONFIG_PATH)
+    try:
+        with open(path, encoding="utf-8") as f:
+            settings = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError) as e:
+        logging.basicConfig(level=getattr(logging, config.LOG_LEVEL))
+        logging.getLogger(__name__).warning(f"Using basic logging, could not read {path}: {e}")
+        return
+
+    settings.setdefault("root", {})["level"] = config.LOG_LEVEL
+    file_handler = settings.get("handlers", {}).get("file")
+    if file_handler is not None:
+        config.LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+        file_handler["filename"] = str(config.LOG_FILE)
+    logging.config.dictConfig(settings)
@@ -0,0 +1,184 @@
+"""
+In-process metrics for the query pipeline.
+Counters, histograms and timing spans, rendered in the Prometheus text format.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a cached template answer up to a slow local LLM
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+# (metric name, type, help, labels, value) reported by collectors at scrape time
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Thread-safe registry of labelled counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, str] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def counter(self, name: str, help: str) -> None:
+        """Declare a counter so it is rendered (as empty) before its first increment."""
+        with self._lock:
+            self._help[name] = help
+            self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """Declare a histogram with its bucket upper bounds."""
+        with self._lock:
+            self._help[name] = help
+            self._buckets[name] = tuple(sorted(buckets))
+            self._histograms.setdefault(name, {})
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """Add a callable that reports gauges (cache sizes, pool usage) at scrape time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+            histogram.observe(value)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            collectors = list(self._collectors)
+            help_texts = dict(self._help)
+
+        for name in sorted(counters):
+            lines.append(f"# HELP {name} {help_texts.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        for name in sorted(histograms):
+            lines.append(f"# HELP {name} {help_texts.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, (buckets, counts, total, count) in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    labels = key + (("le", _format_value(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(labels)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+        # Samples of one metric must be contiguous, whichever collector reported them
+        families: Dict[str, List[str]] = {}
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help, labels, value in samples:
+                if name not in families:
+                    families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                families[name].append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        for family in families.values():
+            lines.extend(family)
+
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+registry.histogram("pulse_stage_duration_seconds", "Duration of query pipeline stages")
+registry.counter("pulse_stage_failures_total", "Pipeline stages that failed")
+registry.counter("pulse_llm_tokens_total", "LLM tokens reported by the server")
+registry.counter("pulse_sql_guard_verdicts_total", "Query guard verdicts on generated SQL")
+registry.counter("pulse_pipeline_cancelled_total", "Speculative pipeline legs cancelled by a fast-path answer")
+registry.histogram(
+    "pulse_sql_rows",
+    "Rows returned by executed SQL",
+    buckets=(0, 1, 5, 10, 50, 100, 200, 500, 1000)
+)
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    registry.inc(name, value, **labels)
+
+def observe(name: str, value: float, **labels) -> None:
+    registry.observe(name, value, **labels)
+
+@contextmanager
+def span(stage: str, **fields) -> Iterator[Dict[str, object]]:
+    """
+    Time a pipeline stage.
+    The duration goes into pulse_stage_duration_seconds and a structured log record;
+    the yielded dict can carry extra fields (rows, cache hit) into that record.
+    Setting its "status" to "error" counts a failure that was handled without raising.
+    """
+    record: Dict[str, object] = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record["status"] = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        status = record.pop("status", "ok")
+        if status == "error":
+            registry.inc("pulse_stage_failures_total", stage=stage)
+        registry.observe("pulse_stage_duration_seconds", duration, stage=stage)
+        logger.info(
+            f"{stage} took {duration * 1000:.1f}ms",
+            extra={"stage": stage, "duration_ms": round(duration * 1000, 3), "status": status, **record}
+        )
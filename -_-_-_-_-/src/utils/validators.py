@@ -0,0 +1,173 @@
+"""
+Lexical checks and rewrites for untrusted SQL, such as the queries generated by the LLM.
+The statement is tokenized (comments, string literals and quoted identifiers aside),
+so keywords inside literals don't trigger false alarms and comments can't hide code.
+"""
+import re
+from typing import List, Tuple
+
+from src.core.exceptions import QueryRejected
+
+_TOKEN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*')
+    |(?P<dollar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+    |(?P<ident>"(?:[^"]|"")*")
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+    |(?P<word>[A-Za-z_][A-Za-z_0-9$]*)
+    |(?P<space>\s+)
+    |(?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL
+)
+
+# Statements and clauses that write, lock or change session state
+FORBIDDEN_KEYWORDS = {
+    "insert", "update", "delete", "merge", "upsert", "drop", "alter", "create", "truncate",
+    "grant", "revoke", "copy", "vacuum", "call", "lock", "share", "refresh", "reindex",
+    "cluster", "listen", "notify", "prepare", "execute", "deallocate", "discard", "reset",
+}
+
+# Functions with side effects or server file system access
+FORBIDDEN_FUNCTIONS = {
+    "pg_sleep", "pg_sleep_for", "pg_sleep_until", "pg_terminate_backend", "pg_cancel_backend",
+    "pg_reload_conf", "pg_rotate_logfile", "pg_read_file", "pg_read_binary_file", "pg_ls_dir",
+    "pg_stat_file", "pg_notify", "pg_logical_emit_message", "set_config", "nextval", "setval",
+    "query_to_xml", "query_to_xml_and_xmlschema", "cursor_to_xml",
+}
+
+# Whole function families: advisory locks (session-level ones outlive the rollback and
+# stay on the pooled connection), large objects and connections to other servers
+FORBIDDEN_FUNCTION_PREFIXES = ("pg_advisory_", "pg_try_advisory_", "lo_", "dblink")
+
+Token = Tuple[str, str]
+
+def tokenize(sql: str) -> List[Token]:
+    """(kind, text) tokens; comments become a single space so they can't glue words together."""
+    tokens = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind == "comment":
+            tokens.append(("space", " "))
+        elif kind in ("string", "dollar"):
+            tokens.append(("string", match.group()))
+        else:
+            tokens.append((kind, match.group()))
+    return tokens
+
+def _significant(tokens: List[Token]) -> List[Token]:
+    return [token for token in tokens if token[0] != "space"]
+
+def _render(tokens: List[Token]) -> str:
+    return "".join(text for _, text in tokens).strip()
+
+def _is_forbidden_function(name: str, significant: List[Token], position: int) -> bool:
+    """Whether the name at position is called and is a forbidden function."""
+    following = significant[position + 1] if position + 1 < len(significant) else None
+    if following != ("other", "("):
+        return False
+    return name in FORBIDDEN_FUNCTIONS or name.startswith(FORBIDDEN_FUNCTION_PREFIXES)
+
+def check_read_only(sql: str) -> str:
+    """
+    The statement without comments and the trailing semicolon.
+    Raises QueryRejected unless it is a single SELECT (or WITH ... SELECT)
+    without writes, locking clauses, SELECT INTO or side-effecting functions.
+    """
+    tokens = tokenize(sql)
+    significant = _significant(tokens)
+    while significant and significant[-1] == ("other", ";"):
+        significant.pop()
+        while tokens[-1] != ("other", ";"):
+            tokens.pop()
+        tokens.pop()
+
+    if not significant:
+        raise QueryRejected("Empty query", "invalid")
+    if ("other", ";") in significant:
+        raise QueryRejected("Only a single statement is allowed", "not_read_only")
+
+    # "(SELECT ...) UNION (SELECT ...)" starts with a parenthesis
+    first = next((text.lower() for _, text in significant if text != "("), "")
+    if first not in ("select", "with"):
+        raise QueryRejected("Only SELECT queries are allowed", "not_read_only")
+
+    depth = 0
+    for position, (kind, text) in enumerate(significant):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        if kind == "ident":
+            # "pg_advisory_lock"(1) calls the function too; quoting keeps the case as written
+            word = text[1:-1].replace('""', '"')
+            if _is_forbidden_function(word, significant, position):
+                raise QueryRejected(f"Function {word} is not allowed", "not_read_only")
+            continue
+        if kind != "word":
+            continue
+        word = text.lower()
+        if word in FORBIDDEN_KEYWORDS:
+            raise QueryRejected(f"{word.upper()} is not allowed", "not_read_only")
+        if word == "into" and depth == 0:
+            raise QueryRejected("SELECT INTO is not allowed", "not_read_only")
+        if _is_forbidden_function(word, significant, position):
+            raise QueryRejected(f"Function {word} is not allowed", "not_read_only")
+    return _render(tokens)
+
+def query_shape(sql: str) -> str:
+    """Statement with literals and numbers replaced by ?, lower-cased keywords and single spaces."""
+    parts = []
+    for kind, text in _significant(tokenize(sql)):
+        if kind in ("string", "number"):
+            parts.append("?")
+        elif kind == "word":
+            parts.append(text.lower())
+        else:
+            parts.append(text)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+def limit_query(sql: str, limit: int) -> Tuple[str, bool]:
+    """
+    Make sure a checked SELECT returns at most limit rows.
+    A top-level LIMIT is clamped in place, a missing one appended; statements whose
+    LIMIT is an expression or that end in OFFSET/FETCH are wrapped in a subquery.
+    Returns the statement and whether it was changed.
+    """
+    tokens = tokenize(sql)
+    depth = 0
+    limit_at = None
+    tail_clause = False
+    for position, (kind, text) in enumerate(tokens):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif kind == "word" and depth == 0:
+            word = text.lower()
+            if word == "limit":
+                limit_at = position
+            elif word in ("offset", "fetch"):
+                tail_clause = True
+
+    if limit_at is not None:
+        value_at = next(
+            (i for i in range(limit_at + 1, len(tokens)) if tokens[i][0] != "space"),
+            None
+        )
+        if value_at is not None:
+            kind, text = tokens[value_at]
+            if kind == "number" and text.isdigit():
+                if int(text) <= limit:
+                    return _render(tokens), False
+                tokens[value_at] = ("number", str(limit))
+                return _render(tokens), True
+            if kind == "word" and text.lower() == "all":
+                tokens[value_at] = ("number", str(limit))
+                return _render(tokens), True
+    elif not tail_clause:
+        return f"{_render(tokens)} LIMIT {limit}", True
+    return f"SELECT * FROM ({_render(tokens)}) AS pulse_limited LIMIT {limit}", True
@@ -0,0 +1,130 @@
+"""Unit tests for the HTTP API, served in-process with a fake bot."""
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.api.app import create_app
+from src.bot.telegram_bot import Answer
+from src.core.config import config
+
+TOKEN = "s3cret"
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+
+class FakeGenes:
+    """GeneRepository stand-in that records every find() chunk."""
+
+    rows = {
+        "TP53": ("9606.P0", "TP53", "tumor suppressor", "TF", 300),
+        "EGFR": ("9606.P2", "EGFR", "growth factor receptor", "Kinase", 250),
+    }
+
+    def __init__(self):
+        self.lookups = []
+
+    def find(self, display_names=()):
+        self.lookups.append(list(display_names))
+        return [self.rows[name] for name in display_names if name in self.rows]
+
+class FakeSearcher:
+    def __init__(self):
+        self.calls = []
+
+    def search(self, query, **filters):
+        self.calls.append((query, filters))
+        return [{"display_name": "EGFR", "score": 0.5}]
+
+class FakeBot:
+    """PulseBot stand-in with the methods the API calls."""
+
+    def __init__(self):
+        self.genes = FakeGenes()
+        self.searcher = FakeSearcher()
+        self.states = {"database": "ready", "vector_index": "pending"}
+
+    def answer(self, question, on_progress=None):
+        if question == "boom":
+            raise RuntimeError("LLM unavailable")
+        return Answer(text=f"Ответ: {question}", path="template")
+
+    def readiness(self):
+        return dict(self.states)
+
+@pytest.fixture
+def api(monkeypatch):
+    """Run requests against the app: api(method, path, **kwargs) -> (status, json)."""
+    monkeypatch.setattr(config, "API_TOKEN", TOKEN)
+    bot = FakeBot()
+
+    def request(method, path, app_bot=bot, **kwargs):
+        async def call():
+            async with TestClient(TestServer(create_app(app_bot))) as client:
+                response = await client.request(method, path, **kwargs)
+                return response.status, await response.json()
+        return asyncio.run(call())
+
+    request.bot = bot
+    return request
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Bearer wrong"}, {"Authorization": TOKEN}])
+def test_protected_endpoints_require_the_token(api, headers):
+    status, body = api("POST", "/query", json={"question": "Что такое TP53?"}, headers=headers)
+    assert status == 401
+    assert body == {"error": "Missing or invalid bearer token"}
+
+def test_health_is_open_and_reports_warm_up(api):
+    assert api("GET", "/health") == (200, {
+        "status": "warming",
+        "components": {"database": "ready", "vector_index": "pending"},
+    })
+
+def test_without_api_token_only_health_and_metrics_are_served(api, monkeypatch):
+    monkeypatch.setattr(config, "API_TOKEN", "")
+    assert api("GET", "/health")[0] == 200
+    assert api("POST", "/query", json={"question": "TP53"}, headers={"Authorization": "Bearer "})[0] == 401
+    paths = {resource.canonical for resource in create_app(FakeBot()).router.resources()}
+    assert paths == {"/metrics", "/health"}
+
+def test_query_returns_the_bot_answer(api):
+    status, body = api("POST", "/query", json={"question": "Что такое TP53?"}, headers=AUTH)
+    assert status == 200
+    assert body == {"question": "Что такое TP53?", "answer": "Ответ: Что такое TP53?",
+                    "path": "template", "sql": None, "ok": True}
+
+@pytest.mark.parametrize("path, payload, error", [
+    ("/query", {}, "'question' is required"),
+    ("/query", ["question"], "Request body must be a JSON object"),
+    ("/search", {"query": "EGFR", "top_k": 0}, "'top_k' must be between 1 and 100"),
+    ("/search", {"query": "EGFR", "min_edge_score": True}, "'min_edge_score' must be a number between 0 and 1"),
+    ("/search", {"query": "EGFR", "family": ""}, "'family' must be a string of 1 to 100 characters"),
+    ("/genes", {"genes": "TP53"}, "'genes' must be a list of strings"),
+    ("/batch", {}, "'questions' or 'gene_lists' is required"),
+])
+def test_invalid_payloads_are_rejected(api, path, payload, error):
+    assert api("POST", path, json=payload, headers=AUTH) == (400, {"error": error})
+
+def test_search_passes_filters_and_lists_warming_components(api):
+    status, body = api("POST", "/search", json={"query": "рецепторы", "family": "Kinase", "min_degree": 10},
+                       headers=AUTH)
+    assert status == 200
+    assert body["warming"] == ["vector_index"]
+    assert api.bot.searcher.calls == [("рецепторы", {
+        "top_k": 10, "min_degree": 10, "family": "Kinase", "near_gene": None, "max_hops": 2, "min_edge_score": 0.0,
+    })]
+
+def test_genes_are_annotated_in_chunks_case_insensitively(api, monkeypatch):
+    monkeypatch.setattr(config, "API_GENE_CHUNK_SIZE", 2)
+    status, body = api("POST", "/genes", json={"genes": ["tp53", "EGFR", "TP53", "NOPE", " "]}, headers=AUTH)
+    assert status == 200
+    assert [gene["gene"] for gene in body["genes"]] == ["TP53", "EGFR"]
+    assert body["not_found"] == ["NOPE"]
+    assert api.bot.genes.lookups == [["EGFR", "TP53", "tp53"], ["NOPE"]]
+
+def test_batch_item_failures_do_not_fail_the_batch(api):
+    status, body = api("POST", "/batch", json={"questions": ["TP53", "boom"], "gene_lists": [["EGFR"]]},
+                       headers=AUTH)
+    assert status == 200
+    assert body["questions"][0]["answer"] == "Ответ: TP53"
+    assert body["questions"][1] == {"question": "boom", "error": "LLM unavailable"}
+    assert body["gene_lists"] == [{"genes": [{"gene": "EGFR", "name": "9606.P2", "description": "growth factor receptor",
+                                              "family": "Kinase", "connections": 250}], "not_found": []}]
@@ -0,0 +1,207 @@
+"""Unit tests for the bot's query dispatcher, template answers and warm-up."""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.bot import telegram_bot
+from src.bot.handlers.query_handlers import QueryDispatcher
+from src.bot.telegram_bot import PulseBot
+from src.core.config import config
+from src.database.repositories.edge_repository import InteractionGraph
+
+TIMEOUT = 5
+
+def _wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+@pytest.fixture
+def dispatchers():
+    created = []
+    yield created
+    for dispatcher in created:
+        dispatcher.shutdown()
+
+def test_messages_of_one_chat_run_in_order(dispatchers):
+    handled = []
+    running = []
+    overlapped = []
+
+    def handler(message):
+        running.append(message)
+        if len(running) > 1:
+            overlapped.append(message)
+        time.sleep(0.005)
+        handled.append(message)
+        running.remove(message)
+
+    dispatcher = QueryDispatcher(handler, workers=4, max_pending=100)
+    dispatchers.append(dispatcher)
+    for message in range(20):
+        assert dispatcher.submit(1, message)
+    _wait_until(lambda: dispatcher.pending == 0)
+    assert handled == list(range(20))
+    assert not overlapped
+
+def test_chats_are_processed_in_parallel(dispatchers):
+    release = threading.Event()
+    started = []
+
+    def handler(message):
+        started.append(message)
+        if message == "blocked":
+            release.wait(TIMEOUT)
+
+    dispatcher = QueryDispatcher(handler, workers=2, max_pending=10)
+    dispatchers.append(dispatcher)
+    dispatcher.submit(1, "blocked")
+    dispatcher.submit(1, "queued behind")
+    dispatcher.submit(2, "other chat")
+    _wait_until(lambda: "other chat" in started)
+    assert "queued behind" not in started
+    release.set()
+    _wait_until(lambda: dispatcher.pending == 0)
+    assert started.index("queued behind") > started.index("blocked")
+
+def test_rejects_when_saturated(dispatchers):
+    release = threading.Event()
+    dispatcher = QueryDispatcher(lambda message: release.wait(TIMEOUT), workers=1, max_pending=2)
+    dispatchers.append(dispatcher)
+    assert dispatcher.submit(1, "a")
+    assert dispatcher.submit(2, "b")
+    assert not dispatcher.submit(3, "c")
+    assert dispatcher.pending == 2
+    release.set()
+    _wait_until(lambda: dispatcher.pending == 0)
+    assert dispatcher.submit(3, "c")
+
+def test_handler_errors_do_not_stall_the_chat(dispatchers):
+    handled = []
+
+    def handler(message):
+        if message == "boom":
+            raise RuntimeError("handler failed")
+        handled.append(message)
+
+    dispatcher = QueryDispatcher(handler, workers=1, max_pending=10)
+    dispatchers.append(dispatcher)
+    for message in ("before", "boom", "after"):
+        dispatcher.submit(1, message)
+    _wait_until(lambda: dispatcher.pending == 0)
+    assert handled == ["before", "after"]
+
+class FakeGenes:
+    """GeneRepository stand-in returning fixed rows for every template."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def run_template(self, intent, sql, params=None):
+        self.calls.append((intent, params))
+        return self.rows
+
+@pytest.fixture
+def bot():
+    bot = PulseBot("123:test", warm_up=False)
+    yield bot
+    bot.dispatcher.shutdown()
+
+@pytest.mark.parametrize("question", [
+    "Найди гены из семейства киназ.",
+    "Сколько связей у гена EGFR?",
+    "Назови топ-5 генов с наибольшим количеством связей.",
+])
+def test_empty_template_result_falls_back_to_llm(bot, question):
+    bot.genes = FakeGenes([])
+    assert bot._answer_from_template(question) is None
+    assert len(bot.genes.calls) == 1
+
+def test_template_answer_is_used_when_rows_found(bot):
+    bot.genes = FakeGenes([("EGFR", 312)])
+    assert bot._answer_from_template("Сколько связей у гена EGFR?") == "Ген EGFR имеет 312 связей в сети."
+
+def _graph():
+    labels = {"9606.A": "TP53", "9606.B": "MDM2", "9606.C": "EGFR", "9606.D": "INS"}
+    edges = [("9606.A", "9606.B", 0.99), ("9606.B", "9606.C", 0.95), ("9606.C", "9606.D", 0.4)]
+    return InteractionGraph.from_edges(edges, labels)
+
+def test_graph_questions_wait_for_the_graph(bot):
+    bot.genes = FakeGenes([])
+    assert bot._answer_from_template("Какие гены в пределах 2 шагов от TP53 со score > 0.9?") is None
+    assert not bot.genes.calls
+
+@pytest.mark.parametrize("question, answer", [
+    ("Какие гены в пределах 2 шагов от TP53 со score > 0.9?",
+     "Гены в пределах 2 шагов от TP53 со score ≥ 0.9 (2):\n1 шаг: MDM2\n2 шага: EGFR"),
+    ("Как связаны TP53 и INS?", "Кратчайший путь от TP53 до INS (3 шага): TP53 → MDM2 → EGFR → INS"),
+    ("Сколько связей у гена EGFR со score > 0.9?", "Ген EGFR имеет 1 связей со score ≥ 0.9 в сети."),
+    ("С какими генами взаимодействует EGFR?",
+     "Партнёры гена EGFR по взаимодействию (2):\n1. MDM2 — score 0.95\n2. INS — score 0.40"),
+    ("Назови топ-2 генов с наибольшим количеством связей со score > 0.9",
+     "Топ-2 генов по количеству связей со score ≥ 0.9:\n1. MDM2 — 2\n2. EGFR — 1"),
+])
+def test_graph_questions_are_answered_from_the_graph(bot, question, answer):
+    bot.searcher.graph = _graph()
+    assert bot._answer_from_template(question) == answer
+
+def test_graph_question_about_unknown_gene_falls_back_to_llm(bot):
+    bot.searcher.graph = _graph()
+    assert bot._answer_from_template("С какими генами взаимодействует BRCA1?") is None
+
+def test_warm_up_reports_each_component_and_survives_failures(bot, monkeypatch):
+    release = threading.Event()
+    states = []
+
+    def blocked():
+        states.append(bot.readiness())
+        release.wait(TIMEOUT)
+        return True
+
+    def broken():
+        raise RuntimeError("no database")
+
+    steps = {"database": broken, "gene_extractor": lambda: False, "encoder": blocked}
+    monkeypatch.setattr(bot, "_warm_up_steps", lambda: steps)
+    bot._readiness = {name: "pending" for name in steps}
+    warm_up = threading.Thread(target=bot.warm_up)
+    warm_up.start()
+    _wait_until(lambda: states)
+    assert states[0] == {"database": "failed", "gene_extractor": "unavailable", "encoder": "pending"}
+
+    # Template questions are answered while the slow step is still loading
+    bot.genes = FakeGenes([("EGFR", 312)])
+    assert bot._answer_from_template("Сколько связей у гена EGFR?") == "Ген EGFR имеет 312 связей в сети."
+
+    release.set()
+    warm_up.join(TIMEOUT)
+    assert bot.readiness()["encoder"] == "ready"
+
+class SlowModel:
+    """EmbeddingModel stand-in whose load() waits for the test."""
+    loading = threading.Event()
+    release = threading.Event()
+    identity = "slow-model"
+
+    def load(self):
+        SlowModel.loading.set()
+        SlowModel.release.wait(TIMEOUT)
+
+    def encode(self, texts):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+def test_encoder_is_published_only_after_the_model_loaded(bot, monkeypatch):
+    monkeypatch.setattr(telegram_bot, "EmbeddingModel", SlowModel)
+    monkeypatch.setattr(config, "EMBEDDINGS_TEXT_CACHE_MAX_MB", 0)
+    warm = threading.Thread(target=bot._warm_encoder)
+    warm.start()
+    assert SlowModel.loading.wait(TIMEOUT)
+    assert bot.encoder is None and bot.searcher.encoder is None
+    SlowModel.release.set()
+    warm.join(TIMEOUT)
+    assert bot.encoder is not None
+    assert bot.searcher.encoder is bot.encoder
@@ -0,0 +1,19 @@
+"""Unit tests for configuration loading."""
+from src.core.config import Config
+
+def test_load_applies_env_file_without_overriding_the_environment(tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("BOT_WORKERS=7\nDEBUG=true\nRRF_K=10\nLLM_CACHE_TTL=1.5\nLOG_FILE=/tmp/pulse.log\n", encoding="utf-8")
+    for name in ("BOT_WORKERS", "DEBUG", "RRF_K", "LLM_CACHE_TTL", "LOG_FILE"):
+        monkeypatch.setattr(Config, name, getattr(Config, name))
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("RRF_K", "60")
+
+    Config.load(str(env_file))
+
+    assert Config.BOT_WORKERS == 7
+    assert Config.DEBUG is True
+    assert Config.LLM_CACHE_TTL == 1.5
+    assert str(Config.LOG_FILE) == "/tmp/pulse.log"
+    # A variable set in the process environment wins over the file
+    assert Config.RRF_K == 60
@@ -0,0 +1,374 @@
+"""Unit tests for the database layer pieces that run without a PostgreSQL server."""
+import psycopg2
+import psycopg2.pool
+import pytest
+
+from src.core.config import config
+from src.core.exceptions import QueryRejected
+from src.database.connection import DatabaseConnection
+from src.database.query_guard import QueryGuard, plan_estimates
+from src.database.repositories.edge_repository import InteractionGraph, parse_edge_name
+from src.database.result_cache import ResultCache
+from src.utils.validators import check_read_only, limit_query, query_shape
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM N;", "SELECT * FROM N"),
+    ("  select display_name from N ;; ", "select display_name from N"),
+    ("-- top genes\nSELECT display_name FROM N", "SELECT display_name FROM N"),
+    ("/* note */ WITH t AS (SELECT 1) SELECT * FROM t", "WITH t AS (SELECT 1) SELECT * FROM t"),
+    ("(SELECT 1) UNION (SELECT 2)", "(SELECT 1) UNION (SELECT 2)"),
+    ("SELECT 'DROP TABLE N; update' AS text", "SELECT 'DROP TABLE N; update' AS text"),
+    ('SELECT "delete" FROM N', 'SELECT "delete" FROM N'),
+    ("SELECT lower(display_name), log(2, degree_layout) FROM N", "SELECT lower(display_name), log(2, degree_layout) FROM N"),
+    ('SELECT "lo_create" FROM N', 'SELECT "lo_create" FROM N'),
+])
+def test_check_read_only_accepts_selects(sql, expected):
+    assert check_read_only(sql) == expected
+
+@pytest.mark.parametrize("sql, reason", [
+    ("", "invalid"),
+    ("  ; ", "invalid"),
+    ("DELETE FROM N", "not_read_only"),
+    ("SELECT 1; DROP TABLE N", "not_read_only"),
+    ("WITH gone AS (DELETE FROM N RETURNING *) SELECT * FROM gone", "not_read_only"),
+    ("SELECT * INTO copy FROM N", "not_read_only"),
+    ("SELECT * FROM N FOR UPDATE", "not_read_only"),
+    ("SELECT pg_sleep(10)", "not_read_only"),
+    ("SELECT 1 /* ; */ -- \n; DROP TABLE N", "not_read_only"),
+    ("EXPLAIN ANALYZE SELECT 1", "not_read_only"),
+    ("SELECT pg_try_advisory_lock(42)", "not_read_only"),
+    ("SELECT pg_advisory_lock_shared(42)", "not_read_only"),
+    ("SELECT pg_catalog.pg_advisory_lock(42)", "not_read_only"),
+    ('SELECT "pg_advisory_lock"(42)', "not_read_only"),
+    ("SELECT pg_notify('pulse_data_generation', '0')", "not_read_only"),
+    ("SELECT lo_create(0)", "not_read_only"),
+    ("SELECT lo_unlink(16401)", "not_read_only"),
+    ("SELECT lo_put(16401, 0, '\\x00')", "not_read_only"),
+    ("SELECT lo_from_bytea(0, 'x')", "not_read_only"),
+    ("SELECT dblink_connect('host=evil')", "not_read_only"),
+])
+def test_check_read_only_rejects(sql, reason):
+    with pytest.raises(QueryRejected) as error:
+        check_read_only(sql)
+    assert error.value.reason == reason
+
+def test_query_shape_strips_literals():
+    assert query_shape("SELECT * FROM N WHERE display_name = 'TP53' LIMIT 5;") == \
+        query_shape("select *   from N where display_name = 'EGFR' limit 10")
+
+@pytest.mark.parametrize("sql, limit, expected, changed", [
+    ("SELECT * FROM N", 100, "SELECT * FROM N LIMIT 100", True),
+    ("SELECT * FROM N LIMIT 5", 100, "SELECT * FROM N LIMIT 5", False),
+    ("SELECT * FROM N LIMIT 5000", 100, "SELECT * FROM N LIMIT 100", True),
+    ("SELECT * FROM N LIMIT ALL", 100, "SELECT * FROM N LIMIT 100", True),
+    # Only the top-level LIMIT counts
+    (
+        "SELECT * FROM (SELECT * FROM N LIMIT 5000) t",
+        100,
+        "SELECT * FROM (SELECT * FROM N LIMIT 5000) t LIMIT 100",
+        True,
+    ),
+    (
+        "WITH t AS (SELECT * FROM N LIMIT 10) SELECT * FROM t LIMIT 500",
+        100,
+        "WITH t AS (SELECT * FROM N LIMIT 10) SELECT * FROM t LIMIT 100",
+        True,
+    ),
+    # "limit" inside a literal or comment is not a clause
+    ("SELECT 'limit 1' AS text", 100, "SELECT 'limit 1' AS text LIMIT 100", True),
+    (
+        "SELECT * FROM N OFFSET 10",
+        100,
+        "SELECT * FROM (SELECT * FROM N OFFSET 10) AS pulse_limited LIMIT 100",
+        True,
+    ),
+    (
+        "SELECT * FROM N LIMIT %(n)s",
+        100,
+        "SELECT * FROM (SELECT * FROM N LIMIT %(n)s) AS pulse_limited LIMIT 100",
+        True,
+    ),
+])
+def test_limit_query(sql, limit, expected, changed):
+    assert limit_query(sql, limit) == (expected, changed)
+
+def test_limit_query_keeps_comment_free_statement():
+    statement = check_read_only("SELECT * FROM N -- LIMIT 1\n")
+    assert limit_query(statement, 10) == ("SELECT * FROM N LIMIT 10", True)
+
+def test_plan_estimates_takes_largest_node():
+    plan = {"Total Cost": 42.5, "Plan Rows": 10, "Plans": [{"Plan Rows": 5000, "Plans": [{"Plan Rows": 7}]}]}
+    assert plan_estimates(plan) == (42.5, 5000)
+
+class FakeDatabase:
+    """Answers EXPLAIN with a fixed plan, or raises the configured error."""
+
+    def __init__(self, plan=None, error=None):
+        self.plan = plan or {"Total Cost": 10.0, "Plan Rows": 10}
+        self.error = error
+        self.explained = []
+
+    def data_generation(self):
+        return 1
+
+    def explain(self, query, timeout_ms=None):
+        self.explained.append(query)
+        if self.error is not None:
+            raise self.error
+        return self.plan
+
+def _guard(db, **limits):
+    limits.setdefault("max_cost", 1000)
+    limits.setdefault("max_plan_rows", 100000)
+    limits.setdefault("max_rows", 100)
+    limits.setdefault("rewrite_limit", 10)
+    return QueryGuard(db, cache_size=16, **limits)
+
+def test_guard_caches_verdicts_per_shape():
+    db = FakeDatabase()
+    guard = _guard(db)
+    first = guard.check("SELECT * FROM N WHERE display_name = 'TP53'")
+    second = guard.check("SELECT * FROM N WHERE display_name = 'EGFR'")
+    assert first.sql.endswith("LIMIT 101") and first.max_rows == 100
+    assert not first.cached and second.cached
+    assert len(db.explained) == 1
+
+def test_guard_rejects_runaway_plans():
+    guard = _guard(FakeDatabase({"Total Cost": 10.0, "Plan Rows": 10 ** 9}))
+    with pytest.raises(QueryRejected) as error:
+        guard.check("SELECT * FROM E a, E b")
+    assert error.value.reason == "too_many_rows"
+
+def test_guard_rejects_invalid_shapes_once():
+    db = FakeDatabase(error=psycopg2.ProgrammingError("column does not exist"))
+    guard = _guard(db)
+    for _ in range(2):
+        with pytest.raises(QueryRejected):
+            guard.check("SELECT missing FROM N")
+    assert len(db.explained) == 1
+
+def test_guard_does_not_cache_bad_literals():
+    db = FakeDatabase(error=psycopg2.DataError("invalid input syntax for type integer"))
+    guard = _guard(db)
+    with pytest.raises(QueryRejected):
+        guard.check("SELECT * FROM N WHERE degree_layout = 'many'::int")
+    db.error = None
+    guarded = guard.check("SELECT * FROM N WHERE degree_layout = '5'::int")
+    assert guarded.verdict.allowed and not guarded.cached
+
+class Generation:
+    """Settable data generation; None makes reading it fail like a missing pulse_meta."""
+
+    def __init__(self, value=1):
+        self.value = value
+
+    def __call__(self):
+        if self.value is None:
+            raise psycopg2.errors.UndefinedTable('relation "pulse_meta" does not exist')
+        return self.value
+
+def test_result_cache_invalidates_on_new_generation():
+    generation = Generation()
+    cache = ResultCache(1024 * 1024, generation=generation)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return [("TP53", len(loads))]
+
+    assert cache.get_or_load("SELECT 1", None, load) == [("TP53", 1)]
+    assert cache.get_or_load("SELECT  1;", None, load) == [("TP53", 1)]
+    generation.value = 2
+    assert cache.get_or_load("SELECT 1", None, load) == [("TP53", 2)]
+    assert cache.stats()["invalidations"] == 1
+
+def test_result_cache_is_bypassed_without_generation():
+    generation = Generation(None)
+    cache = ResultCache(1024 * 1024, generation=generation)
+    assert cache.get_or_load("SELECT 1", None, lambda: [1]) == [1]
+    assert cache.get_or_load("SELECT 1", None, lambda: [2]) == [2]
+    assert cache.stats()["bypassed"] == 2
+    generation.value = 1
+    assert cache.get_or_load("SELECT 1", None, lambda: [3]) == [3]
+    assert cache.get_or_load("SELECT 1", None, lambda: [4]) == [3]
+
+def test_guard_works_without_generation():
+    db = FakeDatabase()
+    db.data_generation = Generation(None)
+    guard = _guard(db)
+    for _ in range(2):
+        assert not guard.check("SELECT * FROM N").cached
+    assert len(db.explained) == 2
+
+def _graph():
+    """A - B - C - D chain with a weak A - D shortcut and an isolated E - F pair."""
+    edges = [
+        ("a", "b", 0.9),
+        ("b", "c", 0.8),
+        ("c", "d", 0.7),
+        ("a", "d", 0.2),
+        ("b", "a", 0.5),
+        ("e", "f", 0.95),
+    ]
+    labels = {name: name.upper() for name in "abcdef"}
+    return InteractionGraph.from_edges(edges, labels)
+
+def test_parse_edge_name():
+    assert parse_edge_name("9606.ENSP1 (pp) 9606.ENSP2") == ("9606.ENSP1", "9606.ENSP2")
+    assert parse_edge_name(" TP53 (interacts with) MDM2 ") == ("TP53", "MDM2")
+    assert parse_edge_name("not an edge") is None
+
+def test_graph_keeps_best_score_of_duplicate_edges():
+    graph = _graph()
+    assert len(graph) == 6
+    assert graph.edge_count == 5
+    assert graph.neighbors("A") == [("B", pytest.approx(0.9)), ("D", pytest.approx(0.2))]
+    assert graph.neighbors("b") == [("A", pytest.approx(0.9)), ("C", pytest.approx(0.8))]
+    assert graph.neighbors("unknown") == []
+
+def test_graph_degrees_with_score_threshold():
+    graph = _graph()
+    assert graph.degree("A") == 2
+    assert graph.degree("A", min_score=0.5) == 1
+    assert graph.degrees(min_score=0.75) == {"A": 1, "B": 2, "C": 1, "D": 0, "E": 1, "F": 1}
+
+def test_graph_k_hop():
+    graph = _graph()
+    assert graph.k_hop("A", k=1) == {"B": 1, "D": 1}
+    assert graph.k_hop("A", k=2) == {"B": 1, "D": 1, "C": 2}
+    # Without the weak shortcut D is three hops away
+    assert graph.k_hop("A", k=2, min_score=0.5) == {"B": 1, "C": 2}
+    assert graph.k_hop("A", k=3, min_score=0.5) == {"B": 1, "C": 2, "D": 3}
+    assert graph.k_hop("E", k=5) == {"F": 1}
+    assert graph.k_hop("unknown") == {}
+
+def test_graph_shortest_path():
+    graph = _graph()
+    assert graph.shortest_path("A", "C") == ["A", "B", "C"]
+    assert graph.shortest_path("A", "D") == ["A", "D"]
+    assert graph.shortest_path("A", "D", min_score=0.5) == ["A", "B", "C", "D"]
+    assert graph.shortest_path("A", "E") is None
+
+class RecordingCursor:
+    """Cursor that records statements and serves canned rows."""
+
+    def __init__(self, statements, rows):
+        self.statements = statements
+        self.rows = rows
+        self.description = None
+        self.itersize = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchmany(self, size):
+        batch = self.rows[:size]
+        del self.rows[:size]
+        return batch
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows))
+
+class RecordingConnection:
+    closed = 0
+
+    def __init__(self, rows):
+        self.statements = []
+        self.rows = list(rows)
+        self.prepared = set()
+
+    def cursor(self, name=None):
+        return RecordingCursor(self.statements, self.rows)
+
+    def commit(self):
+        self.statements.append("COMMIT")
+
+    def rollback(self):
+        self.statements.append("ROLLBACK")
+
+class RecordingPool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        pass
+
+def _recording_db(*rows):
+    db = DatabaseConnection(min_connections=1, max_connections=1)
+    conn = RecordingConnection(rows)
+    db._pool = RecordingPool(conn)
+    return db, conn
+
+def test_stream_query_runs_in_read_only_transaction():
+    db, conn = _recording_db(("TP53",))
+    result = db.stream_query("SELECT display_name FROM N")
+    assert result.rows == [("TP53",)]
+    assert conn.statements[0] == "SET TRANSACTION READ ONLY"
+    assert conn.statements.index("SELECT display_name FROM N") > 0
+    assert conn.statements[-1] == "ROLLBACK"
+
+def test_explain_runs_in_read_only_transaction():
+    db, conn = _recording_db(([{"Plan": {"Plan Rows": 1}}],))
+    assert db.explain("SELECT 1") == {"Plan Rows": 1}
+    assert conn.statements[0] == "SET TRANSACTION READ ONLY"
+
+def test_stream_query_stops_fetching_at_the_row_cap():
+    db, conn = _recording_db(*[(i,) for i in range(10)])
+    result = db.stream_query("SELECT * FROM E", max_rows=3, batch_size=2)
+    assert result.rows == [(0,), (1,), (2,)]
+    assert result.truncated
+    # One row past the cap is enough to know the result was cut
+    assert len(conn.rows) == 6
+
+def test_stream_query_under_the_cap_is_not_truncated():
+    db, _ = _recording_db((1,), (2,))
+    result = db.stream_query("SELECT * FROM E", max_rows=2, batch_size=5)
+    assert result.rows == [(1,), (2,)]
+    assert not result.truncated
+
+def test_execute_prepared_prepares_once_per_connection():
+    db, conn = _recording_db()
+    sql = "SELECT degree_layout FROM N WHERE display_name = %(gene)s OR name = %(gene)s LIMIT %(limit)s"
+    for _ in range(2):
+        db.execute_prepared("degree", sql, {"gene": "EGFR", "limit": 1})
+    prepares = [statement for statement in conn.statements if statement.startswith("PREPARE")]
+    assert prepares == [
+        "PREPARE pulse_degree AS SELECT degree_layout FROM N WHERE display_name = $1 OR name = $1 LIMIT $2"
+    ]
+    executes = [statement for statement in conn.statements if statement.startswith("EXECUTE")]
+    assert executes == ["EXECUTE pulse_degree (%(gene)s, %(limit)s)"] * 2
+    assert conn.prepared == {"pulse_degree"}
+
+    # A fresh pooled connection has to prepare the statement again
+    conn.prepared.clear()
+    db.execute_prepared("degree", sql, {"gene": "TP53", "limit": 1})
+    assert sum(statement.startswith("PREPARE") for statement in conn.statements) == 2
+
+def test_pool_stats_count_checkouts_and_timeouts(monkeypatch):
+    monkeypatch.setattr(config, "DB_POOL_TIMEOUT", 0.01)
+    db, _ = _recording_db(("TP53",))
+    db.stream_query("SELECT display_name FROM N")
+    with db.connection():
+        assert db.pool_stats()["in_use"] == 1
+        with pytest.raises(psycopg2.pool.PoolError):
+            with db.connection():
+                pass
+    stats = db.pool_stats()
+    assert stats["checkouts"] == 2
+    assert stats["checkout_timeouts"] == 1
+    assert stats["in_use"] == 0
+    assert stats["queries"] == 1
+    assert stats["max_connections"] == 1
+    assert stats["wait_seconds_avg"] == stats["wait_seconds_total"] / 2
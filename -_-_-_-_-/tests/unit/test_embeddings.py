@@ -0,0 +1,341 @@
+"""Unit tests for the on-disk embedding structures; no model is loaded."""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.core.config import config
+from src.embeddings.generator import EmbeddingGenerator, build_gene_text, content_hash
+from src.embeddings.models import EmbeddingModel, MicroBatcher
+from src.embeddings.search import NeighborTable, VectorIndex, refresh_neighbor_table
+from src.embeddings.storage import EmbeddingCache, EmbeddingStorage
+
+def _normalized(matrix):
+    return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+def _random_matrix(genes, dim=16, seed=0):
+    return _normalized(np.random.default_rng(seed).normal(size=(genes, dim)))
+
+def _brute_force(matrix, k):
+    scores = matrix @ matrix.T
+    np.fill_diagonal(scores, -np.inf)
+    return np.sort(scores, axis=1)[:, ::-1][:, :k]
+
+def _index(matrix, names):
+    return VectorIndex(matrix, names, names, [None] * len(names), [None] * len(names))
+
+def test_build_matches_brute_force():
+    matrix = _random_matrix(200)
+    names = [f"g{i}" for i in range(200)]
+    table = NeighborTable.build(matrix, names, k=5, block_size=64)
+    assert table.rows.shape == (200, 5)
+    assert not (table.rows == np.arange(200)[:, None]).any()
+    np.testing.assert_allclose(table.scores, _brute_force(matrix, 5), rtol=1e-5)
+
+@pytest.mark.parametrize("changes", ["changed", "added", "removed", "all"])
+def test_refresh_matches_full_rebuild(changes):
+    matrix = _random_matrix(300)
+    names = [f"g{i}" for i in range(300)]
+    table = NeighborTable.build(matrix, names, k=8, block_size=50)
+
+    new_matrix, new_names = matrix.copy(), list(names)
+    if changes in ("changed", "all"):
+        new_matrix[[3, 150, 299]] = _random_matrix(3, seed=1)
+    if changes in ("added", "all"):
+        new_matrix = np.vstack([new_matrix, _random_matrix(4, seed=2)])
+        new_names += [f"new{i}" for i in range(4)]
+    if changes in ("removed", "all"):
+        keep = [row for row in range(len(new_names)) if row not in (10, 11, 200)]
+        new_matrix, new_names = new_matrix[keep], [new_names[row] for row in keep]
+
+    refreshed, recomputed = table.refresh(new_matrix, new_names, k=8, block_size=50)
+    rebuilt = NeighborTable.build(new_matrix, new_names, k=8, block_size=50)
+    assert 0 < recomputed < len(new_names)
+    assert refreshed.names == new_names
+    assert refreshed.fingerprints == rebuilt.fingerprints
+    np.testing.assert_allclose(refreshed.scores, rebuilt.scores, rtol=1e-5)
+
+def test_refresh_without_changes_recomputes_nothing():
+    matrix = _random_matrix(50)
+    names = [f"g{i}" for i in range(50)]
+    table = NeighborTable.build(matrix, names, k=4)
+    refreshed, recomputed = table.refresh(matrix, names, k=4)
+    assert recomputed == 0
+    np.testing.assert_array_equal(refreshed.rows, table.rows)
+
+def _save_matrix(storage, matrix, names):
+    records = [{"name": name, "display_name": name.upper(), "embedding": vector} for name, vector in zip(names, matrix)]
+    storage.save(records)
+
+def test_load_if_available_accepts_table_of_the_saved_matrix(tmp_path):
+    storage = EmbeddingStorage(tmp_path)
+    names = [f"g{i}" for i in range(40)]
+    _save_matrix(storage, _random_matrix(40), names)
+    assert refresh_neighbor_table(storage) == (40, 40)
+
+    index = VectorIndex.load(storage)
+    table = NeighborTable.load_if_available(index, storage)
+    assert table is not None
+    assert table.matrix_mtime_ns == storage.matrix_mtime_ns()
+    np.testing.assert_allclose(table.scores, _brute_force(np.asarray(index.matrix), min(config.NEIGHBORS_TOP_K, 39)), rtol=1e-5)
+
+def test_load_if_available_ignores_table_of_another_matrix(tmp_path):
+    storage = EmbeddingStorage(tmp_path)
+    names = [f"g{i}" for i in range(40)]
+    _save_matrix(storage, _random_matrix(40), names)
+    refresh_neighbor_table(storage)
+
+    # Same genes, different model: the names match but the matrix file was replaced
+    _save_matrix(storage, _random_matrix(40, seed=7), names)
+    stamp = storage.matrix_mtime_ns() + 1_000_000_000
+    os.utime(storage.matrix_path, ns=(stamp, stamp))
+    index = VectorIndex.load(storage)
+    assert NeighborTable.load_if_available(index, storage) is None
+
+    # The offline refresh brings the table back in line with the new matrix
+    assert refresh_neighbor_table(storage)[0] == 40
+    table = NeighborTable.load_if_available(index, storage)
+    np.testing.assert_allclose(table.scores, _brute_force(np.asarray(index.matrix), min(config.NEIGHBORS_TOP_K, 39)), rtol=1e-5)
+
+def test_load_if_available_without_table(tmp_path):
+    matrix = _random_matrix(10)
+    names = [f"g{i}" for i in range(10)]
+    assert NeighborTable.load_if_available(_index(matrix, names), EmbeddingStorage(tmp_path)) is None
+
+def test_embedding_cache_round_trip(tmp_path):
+    cache = EmbeddingCache("model", tmp_path, max_bytes=1024 * 1024)
+    vectors = _random_matrix(3, dim=8)
+    assert cache.put_many(["TP53", "EGFR", "TP53 "], vectors) == 2
+    found = cache.get_many([" TP53", "BRCA1"])
+    np.testing.assert_array_equal(found[0], vectors[2])
+    assert found[1] is None
+    # Another process sees the appended records
+    assert len(EmbeddingCache("model", tmp_path)) == 2
+    assert cache.stats()["hits"] == 1
+
+def test_embedding_cache_compaction_is_seen_by_other_readers(tmp_path):
+    writer = EmbeddingCache("model", tmp_path, max_bytes=4096)
+    reader = EmbeddingCache("model", tmp_path, max_bytes=4096)
+    for i in range(200):
+        writer.put_many([f"text {i}"], _random_matrix(1, dim=8, seed=i))
+        assert reader.stats()["size"] == len(writer)
+    assert len(reader) < 200
+    assert reader.get_many(["text 199"])[0] is not None
+
+def _rewrite_in_place(source, target):
+    """Copy one cache file over another without changing the target's inode."""
+    with open(target, "r+b") as f:
+        f.write(source.read_bytes())
+        f.truncate()
+
+def test_embedding_cache_reloads_rewritten_file_with_same_inode(tmp_path):
+    reader = EmbeddingCache("model", tmp_path / "a")
+    old = _random_matrix(2, dim=8)
+    reader.put_many(["TP53", "EGFR"], old)
+    assert reader.get_many(["TP53"])[0] is not None
+
+    # Another file (another generation) reuses the inode: the reader must not keep old offsets
+    other = EmbeddingCache("model", tmp_path / "b")
+    new = _random_matrix(2, dim=8, seed=3)
+    other.put_many(["EGFR", "BRCA1"], new)
+    inode = reader.path.stat().st_ino
+    _rewrite_in_place(other.path, reader.path)
+    assert reader.path.stat().st_ino == inode
+
+    found = reader.get_many(["TP53", "EGFR", "BRCA1"])
+    assert found[0] is None
+    np.testing.assert_array_equal(found[1], new[0])
+    np.testing.assert_array_equal(found[2], new[1])
+
+def test_embedding_cache_checks_the_key_of_every_hit(tmp_path):
+    reader = EmbeddingCache("model", tmp_path)
+    vectors = _random_matrix(2, dim=8)
+    reader.put_many(["TP53", "EGFR"], vectors)
+    assert len(reader) == 2
+
+    # Same header and size, records swapped: indexed rows now hold other keys
+    data = bytearray(reader.path.read_bytes())
+    header, record = 16, (len(data) - 16) // 2
+    data[header:] = data[header + record:] + data[header:header + record]
+    with open(reader.path, "r+b") as f:
+        f.write(data)
+
+    found = reader.get_many(["TP53", "EGFR"])
+    np.testing.assert_array_equal(found[0], vectors[0])
+    np.testing.assert_array_equal(found[1], vectors[1])
+
+class PendingCursor:
+    """Named cursor stand-in yielding N rows once."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.itersize = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        pass
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows, []
+        return rows
+
+class PendingConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return PendingCursor(list(self.rows))
+
+def _pending_names(generator, rows):
+    return [name for _, pending in generator.iter_pending(PendingConnection(rows)) for name, _, _ in pending]
+
+def test_switching_the_embedding_backend_re_embeds_genes():
+    torch_generator = EmbeddingGenerator("all-MiniLM-L6-v2", backend="torch", use_cache=False)
+    onnx_generator = EmbeddingGenerator("all-MiniLM-L6-v2", backend="onnx-int8", use_cache=False)
+    text = build_gene_text("TP53", "Transcription Factor", "Tumor suppressor")
+    # Stored hash written by the torch backend; torch hashes keep their pre-backend format
+    stored = content_hash(text, "all-MiniLM-L6-v2")
+    rows = [("9606.P1", "TP53", "Transcription Factor", "Tumor suppressor", stored, False)]
+
+    assert _pending_names(torch_generator, rows) == []
+    assert _pending_names(onnx_generator, rows) == ["9606.P1"]
+
+def _gene_index(matrix):
+    genes = len(matrix)
+    return VectorIndex(
+        matrix,
+        [f"9606.P{i}" for i in range(genes)],
+        [f"G{i}" for i in range(genes)],
+        ["Kinase" if i % 2 else "GPCR" for i in range(genes)],
+        [i if i % 5 else None for i in range(genes)],
+    )
+
+def test_vector_index_search_matches_brute_force():
+    matrix = _random_matrix(120)
+    index = _gene_index(matrix)
+    queries = _random_matrix(3, seed=4) * 7  # queries are normalized by the index
+    for hits, query in zip(index.search(queries, top_k=6), _normalized(queries)):
+        expected = np.sort(matrix @ query)[::-1][:6]
+        np.testing.assert_allclose([score for _, score in hits], expected, rtol=1e-5)
+        assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+def test_vector_index_prefilter_masks():
+    index = _gene_index(_random_matrix(40))
+    hits = index.search_records(_random_matrix(1, seed=5)[0], top_k=50, family="kinase", min_degree=10)
+    assert hits
+    assert all(hit["family"] == "Kinase" and hit["connections"] >= 10 for hit in hits)
+    assert len(hits) == sum(1 for i in range(40) if i % 2 and i % 5 and i >= 10)
+    # Genes without a degree never pass a degree filter
+    assert all(hit["connections"] is not None for hit in index.search_records(_random_matrix(1)[0], max_degree=100))
+    assert index.search(_random_matrix(1)[0], mask=np.zeros(40, dtype=bool)) == [[]]
+    assert index.position("g7") == 7
+
+def test_embedding_storage_round_trip_is_memory_mapped(tmp_path):
+    storage = EmbeddingStorage(tmp_path)
+    records = [
+        {"name": "9606.P1", "display_name": "TP53", "target_family": None, "degree_layout": 12, "embedding": "[3, 4]"},
+        {"name": "9606.P2", "display_name": "EGFR", "target_family": "Kinase", "degree_layout": None, "embedding": [1, 0]},
+        {"name": "9606.P3", "display_name": "INS", "embedding": None},
+    ]
+    assert storage.save(records) == 2
+
+    index = VectorIndex.load(storage)
+    assert isinstance(index.matrix, np.memmap)
+    np.testing.assert_allclose(index.matrix, [[0.6, 0.8], [1.0, 0.0]])
+    assert index.record(1) == {"name": "9606.P2", "display_name": "EGFR", "family": "Kinase", "connections": None}
+    assert VectorIndex.load_if_available(EmbeddingStorage(tmp_path / "missing")) is None
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="onnx-int8"):
+        EmbeddingModel("all-MiniLM-L6-v2", backend="tensorrt")
+    assert EmbeddingModel("all-MiniLM-L6-v2", backend="torch").identity == "all-MiniLM-L6-v2"
+    assert EmbeddingModel("all-MiniLM-L6-v2", backend="ONNX").identity == "all-MiniLM-L6-v2:onnx"
+
+class FakeTokenizer:
+    """Tokenizer stand-in: one token per word, padded to the longest text."""
+
+    def encode_batch(self, texts):
+        width = max(len(text.split()) for text in texts)
+        return [
+            SimpleNamespace(
+                ids=[len(word) for word in text.split()] + [0] * (width - len(text.split())),
+                attention_mask=[1] * len(text.split()) + [0] * (width - len(text.split())),
+            )
+            for text in texts
+        ]
+
+class FakeSession:
+    """ONNX session stand-in whose token embeddings are (id, 1), so padding would skew the mean."""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, outputs, inputs):
+        ids = inputs["input_ids"]
+        self.batches.append(len(ids))
+        return [np.stack([ids, np.ones_like(ids)], axis=-1).astype(np.float32)]
+
+def test_onnx_backend_mean_pools_real_tokens_in_batches():
+    model = EmbeddingModel("all-MiniLM-L6-v2", backend="onnx", batch_size=2)
+    model._session, model._tokenizer, model._input_names = FakeSession(), FakeTokenizer(), {"input_ids"}
+    vectors = model.encode(["abc", "ab abcd", "a"])
+    assert model._session.batches == [2, 1]
+    np.testing.assert_allclose(vectors, _normalized(np.array([[3.0, 1.0], [3.0, 1.0], [1.0, 1.0]])), rtol=1e-6)
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        started.set()
+        release.wait(5)
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+    batcher = MicroBatcher(encode, max_batch_size=64, max_wait_ms=50)
+    try:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            first = pool.submit(batcher.encode, ["a"])
+            assert started.wait(5)
+            # These queue up while the first pass runs and then share the next one
+            rest = [pool.submit(batcher.encode, ["b" * i, "c"]) for i in range(2, 7)]
+            _wait_for(lambda: batcher._requests.qsize() == 5)
+            release.set()
+            np.testing.assert_array_equal(first.result(5), [[1, 1]])
+            for i, future in enumerate(rest, start=2):
+                np.testing.assert_array_equal(future.result(5), [[i, 1], [1, 1]])
+        assert len(calls) == 2 and len(calls[1]) == 10
+        assert (batcher.batches, batcher.requests) == (2, 6)
+    finally:
+        release.set()
+        batcher.close()
+
+def test_micro_batcher_splits_at_max_batch_size_and_propagates_errors():
+    def encode(texts):
+        if "boom" in texts:
+            raise RuntimeError("model failed")
+        return np.zeros((len(texts), 2), dtype=np.float32)
+
+    batcher = MicroBatcher(encode, max_batch_size=2, max_wait_ms=0)
+    try:
+        assert batcher.encode(["a", "b", "c"]).shape == (3, 2)
+        with pytest.raises(RuntimeError, match="model failed"):
+            batcher.encode(["boom"])
+        assert batcher.encode(["d"]).shape == (1, 2)
+    finally:
+        batcher.close()
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
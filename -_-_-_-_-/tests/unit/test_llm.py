@@ -0,0 +1,367 @@
+"""Unit tests for the LLM-side helpers that need neither a model nor a database."""
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.core import constants
+from src.core.config import config
+from src.database.models import QueryResult
+from src.llm import cache as cache_module
+from src.llm.cache import ResponseCache
+from src.llm.client import LLMClient
+from src.llm.pipeline import PipelineOutcome, QueryPipeline
+from src.llm.response_builder import build_template_answer, compact_result, estimate_tokens
+from src.llm.sql_generator import IntentRouter
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+@pytest.mark.parametrize("question, intent, params", [
+    ("Что известно о гене TP53?", "gene_info", {"gene_name": "TP53"}),
+    ("TP53", "gene_info", {"gene_name": "TP53"}),
+    ("К какому семейству белков относится ген INS?", "gene_info", {"gene_name": "INS"}),
+    ("Сколько связей у гена EGFR?", "gene_connections", {"gene_name": "EGFR"}),
+    ("Назови топ-5 генов с наибольшим количеством связей.", "top_connected", {"limit": 5}),
+    ("Покажи 10 генов с наибольшим числом связей", "top_connected", {"limit": 10}),
+    ("Найди гены из семейства киназ.", "by_family", {"family": "Kinase", "limit": constants.TEMPLATE_LIST_LIMIT}),
+    ("Какие гены функционально похожи на SIRT6?", "similar_genes", {"gene_name": "SIRT6", "limit": 5}),
+    ("Топ-3 гена, похожих на BRCA1", "similar_genes", {"gene_name": "BRCA1", "limit": 3}),
+])
+def test_routes_template_questions(router, question, intent, params):
+    route = router.route(question)
+    assert route is not None
+    assert route.intent == intent
+    assert route.params == params
+    assert route.confidence >= config.ROUTER_MIN_CONFIDENCE
+
+@pytest.mark.parametrize("question", [
+    # A second intent: ranking within a family
+    "Топ-5 генов с наибольшим числом связей в семействе киназ",
+    # Graph questions with a second constraint or out-of-range hops
+    "Сколько генов в пределах 2 шагов от TP53?",
+    "Гены в пределах 7 шагов от TP53",
+    "Какие киназы взаимодействуют с TP53?",
+    "Какие гены похожи на TP53 со score > 0.9?",
+    "Гены семейства киназ со score > 0.9",
+    # A count, not a list
+    "Сколько генов в семействе киназ?",
+    "Какое количество генов в семействе ферментов?",
+    # An explicit limit the family template cannot apply
+    "Покажи 10 генов семейства киназ",
+    # Ranking with an extra threshold
+    "Топ-5 генов с наибольшим количеством связей и степенью больше 100",
+    # Similarity with a count or a second constraint
+    "Сколько генов похожи на SIRT6?",
+    "Какие киназы похожи на EGFR?",
+    # Gene plus family
+    "Сколько генов семейства киназ связано с TP53?",
+    # Several genes
+    "Что известно о TP53 и BRCA1?",
+])
+def test_leaves_constrained_questions_to_llm(router, question):
+    route = router.route(question)
+    assert route is None or route.confidence < config.ROUTER_MIN_CONFIDENCE
+
+@pytest.mark.parametrize("question, intent, params", [
+    ("Какие гены находятся в пределах 2 шагов от TP53 со score > 0.9?", "gene_neighborhood",
+     {"gene_name": "TP53", "hops": 2, "min_score": 0.9}),
+    ("Гены в окрестности EGFR", "gene_neighborhood", {"gene_name": "EGFR", "hops": 2, "min_score": 0.0}),
+    ("Как связаны TP53 и MDM2?", "interaction_path", {"source": "TP53", "target": "MDM2", "min_score": 0.0}),
+    ("Сколько связей у гена TP53 со score > 0.9?", "gene_strong_connections", {"gene_name": "TP53", "min_score": 0.9}),
+    ("Сколько связей у гена TP53 с оценкой выше 0,7?", "gene_strong_connections", {"gene_name": "TP53", "min_score": 0.7}),
+    ("С какими генами взаимодействует TP53?", "gene_neighbors",
+     {"gene_name": "TP53", "min_score": 0.0, "limit": constants.TEMPLATE_LIST_LIMIT}),
+    ("Топ-5 партнёров EGFR со score от 0.95", "gene_neighbors", {"gene_name": "EGFR", "min_score": 0.95, "limit": 5}),
+    ("Назови топ-5 генов с наибольшим количеством связей со score > 0.7", "top_strong_connected",
+     {"limit": 5, "min_score": 0.7}),
+])
+def test_routes_graph_questions(router, question, intent, params):
+    route = router.route(question)
+    assert route is not None
+    assert (route.intent, route.params, route.sql) == (intent, params, None)
+    assert route.confidence >= config.ROUTER_MIN_CONFIDENCE
+
+def test_unrecognised_single_gene_question_has_low_confidence(router):
+    route = router.route("Как TP53 участвует в старении?")
+    assert route.intent == "gene_info"
+    assert route.confidence < config.ROUTER_MIN_CONFIDENCE
+
+def test_limit_is_clamped(router):
+    assert router.route("Топ-500 генов с наибольшим количеством связей").params == {"limit": 50}
+
+def test_family_answer_lists_a_limited_number_of_genes():
+    total = 1200
+    rows = [(f"GENE{i:04d}", "Kinase", total) for i in range(constants.TEMPLATE_LIST_LIMIT)]
+    answer = build_template_answer("by_family", {"family": "kinase", "limit": constants.TEMPLATE_LIST_LIMIT}, rows)
+    assert answer.startswith("Гены семейства Kinase (1200): GENE0000, ")
+    assert answer.endswith(f"… и ещё {total - constants.TEMPLATE_LIST_LIMIT}")
+    assert len(answer) < 4096
+
+def test_family_answer_without_truncation():
+    rows = [("INSR", "Kinase", 2), ("EGFR", "Kinase", 2)]
+    assert build_template_answer("by_family", {"family": "Kinase"}, rows) == "Гены семейства Kinase (2): INSR, EGFR"
+
+def test_neighborhood_answer_groups_by_hop_and_truncates():
+    rows = [("MDM2", 1)] + [(f"G{i:03d}", 2) for i in range(100)]
+    answer = build_template_answer("gene_neighborhood", {"gene_name": "TP53", "hops": 2, "min_score": 0.9}, rows)
+    lines = answer.split("\n")
+    assert lines[0] == "Гены в пределах 2 шагов от TP53 со score ≥ 0.9 (101):"
+    assert lines[1] == "1 шаг: MDM2"
+    assert lines[2].startswith("2 шага: G000, ")
+    assert lines[2].endswith(f"… и ещё {101 - constants.TEMPLATE_LIST_LIMIT}")
+
+def test_path_answer():
+    params = {"source": "TP53", "target": "EGFR", "min_score": 0.0}
+    rows = [("TP53",), ("MDM2",), ("EGFR",)]
+    assert build_template_answer("interaction_path", params, rows) == "Кратчайший путь от TP53 до EGFR (2 шага): TP53 → MDM2 → EGFR"
+    assert build_template_answer("interaction_path", params, []) == "Гены TP53 и EGFR не связаны в сети."
+
+def _gene_rows(count, description_words=60):
+    families = ["Kinase", "Enzyme", "GPCR"]
+    return QueryResult(
+        columns=["name", "display_name", "stringdb_description", "target_family", "degree_layout", "embedding"],
+        rows=[
+            (
+                f"9606.ENSP{i:011d}",
+                f"GENE{i}",
+                " ".join(["описание"] * description_words),
+                families[i % 3],
+                i,
+                "[0.1, 0.2]",
+            )
+            for i in range(count)
+        ]
+    )
+
+@pytest.mark.parametrize("rows", [1, 5, 30, 31, 1000, 20000])
+@pytest.mark.parametrize("budget", [100, 400, 1500])
+def test_compact_result_stays_within_budget(rows, budget):
+    text = compact_result("Найди гены из семейства киназ", _gene_rows(rows), token_budget=budget)
+    assert estimate_tokens(text) <= budget
+
+def test_compact_result_summarizes_large_results():
+    text = compact_result("Какие гены самые связанные?", _gene_rows(1000), token_budget=1500)
+    assert text.startswith("Строк: 1000")
+    assert "degree_layout: мин 0, макс 999" in text
+    assert "GENE999 (999)" in text
+    assert "Распределение target_family" in text
+    # Hidden and redundant columns never reach the prompt
+    assert "embedding" not in text
+    assert "9606.ENSP" not in text
+
+def test_compact_result_reports_truncation_and_constants():
+    result = _gene_rows(3)
+    result.rows = [row[:3] + ("Kinase",) + row[4:] for row in result.rows]
+    result.truncated = True
+    text = compact_result("Что известно о киназах?", result)
+    assert "результат обрезан" in text
+    assert "target_family = Kinase во всех строках" in text
+    assert "описание" in text
+
+def test_compact_result_keeps_small_results_verbatim():
+    result = QueryResult(columns=["display_name", "degree_layout"], rows=[("TP53", 120)])
+    assert compact_result("Сколько связей у TP53?", result) == "Строк: 1\ndisplay_name | degree_layout\nTP53 | 120"
+
+class Clock:
+    """Stands in for time.monotonic in the cache module."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+def _same_embedding(texts):
+    # Every question looks identical to the semantic level, so only its guards tell them apart
+    return np.ones((len(texts), 4), dtype=np.float32)
+
+def test_response_cache_exact_hit_ignores_case_and_punctuation(clock):
+    cache = ResponseCache()
+    cache.put("Сколько связей у TP53?", "120")
+    assert cache.get("сколько  связей у tp53") == "120"
+    assert cache.get("Сколько связей у TP53?", context="другой результат") is None
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1 and stats["misses"] == 1
+
+def test_response_cache_expires_entries(clock):
+    cache = ResponseCache(ttl=60)
+    cache.put("TP53", "ответ")
+    clock.now += 60
+    assert cache.get("TP53") == "ответ"
+    clock.now += 1
+    assert cache.get("TP53") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+def test_response_cache_evicts_least_recently_used(clock):
+    cache = ResponseCache(max_entries=2)
+    cache.put("TP53", "1")
+    cache.put("EGFR", "2")
+    assert cache.get("TP53") == "1"
+    cache.put("INS", "3")
+    assert cache.get("EGFR") is None
+    assert cache.get("TP53") == "1"
+    assert cache.get("INS") == "3"
+    assert cache.stats()["evictions"] == 1
+
+def test_response_cache_invalidates_on_new_generation(clock):
+    generation = {"value": 1}
+    cache = ResponseCache(generation=lambda: generation["value"])
+    cache.put("TP53", "старый")
+    assert cache.get("TP53") == "старый"
+    generation["value"] = 2
+    assert cache.get("TP53") is None
+    assert cache.stats()["invalidations"] == 1
+    cache.put("TP53", "новый")
+    assert cache.get("TP53") == "новый"
+
+def test_response_cache_is_bypassed_without_generation(clock):
+    def missing():
+        raise RuntimeError('relation "pulse_meta" does not exist')
+
+    cache = ResponseCache(generation=missing)
+    cache.put("TP53", "ответ")
+    assert cache.get("TP53") is None
+    assert cache.stats()["size"] == 0
+
+def test_response_cache_semantic_hit_requires_same_entities(clock):
+    cache = ResponseCache(encoder=_same_embedding)
+    cache.put("Сколько связей у гена TP53?", "120")
+    assert cache.get("Какое число связей у TP53") == "120"
+    assert cache.stats()["semantic_hits"] == 1
+    assert cache.get("Сколько связей у гена EGFR?") is None
+    assert cache.get("Назови топ-5 генов TP53") is None
+    assert cache.get("Какое число связей у TP53", context="другой результат") is None
+
+def test_response_cache_semantic_hit_respects_threshold(clock):
+    vectors = {"связи tp53": [1.0, 0.0], "партнеры tp53": [0.6, 0.8]}
+    cache = ResponseCache(encoder=lambda texts: np.array([vectors[t] for t in texts]), similarity_threshold=0.9)
+    cache.put("Связи TP53", "120")
+    assert cache.get("Партнеры TP53") is None
+    cache.similarity_threshold = 0.5
+    assert cache.get("Партнеры TP53") == "120"
+
+def _bad_request(message):
+    from openai import BadRequestError
+
+    # Only the attributes the exception reads from a response
+    response = SimpleNamespace(status_code=400, headers={}, request=None)
+    return BadRequestError(message, response=response, body={"error": {"message": message}})
+
+class FakeCompletions:
+    """chat.completions stand-in that fails requests carrying stream_options."""
+
+    def __init__(self, error):
+        self.error = error
+        self.requests = []
+
+    def create(self, **request):
+        self.requests.append(request)
+        if "stream_options" in request:
+            raise self.error
+        return EmptyStream()
+
+class EmptyStream:
+    def __iter__(self):
+        return iter(())
+
+    def close(self):
+        pass
+
+def _client_with(error):
+    client = LLMClient(max_concurrency=1)
+    completions = FakeCompletions(error)
+    client._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    client._stream_usage = True
+    return client, completions
+
+def test_stream_options_rejection_falls_back_once():
+    client, completions = _client_with(_bad_request("Unrecognized request argument supplied: stream_options"))
+    assert list(client.generate_stream("prompt")) == []
+    assert list(client.generate_stream("prompt")) == []
+    assert ["stream_options" in request for request in completions.requests] == [True, False, False]
+
+def test_other_bad_requests_keep_stream_options():
+    client, completions = _client_with(_bad_request("This model's maximum context length is 4096 tokens"))
+    with pytest.raises(Exception, match="maximum context length"):
+        list(client.generate_stream("prompt"))
+    assert len(completions.requests) == 1
+    assert client._stream_usage
+
+def _pipeline(fast_path, generate_sql, retrieve, grace_ms=5000):
+    return QueryPipeline(fast_path, generate_sql, retrieve, max_workers=2, grace_ms=grace_ms)
+
+def test_pipeline_fast_path_answer_keeps_the_llm_from_starting():
+    started = []
+
+    def generate_sql(question, cancel):
+        started.append("generate_sql")
+        return "SELECT 1"
+
+    def retrieve(question, cancel):
+        started.append("retrieve")
+        return "context"
+
+    pipeline = _pipeline(lambda question: "Ген EGFR имеет 312 связей в сети.", generate_sql, retrieve)
+    outcome = pipeline.run("Сколько связей у гена EGFR?")
+    # Let the cancelled legs run out before checking that they did nothing
+    pipeline._executor.shutdown(wait=True)
+    assert outcome.template_answer == "Ген EGFR имеет 312 связей в сети."
+    assert outcome.sql is None and outcome.context() == ""
+    assert started == []
+
+def test_pipeline_overlaps_legs_and_merges_context():
+    retrieving = threading.Event()
+    cancels = []
+
+    def fast_path(question):
+        # Only returns once retrieval runs alongside it, after the grace period
+        assert retrieving.wait(5)
+        return None
+
+    def generate_sql(question, cancel):
+        cancels.append(cancel)
+        return "SELECT display_name FROM N"
+
+    def retrieve(question, cancel):
+        retrieving.set()
+        return "TP53 — tumor suppressor"
+
+    pipeline = _pipeline(fast_path, generate_sql, retrieve, grace_ms=0)
+    try:
+        outcome = pipeline.run("Какие гены связаны с апоптозом?")
+        assert outcome.template_answer is None
+        assert outcome.sql == "SELECT display_name FROM N"
+        assert outcome.context() == "TP53 — tumor suppressor"
+        assert not cancels[0].is_set()
+    finally:
+        pipeline.close()
+
+def test_pipeline_treats_a_failing_fast_path_as_no_answer():
+    def fast_path(question):
+        raise RuntimeError("database unavailable")
+
+    pipeline = _pipeline(fast_path, lambda question, cancel: "SELECT 1", lambda question, cancel: "")
+    try:
+        assert pipeline.run("TP53").sql == "SELECT 1"
+    finally:
+        pipeline.close()
+
+def test_pipeline_context_degrades_to_empty():
+    pending = PipelineOutcome(context_future=Future())
+    assert pending.context(timeout=0.01) == ""
+
+    failed = Future()
+    failed.set_exception(RuntimeError("search failed"))
+    assert PipelineOutcome(context_future=failed).context() == ""
+    assert PipelineOutcome().context() == ""
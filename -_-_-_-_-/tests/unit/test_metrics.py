@@ -0,0 +1,103 @@
+"""Unit tests for pipeline metrics, spans and structured logging."""
+import asyncio
+import json
+import logging
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.api.app import PROMETHEUS_CONTENT_TYPE, create_app
+from src.utils import metrics
+from src.utils.logger import JsonFormatter
+from src.utils.metrics import MetricsRegistry
+
+def test_render_counters_and_cumulative_histograms():
+    registry = MetricsRegistry()
+    registry.counter("pulse_empty_total", "Declared but never incremented")
+    registry.histogram("pulse_seconds", "Durations", buckets=(0.5, 0.1))
+    registry.inc("pulse_hits_total", cache="result")
+    registry.inc("pulse_hits_total", 2, cache="result")
+    registry.inc("pulse_hits_total", cache='say "hi"\n')
+    for value in (0.05, 0.3, 2.0):
+        registry.observe("pulse_seconds", value, stage="llm")
+
+    assert registry.render().splitlines() == [
+        "# HELP pulse_empty_total Declared but never incremented",
+        "# TYPE pulse_empty_total counter",
+        "# HELP pulse_hits_total pulse_hits_total",
+        "# TYPE pulse_hits_total counter",
+        'pulse_hits_total{cache="result"} 3',
+        'pulse_hits_total{cache="say \\"hi\\"\\n"} 1',
+        "# HELP pulse_seconds Durations",
+        "# TYPE pulse_seconds histogram",
+        'pulse_seconds_bucket{stage="llm",le="0.1"} 1',
+        'pulse_seconds_bucket{stage="llm",le="0.5"} 2',
+        'pulse_seconds_bucket{stage="llm",le="+Inf"} 3',
+        'pulse_seconds_sum{stage="llm"} 2.35',
+        'pulse_seconds_count{stage="llm"} 3',
+    ]
+
+def test_collector_samples_are_grouped_and_failures_skipped():
+    registry = MetricsRegistry()
+
+    def broken():
+        raise RuntimeError("pool closed")
+
+    registry.register_collector(lambda: [("pulse_pool_in_use", "gauge", "Connections in use", {}, 2)])
+    registry.register_collector(broken)
+    registry.register_collector(lambda: [
+        ("pulse_cache_bytes", "gauge", "Cache size", {"cache": "result"}, 10),
+        ("pulse_pool_in_use", "gauge", "Connections in use", {"pool": "api"}, 1),
+    ])
+    assert registry.render().splitlines() == [
+        "# HELP pulse_pool_in_use Connections in use",
+        "# TYPE pulse_pool_in_use gauge",
+        "pulse_pool_in_use 2",
+        'pulse_pool_in_use{pool="api"} 1',
+        "# HELP pulse_cache_bytes Cache size",
+        "# TYPE pulse_cache_bytes gauge",
+        'pulse_cache_bytes{cache="result"} 10',
+    ]
+
+def test_span_times_stages_and_counts_failures(monkeypatch, caplog):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, "registry", registry)
+    caplog.set_level(logging.INFO, logger=metrics.__name__)
+
+    with metrics.span("execute_sql", intent="count") as record:
+        record["rows"] = 12
+    with metrics.span("vector_search") as record:
+        record["status"] = "error"
+    with pytest.raises(ValueError):
+        with metrics.span("generate_sql"):
+            raise ValueError("LLM down")
+
+    rendered = registry.render()
+    assert 'pulse_stage_duration_seconds_count{stage="execute_sql"} 1' in rendered
+    assert 'pulse_stage_failures_total{stage="vector_search"} 1' in rendered
+    assert 'pulse_stage_failures_total{stage="generate_sql"} 1' in rendered
+    assert 'pulse_stage_failures_total{stage="execute_sql"}' not in rendered
+
+    first = caplog.records[0]
+    assert (first.stage, first.status, first.rows, first.intent) == ("execute_sql", "ok", 12, "count")
+    assert [record.status for record in caplog.records] == ["ok", "error", "error"]
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.LogRecord("pulse", logging.INFO, __file__, 1, "execute_sql took %sms", (3.5,), None)
+    record.stage = "execute_sql"
+    record.duration_ms = 3.5
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload["message"] == "execute_sql took 3.5ms"
+    assert payload["stage"] == "execute_sql" and payload["duration_ms"] == 3.5
+    assert payload["level"] == "INFO" and payload["logger"] == "pulse"
+
+def test_metrics_endpoint_serves_prometheus_text():
+    async def scrape():
+        async with TestClient(TestServer(create_app())) as client:
+            response = await client.get("/metrics")
+            return response.status, response.headers["Content-Type"], await response.text()
+
+    status, content_type, body = asyncio.run(scrape())
+    assert status == 200
+    assert content_type == PROMETHEUS_CONTENT_TYPE
+    assert "# TYPE pulse_stage_duration_seconds histogram" in body
@@ -0,0 +1,201 @@
+"""Unit tests for the import and benchmark scripts that run without a PostgreSQL server."""
+import csv
+import json
+import re
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+from scripts.benchmark import FakeLLMServer, StageRecorder, build_corpus, fake_sql, run_query
+from scripts.setup_db import (
+    E_CASTS, E_COLUMNS, N_CASTS, N_COLUMNS, SUMMARY_MIGRATION, SUMMARY_VIEWS, copy_table, import_data,
+    iter_csv_chunks,
+)
+from src.core import constants
+
+def _write_nodes(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["target::family", "name", "display name", "degree.layout", "stringdb::description", "extra"])
+        for name, display_name, degree in rows:
+            writer.writerow(["Kinase", name, display_name, degree, f"описание {display_name}, с запятой", "x"])
+
+def _read_chunks(chunks):
+    return [(list(csv.reader(buffer)), rows) for buffer, rows in chunks]
+
+def test_iter_csv_chunks_splits_rows_in_file_order(tmp_path):
+    path = tmp_path / "N.csv"
+    _write_nodes(path, [(f"9606.P{i}", f"G{i}", i) for i in range(5)])
+    chunks = _read_chunks(iter_csv_chunks(path, ",", N_COLUMNS, chunk_rows=2))
+    assert [rows for _, rows in chunks] == [2, 2, 1]
+    records = [record for chunk, _ in chunks for record in chunk]
+    assert [record[0] for record in records] == [f"9606.P{i}" for i in range(5)]
+    # Columns come out in N_COLUMNS order, whatever the order of the CSV header
+    assert records[0] == ["9606.P0", "G0", "0", "описание G0, с запятой", "Kinase"]
+
+def test_iter_csv_chunks_exact_multiple(tmp_path):
+    path = tmp_path / "N.csv"
+    _write_nodes(path, [(f"9606.P{i}", f"G{i}", i) for i in range(4)])
+    assert [rows for _, rows in iter_csv_chunks(path, ",", N_COLUMNS, chunk_rows=2)] == [2, 2]
+
+def test_iter_csv_chunks_rejects_missing_columns(tmp_path):
+    path = tmp_path / "E.csv"
+    path.write_text("name;stringdb_score\nA (pp) B;0,9\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="stringdb_coexpression"):
+        list(iter_csv_chunks(path, ";", E_COLUMNS))
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+        self.copied = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(" ".join(sql.split()))
+
+    def copy_expert(self, sql, buffer):
+        self.copied.append(buffer.read())
+
+    def fetchone(self):
+        return (7,)
+
+class RecordingConnection:
+    def __init__(self):
+        self.cur = RecordingCursor()
+
+    def cursor(self):
+        return self.cur
+
+    def commit(self):
+        self.cur.statements.append("COMMIT")
+
+    def rollback(self):
+        self.cur.statements.append("ROLLBACK")
+
+def test_copy_table_keeps_first_duplicate_and_existing_rows(tmp_path):
+    path = tmp_path / "N.csv"
+    _write_nodes(path, [("9606.P1", "FIRST", 1), ("9606.P2", "G2", 2), ("9606.P1", "SECOND", 3)])
+    conn = RecordingConnection()
+
+    assert copy_table(conn, path, "N", ",", N_COLUMNS, N_CASTS) == 3
+
+    create, merge = conn.cur.statements
+    assert "ordinal BIGSERIAL" in create
+    # Every row is staged in file order, so the ordinal tells the duplicates apart
+    staged = "".join(conn.cur.copied)
+    assert staged.index("FIRST") < staged.index("SECOND")
+    assert "SELECT DISTINCT ON (name)" in merge
+    assert "ORDER BY name, ordinal" in merge
+    assert merge.endswith("ON CONFLICT (name) DO NOTHING")
+    assert N_CASTS["degree_layout"] in merge
+
+def test_copy_table_casts_edge_scores(tmp_path):
+    path = tmp_path / "E.csv"
+    path.write_text(";".join(E_COLUMNS) + "\n" + "A (pp) B;" + ";".join(["0,5"] * 8) + "\n", encoding="utf-8")
+    conn = RecordingConnection()
+    assert copy_table(conn, path, "E", ";", E_COLUMNS, E_CASTS) == 1
+    assert "NULLIF(replace(stringdb_score, ',', '.'), '')::float4" in conn.cur.statements[1]
+
+def test_stage_recorder_summary_in_milliseconds():
+    recorder = StageRecorder()
+    for ms in range(1, 101):
+        recorder.record("execute_sql", ms / 1000)
+    assert recorder.time("template", lambda: "answer") == "answer"
+    with pytest.raises(RuntimeError):
+        recorder.time("generate_sql", _raise)
+
+    summary = recorder.summary()
+    assert set(summary) == {"execute_sql", "template", "generate_sql"}
+    assert summary["execute_sql"]["count"] == 100
+    assert summary["execute_sql"]["p50_ms"] == pytest.approx(50.5)
+    assert summary["execute_sql"]["p95_ms"] == pytest.approx(95.05)
+    assert summary["execute_sql"]["p99_ms"] == pytest.approx(99.01)
+    # A failed stage is still timed
+    assert summary["generate_sql"]["count"] == 1
+
+def _raise():
+    raise RuntimeError("stage failed")
+
+def test_build_corpus_is_reproducible():
+    corpus = build_corpus(20, ["TP53", "EGFR"], seed=7)
+    assert len(corpus) == len(constants.EXAMPLE_QUERIES) + 20
+    assert corpus == build_corpus(20, ["TP53", "EGFR"], seed=7)
+    assert not any(question.startswith("🔹") for question in corpus)
+    assert not any("{" in question for question in corpus)
+
+def test_fake_llm_server_answers_like_an_openai_endpoint():
+    server = FakeLLMServer(latency=0, token_delay=0, answer_tokens=5).start()
+    try:
+        def complete(content, stream=False):
+            request = urllib.request.Request(
+                f"{server.url}/chat/completions",
+                data=json.dumps({"messages": [{"role": "user", "content": content}], "stream": stream}).encode(),
+                headers={"Content-Type": "application/json"},
+            )
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.read().decode("utf-8")
+
+        body = json.loads(complete("Schema...\nUser question: Сколько связей у гена EGFR?"))
+        assert body["choices"][0]["message"]["content"] == fake_sql("Сколько связей у гена EGFR?")
+        assert "WHERE display_name = 'EGFR'" in body["choices"][0]["message"]["content"]
+        assert body["usage"]["completion_tokens"] > 0
+
+        events = [line[len("data: "):] for line in complete("Ответь", stream=True).splitlines() if line]
+        assert events[-1] == "[DONE]"
+        text = "".join(json.loads(event)["choices"][0]["delta"]["content"] for event in events[:-1])
+        assert text == "Согласно данным сети, ген ген"
+        assert server.requests == 2
+    finally:
+        server.stop()
+
+def test_end_to_end_run_times_the_whole_answer():
+    answered = []
+    bot = SimpleNamespace(answer=lambda question, on_progress=None: answered.append(question))
+    recorder = StageRecorder()
+    run_query(bot, "Что известно о гене TP53?", recorder, streaming=False, end_to_end=True)
+    assert answered == ["Что известно о гене TP53?"]
+    assert recorder.errors == 0
+    assert set(recorder.summary()) == {"answer", "total"}
+
+def _summary_views():
+    """View name -> its defining SQL, in the order the migration creates them."""
+    migration = SUMMARY_MIGRATION.read_text(encoding="utf-8")
+    bodies = re.findall(r"CREATE MATERIALIZED VIEW IF NOT EXISTS (\w+) AS(.*?)WITH NO DATA;", migration, re.DOTALL)
+    return migration, dict(bodies)
+
+def test_summary_views_refresh_in_dependency_order():
+    migration, views = _summary_views()
+    assert list(views) == SUMMARY_VIEWS
+    assert re.findall(r"REFRESH MATERIALIZED VIEW (\w+);", migration) == SUMMARY_VIEWS
+    for position, (view, body) in enumerate(views.items()):
+        reads = {name for name in views if re.search(rf"\b{name}\b", body)}
+        assert reads <= set(SUMMARY_VIEWS[:position]), f"{view} reads a view refreshed after it"
+
+def test_db_schema_advertises_the_summary_views():
+    _, views = _summary_views()
+    advertised = dict(re.findall(r"- (\w+)\(([^)]*)\):", constants.DB_SCHEMA))
+    summaries = {name: columns for name, columns in advertised.items() if name in views}
+    # edge_endpoints only feeds the other views
+    assert set(summaries) == set(SUMMARY_VIEWS) - {"edge_endpoints"}
+    for view, columns in summaries.items():
+        for column in columns.split(","):
+            assert re.search(rf"\b{column.strip()}\b", views[view]), f"{view}.{column.strip()} is not in the view"
+
+def test_import_refreshes_summaries_before_bumping_the_generation(tmp_path):
+    (tmp_path / "raw").mkdir()
+    _write_nodes(tmp_path / "raw" / "N_table_filtered.csv", [("9606.P1", "TP53", 1)])
+    conn = RecordingConnection()
+    import_data(conn, tmp_path)
+
+    statements = conn.cur.statements
+    refreshes = [statement for statement in statements if statement.startswith("REFRESH")]
+    assert refreshes == [f"REFRESH MATERIALIZED VIEW {view}" for view in SUMMARY_VIEWS]
+    bump = next(i for i, statement in enumerate(statements) if "pulse_meta" in statement)
+    assert statements.index(refreshes[-1]) < bump < statements.index("COMMIT")
+    assert "ROLLBACK" not in statements
@@ -0,0 +1,127 @@
+"""Unit tests for gene mention extraction and hybrid search."""
+import threading
+
+import numpy as np
+import pytest
+
+from src.core.config import config
+from src.database.repositories.edge_repository import InteractionGraph
+from src.embeddings.search import VectorIndex
+from src.search.gene_extractor import GeneMentionExtractor, levenshtein, osa_distance
+from src.search.hybrid_searcher import HybridSearcher
+
+@pytest.fixture
+def extractor():
+    return GeneMentionExtractor(["TP53", "TP63", "EGFR", "BRCA1", "HLA-A", "Histone H3", "INS"])
+
+def test_exact_mentions_in_order_of_appearance(extractor):
+    assert extractor.extract("Как EGFR и tp53 связаны с EGFR?") == ["EGFR", "TP53"]
+    assert extractor.size == 7
+
+def test_longest_multi_token_name_wins(extractor):
+    assert extractor.extract("Функция histone h3 и HLA-A") == ["Histone H3", "HLA-A"]
+
+def test_typos_are_corrected_to_the_closest_gene(extractor):
+    assert extractor.extract("Что известно о TP35?") == ["TP53"]
+    assert extractor.extract("BRCA2 и EGRF") == ["BRCA1", "EGFR"]
+
+@pytest.mark.parametrize("text", [
+    "TP73",           # TP53 and TP63 are both one edit away
+    "Найди топ генов",
+    "the DNA with genes",
+    "egfx",           # lowercase words are not treated as gene symbols
+    "IMS",            # too short to be corrected
+])
+def test_ambiguous_or_ordinary_words_are_not_corrected(extractor, text):
+    assert extractor.extract(text) == []
+
+def test_edit_distances():
+    assert levenshtein("TP35", "TP53") == 2
+    assert osa_distance("TP35", "TP53") == 1
+    assert levenshtein("", "EGFR") == osa_distance("EGFR", "") == 4
+
+class FakeDatabase:
+    """DatabaseConnection stand-in that answers GeneRepository.find from an in-memory N."""
+
+    def __init__(self, genes):
+        self.genes = genes
+        self.queries = []
+
+    def execute_query(self, sql, params=None, timeout_ms=None):
+        self.queries.append(params)
+        return [
+            gene for gene in self.genes
+            if (gene[1] in params["genes"] or gene[0] in params["names"])
+            and (params["min_degree"] is None or gene[4] >= params["min_degree"])
+            and (params["family"] is None or gene[3] == params["family"])
+            and (params["within"] is None or gene[1] in params["within"])
+        ]
+
+GENES = [
+    ("9606.P0", "TP53", "tumor suppressor", "TF", 300),
+    ("9606.P1", "MDM2", "ubiquitin ligase", "Enzyme", 120),
+    ("9606.P2", "EGFR", "growth factor receptor", "Kinase", 250),
+    ("9606.P3", "ERBB2", "receptor kinase", "Kinase", 40),
+]
+
+def _searcher(graph=None):
+    # The query embedding is closest to EGFR, then ERBB2, then TP53
+    matrix = np.array([[0.6, 0.8], [0.0, 1.0], [1.0, 0.0], [0.9, 0.1]], dtype=np.float32)
+    index = VectorIndex(
+        matrix / np.linalg.norm(matrix, axis=1, keepdims=True),
+        [gene[0] for gene in GENES],
+        [gene[1] for gene in GENES],
+        [gene[3] for gene in GENES],
+        [gene[4] for gene in GENES],
+    )
+    db = FakeDatabase(GENES)
+    searcher = HybridSearcher(
+        db,
+        vector_index=index,
+        gene_extractor=GeneMentionExtractor(gene[1] for gene in GENES),
+        encoder=lambda texts: np.array([[1.0, 0.0]] * len(texts)),
+        graph=graph,
+    )
+    return searcher, db
+
+def test_legs_are_resolved_in_one_query_and_fused():
+    searcher, db = _searcher()
+    results = searcher.search("Как MDM2 и EGFR регулируют рост?", top_k=3)
+
+    assert len(db.queries) == 1
+    assert db.queries[0]["genes"] == ["MDM2", "EGFR"]
+    assert db.queries[0]["names"] == ["9606.P2", "9606.P3", "9606.P0"]
+    # EGFR is in both legs; MDM2 leads the exact leg, ERBB2 is second in the vector leg
+    assert [result["display_name"] for result in results] == ["EGFR", "MDM2", "ERBB2"]
+    assert results[0]["sources"] == ["exact", "vector"]
+    assert results[0]["score"] == pytest.approx(1 / (config.RRF_K + 2) + 1 / (config.RRF_K + 1))
+    assert results[1]["score"] == pytest.approx(1 / (config.RRF_K + 1))
+    assert results[2]["score"] == pytest.approx(1 / (config.RRF_K + 2))
+    assert "similarity" not in results[1]
+    assert results[2]["similarity"] == pytest.approx(0.9 / np.hypot(0.9, 0.1))
+
+def test_filters_apply_to_both_legs():
+    searcher, db = _searcher()
+    results = searcher.search("TP53 и EGFR", family="Kinase", min_degree=100)
+    assert [result["display_name"] for result in results] == ["EGFR"]
+    assert db.queries[0]["family"] == "Kinase" and db.queries[0]["min_degree"] == 100
+    # The vector leg is pre-filtered in the index, not only in SQL
+    assert db.queries[0]["names"] == ["9606.P2"]
+
+def test_near_gene_restricts_results_and_reports_hops():
+    labels = {gene[0]: gene[1] for gene in GENES}
+    graph = InteractionGraph.from_edges([("9606.P1", "9606.P0", 0.9), ("9606.P0", "9606.P2", 0.8)], labels)
+    searcher, db = _searcher(graph)
+    results = searcher.search("рецепторы", near_gene="MDM2", max_hops=2)
+    assert {result["display_name"]: result["hops"] for result in results} == {"TP53": 1, "EGFR": 2}
+    assert sorted(db.queries[0]["within"]) == ["EGFR", "TP53"]
+
+    assert searcher.search("рецепторы", near_gene="MDM2", min_edge_score=0.95) == []
+    assert len(db.queries) == 1
+
+def test_cancelled_search_takes_no_connection():
+    searcher, db = _searcher()
+    cancel = threading.Event()
+    cancel.set()
+    assert searcher.search("EGFR", cancel=cancel) == []
+    assert not db.queries